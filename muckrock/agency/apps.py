@@ -17,3 +17,6 @@ class AgencyConfig(AppConfig):
         Agency = self.get_model('Agency')
         action.register(Agency)
         search.register(Agency.objects.get_approved())
+        # connected here so search documents are kept up to date however
+        # the agencies are changed
+        import muckrock.agency.signals # pylint: disable=unused-variable
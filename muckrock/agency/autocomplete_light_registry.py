@@ -2,14 +2,25 @@
 Autocomplete registry for Agency
 """
 
-from django.db.models import Q
-
 from autocomplete_light import shortcuts as autocomplete_light
 
 from muckrock.agency.models import Agency
 from muckrock.jurisdiction.models import Jurisdiction
 
-class SimpleAgencyAutocomplete(autocomplete_light.AutocompleteModelBase):
+class AgencySearchMixin(object):
+    """Searches the agencies' precomputed search documents, instead of
+    matching the search fields across several joined tables"""
+    # pylint: disable=too-few-public-methods
+
+    def choices_for_request(self):
+        """Rank the choices by their match to the query"""
+        query = self.request.GET.get('q', '')
+        exclude = self.request.GET.getlist('exclude')
+        choices = self.choices.search(query).exclude(pk__in=exclude)
+        return choices[:self.limit_choices]
+
+
+class SimpleAgencyAutocomplete(AgencySearchMixin, autocomplete_light.AutocompleteModelBase):
     """Creates an autocomplete field for picking agencies"""
     choices = Agency.objects.filter(status='approved').select_related('jurisdiction')
     search_fields = ['name', 'aliases']
@@ -28,7 +39,7 @@ class SimpleAgencyAutocomplete(autocomplete_light.AutocompleteModelBase):
         return super(SimpleAgencyAutocomplete, self).choices_for_request()
 
 
-class AgencyAutocomplete(autocomplete_light.AutocompleteModelTemplate):
+class AgencyAutocomplete(AgencySearchMixin, autocomplete_light.AutocompleteModelTemplate):
     """Creates an autocomplete field for picking agencies"""
     choices = Agency.objects.filter(status='approved').select_related('jurisdiction')
     choice_template = 'autocomplete/agency.html'
@@ -54,8 +65,10 @@ class AgencyAutocomplete(autocomplete_light.AutocompleteModelTemplate):
         return choices.filter(jurisdiction__id=jurisdiction_id)
 
 
-class AgencyMultiRequestAutocomplete(autocomplete_light.AutocompleteModelTemplate):
-    """Provides an autocomplete field for picking multiple agencies."""
+class AgencyMultiRequestAutocomplete(AgencySearchMixin,
+        autocomplete_light.AutocompleteModelTemplate):
+    """Provides an autocomplete field for picking multiple agencies, by
+    agency name, alias, jurisdiction, jurisdiction abbreviation, and type"""
     choices = (Agency.objects.get_approved().select_related('jurisdiction__parent')
                                             .prefetch_related('types'))
     choice_template = 'autocomplete/agency.html'
@@ -65,31 +78,6 @@ class AgencyMultiRequestAutocomplete(autocomplete_light.AutocompleteModelTemplat
         'data-autocomplete-minimum-characters': 2
     }
 
-    def complex_condition(self, string):
-        """Returns a complex set of database queries for getting agencies
-        by name, alias, jurisdiction, jurisdiction abbreviation, and type."""
-        # pylint: disable=no-self-use
-        return (Q(name__icontains=string)|
-                Q(aliases__icontains=string)|
-                Q(jurisdiction__name__icontains=string)|
-                Q(jurisdiction__abbrev__iexact=string)|
-                Q(jurisdiction__parent__abbrev__iexact=string)|
-                Q(types__name__icontains=string))
-
-    def choices_for_request(self):
-        query = self.request.GET.get('q', '')
-        split_query = query.split()
-        # if query is an empty string, then split will produce an empty array
-        # if query is an empty string, then do nto filter the existing choices
-        if split_query:
-            conditions = self.complex_condition(split_query[0])
-            for string in split_query[1:]:
-                conditions &= self.complex_condition(string)
-            choices = self.choices.filter(conditions).distinct()
-        else:
-            choices = self.choices
-        return self.order_choices(choices)[0:self.limit_choices]
-
 
 class AgencyAdminAutocomplete(AgencyAutocomplete):
     """Autocomplete for Agencies for FOIA admin page"""
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def build_search_documents(apps, schema_editor):
+    """Build the search document of every agency"""
+    # pylint: disable=unused-argument
+    Agency = apps.get_model('agency', 'Agency')
+    agencies = (Agency.objects
+            .select_related('jurisdiction__parent')
+            .prefetch_related('types'))
+    for agency in agencies.iterator():
+        parts = [agency.name, agency.aliases]
+        parts.extend([agency.jurisdiction.name, agency.jurisdiction.abbrev])
+        if agency.jurisdiction.parent is not None:
+            parts.append(agency.jurisdiction.parent.abbrev)
+        parts.extend(agency_type.name for agency_type in agency.types.all())
+        Agency.objects.filter(pk=agency.pk).update(
+                search_document=u' '.join(part for part in parts if part).lower())
+
+
+class Migration(migrations.Migration):
+    """Add a trigram indexed search document to agencies for the
+    autocomplete, so lookups do not need to join the jurisdictions and
+    types"""
+
+    dependencies = [
+        ('agency', '0009_agency_manual_stale'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agency',
+            name='search_document',
+            field=models.TextField(blank=True, editable=False, help_text=b'Denormalized - the name, aliases, jurisdiction and types, for the autocomplete'),
+        ),
+        migrations.RunPython(build_search_documents, migrations.RunPython.noop),
+        migrations.RunSQL(
+            'CREATE EXTENSION IF NOT EXISTS pg_trgm;',
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX agency_agency_search_document_trgm '
+            'ON agency_agency USING gin (search_document gin_trgm_ops);',
+            'DROP INDEX agency_agency_search_document_trgm;',
+        ),
+    ]
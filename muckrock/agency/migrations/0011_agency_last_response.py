@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    """Store the latest response on each agency, so the stale agency tasks
+    do not need to sort every response the agency has sent"""
+
+    dependencies = [
+        ('foia', '0042_multirequestsubmission_sending'),
+        ('agency', '0010_agency_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agency',
+            name='last_response',
+            field=models.ForeignKey(blank=True, editable=False, help_text=b"Denormalized - the latest response to any of this agency's requests", null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='foia.FOIACommunication'),
+        ),
+        migrations.RunSQL(
+            'UPDATE agency_agency SET last_response_id = latest.id '
+            'FROM (SELECT DISTINCT ON (foia.agency_id) foia.agency_id, comm.id '
+            'FROM foia_foiacommunication comm '
+            'JOIN foia_foiarequest foia ON foia.id = comm.foia_id '
+            'WHERE comm.response AND foia.agency_id IS NOT NULL '
+            'ORDER BY foia.agency_id, comm.date DESC) AS latest '
+            'WHERE latest.agency_id = agency_agency.id;',
+            migrations.RunSQL.noop,
+        ),
+    ]
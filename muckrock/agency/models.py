@@ -54,6 +54,40 @@ class AgencyQuerySet(models.QuerySet):
                    .filter(status='approved')\
                    .order_by('name')
 
+    def search(self, query):
+        """
+        Find agencies matching every word of the query in their name,
+        aliases, jurisdiction or types, ranked by the similarity of their name
+
+        Uses the trigram indexed search document, so no joins are needed
+        """
+        words = query.lower().split()
+        if not words:
+            return self
+        return (self
+                .extra(
+                    select={'rank': 'similarity(agency_agency.name, %s)'},
+                    select_params=[query],
+                    where=['agency_agency.search_document LIKE %s'] * len(words),
+                    params=['%%%s%%' % escape_like(word) for word in words],
+                    )
+                .order_by('-rank', 'name'))
+
+    def update_search_documents(self):
+        """Rebuild the search documents of these agencies"""
+        agencies = (self
+                .select_related('jurisdiction__parent')
+                .prefetch_related('types'))
+        for agency in agencies:
+            document = agency.build_search_document()
+            if document != agency.search_document:
+                Agency.objects.filter(pk=agency.pk).update(search_document=document)
+
+
+def escape_like(value):
+    """Escape the wildcards in a value for a LIKE pattern"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
 
 class Agency(models.Model, RequestHelper):
     """An agency for a particular jurisdiction that has at least one agency type"""
@@ -106,6 +140,22 @@ class Agency(models.Model, RequestHelper):
                                  help_text='Begin with http://')
     exempt = models.BooleanField(default=False)
     requires_proxy = models.BooleanField(default=False)
+    search_document = models.TextField(
+            blank=True,
+            editable=False,
+            help_text='Denormalized - the name, aliases, jurisdiction and types, '
+            'for the autocomplete',
+            )
+    last_response = models.ForeignKey(
+            'foia.FOIACommunication',
+            null=True,
+            blank=True,
+            editable=False,
+            on_delete=models.SET_NULL,
+            related_name='+',
+            help_text='Denormalized - the latest response to any of this '
+            'agency\'s requests',
+            )
 
     objects = AgencyQuerySet.as_manager()
 
@@ -128,8 +178,20 @@ class Agency(models.Model, RequestHelper):
         self.email = self.email.strip()
         self.slug = slugify(self.slug)
         self.name = self.name.strip()
+        self.search_document = self.build_search_document()
         super(Agency, self).save(*args, **kwargs)
 
+    def build_search_document(self):
+        """The text the autocomplete searches for this agency"""
+        parts = [self.name, self.aliases]
+        jurisdiction = self.jurisdiction
+        parts.extend([jurisdiction.name, jurisdiction.abbrev])
+        if jurisdiction.parent is not None:
+            parts.append(jurisdiction.parent.abbrev)
+        if self.pk is not None:
+            parts.extend(agency_type.name for agency_type in self.types.all())
+        return u' '.join(part for part in parts if part).lower()
+
     def normalize_fax(self):
         """Return a fax number suitable for use with phaxio"""
 
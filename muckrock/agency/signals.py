@@ -0,0 +1,53 @@
+"""Signal handlers which keep the agency search documents up to date"""
+
+from django.db.models import Q
+from django.db.models.signals import post_save, m2m_changed
+
+from muckrock.agency.models import Agency, AgencyType
+from muckrock.jurisdiction.models import Jurisdiction
+
+# pylint: disable=unused-argument
+
+def agency_types_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """An agency's types are part of its search document"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse and action == 'post_clear':
+        # the cleared agencies are no longer known, but their documents
+        # still hold the type's name
+        agencies = Agency.objects.filter(
+                search_document__contains=instance.name.lower())
+    elif reverse:
+        agencies = Agency.objects.filter(pk__in=pk_set)
+    else:
+        agencies = Agency.objects.filter(pk=instance.pk)
+    agencies.update_search_documents()
+
+
+def agency_type_saved(sender, instance, created, raw=False, **kwargs):
+    """Renaming a type changes the search documents of its agencies"""
+    if not raw and not created:
+        Agency.objects.filter(types=instance).update_search_documents()
+
+
+def jurisdiction_saved(sender, instance, created, raw=False, **kwargs):
+    """Renaming a jurisdiction changes the search documents of its agencies,
+    and of the agencies of the jurisdictions within it"""
+    if not raw and not created:
+        Agency.objects.filter(
+                Q(jurisdiction=instance) | Q(jurisdiction__parent=instance)
+                ).update_search_documents()
+
+
+m2m_changed.connect(
+        agency_types_changed,
+        sender=Agency.types.through,
+        dispatch_uid='muckrock.agency.signals.types')
+post_save.connect(
+        agency_type_saved,
+        sender=AgencyType,
+        dispatch_uid='muckrock.agency.signals.agency_type')
+post_save.connect(
+        jurisdiction_saved,
+        sender=Jurisdiction,
+        dispatch_uid='muckrock.agency.signals.jurisdiction')
@@ -150,6 +150,47 @@ class TestAgencyManager(TestCase):
         ok_(self.agency3 not in agencies, 'Unapproved agencies shouldn\'t be siblings.')
 
 
+class TestAgencySearch(TestCase):
+    """Tests for the agency autocomplete search"""
+    def setUp(self):
+        self.police = factories.AgencyFactory(
+                name='Boston Police Department',
+                aliases='BPD',
+                jurisdiction__name='Boston',
+                jurisdiction__abbrev='BOS')
+        self.schools = factories.AgencyFactory(
+                name='Boston Public Schools',
+                jurisdiction=self.police.jurisdiction)
+        self.other = factories.AgencyFactory(name='Cambridge Police')
+
+    def test_search(self):
+        """Every word of the query must match"""
+        search = agency.models.Agency.objects.search
+        eq_(set(search('boston')), set([self.police, self.schools]))
+        eq_(list(search('police boston')), [self.police])
+        eq_(list(search('bpd')), [self.police])
+        eq_(list(search('100%')), [])
+
+    def test_ranked(self):
+        """Closer matches to the name come first"""
+        results = list(agency.models.Agency.objects.search('Boston Public Schools'))
+        eq_(results[0], self.schools)
+
+    def test_types(self):
+        """The search document follows changes to the types and jurisdiction"""
+        agency_type = agency.models.AgencyType.objects.create(name='Education')
+        self.schools.types.add(agency_type)
+        eq_(list(agency.models.Agency.objects.search('education')), [self.schools])
+        agency_type.name = 'Schooling'
+        agency_type.save()
+        eq_(list(agency.models.Agency.objects.search('education')), [])
+        jurisdiction = self.police.jurisdiction
+        jurisdiction.name = 'Beantown'
+        jurisdiction.save()
+        eq_(set(agency.models.Agency.objects.search('beantown')),
+                set([self.police, self.schools]))
+
+
 class TestAgencyViews(TestCase):
     """Tests for Agency views"""
     def setUp(self):
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Keep running totals of the payments on each crowdfund"""
+
+    dependencies = [
+        ('crowdfund', '0015_auto_20170114_1858'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crowdfund',
+            name='payment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='crowdfund',
+            name='anonymous_payment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(
+            'UPDATE crowdfund_crowdfund SET '
+            'payment_received = totals.received, '
+            'payment_count = totals.count, '
+            'anonymous_payment_count = totals.anonymous '
+            'FROM (SELECT crowdfund_id, SUM(amount) AS received, COUNT(*) AS count, '
+            'COUNT(CASE WHEN NOT show OR user_id IS NULL THEN 1 END) AS anonymous '
+            'FROM crowdfund_crowdfundpayment GROUP BY crowdfund_id) AS totals '
+            'WHERE totals.crowdfund_id = crowdfund_crowdfund.id;',
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -2,22 +2,37 @@
 Models for the crowdfund application
 """
 
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.db import models
-from django.db.models import Q
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, When
 
+from collections import namedtuple
 from datetime import date
 from decimal import Decimal
 import logging
 import stripe
 
 from muckrock import task
-from muckrock.utils import new_action
+from muckrock.utils import cache_get_or_set, new_action
 
 stripe.api_version = '2015-10-16'
 
+# payments which do not show who made them
+ANONYMOUS = Q(show=False) | Q(user=None)
+
+# the running totals, which are only written when saved by name
+TOTAL_FIELDS = ('payment_received', 'payment_count', 'anonymous_payment_count')
+
+# what the crowdfund templates show about the payments, cached together
+CrowdfundSummary = namedtuple('CrowdfundSummary', [
+    'contributors_count',
+    'anonymous_contributors_count',
+    'named_contributors',
+    ])
+
 
 class Crowdfund(models.Model):
     """Crowdfunding campaign"""
@@ -36,10 +51,28 @@ class Crowdfund(models.Model):
     )
     date_due = models.DateField(blank=True, null=True)
     closed = models.BooleanField(default=False)
+    # running totals of the payments, kept up to date as they are made
+    payment_count = models.PositiveIntegerField(default=0, editable=False)
+    anonymous_payment_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __unicode__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """Clear the cached summary on save
+
+        Saving an existing crowdfund leaves out the running totals unless
+        they are named in update_fields, so a stale instance can not
+        overwrite payments recorded since it was loaded"""
+        if (not self._state.adding and not args and
+                not kwargs.get('force_insert') and
+                kwargs.get('update_fields') is None):
+            kwargs['update_fields'] = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name not in TOTAL_FIELDS]
+        super(Crowdfund, self).save(*args, **kwargs)
+        cache.delete(self.summary_key())
+
     def get_absolute_url(self):
         """The url for this object"""
         return reverse('crowdfund', kwargs={'pk': self.pk})
@@ -58,22 +91,45 @@ class Crowdfund(models.Model):
         return int(self.payment_received/self.payment_required * 100)
 
     def update_payment_received(self):
-        """Combine the amounts of all the payments"""
-        total_amount = Decimal()
-        payments = self.payments.all()
-        for payment in payments:
-            logging.debug(payment)
-            total_amount += payment.amount
-        self.payment_received = total_amount
-        self.save()
+        """Recompute the running totals from all of the payments"""
+        totals = self.payments.aggregate(
+                received=Sum('amount'),
+                count=Count('pk'),
+                anonymous=Sum(Case(
+                    When(ANONYMOUS, then=1),
+                    default=0,
+                    output_field=IntegerField(),
+                    )),
+                )
+        self.payment_received = totals['received'] or Decimal('0.00')
+        self.payment_count = totals['count']
+        self.anonymous_payment_count = totals['anonymous'] or 0
+        self.save(update_fields=TOTAL_FIELDS)
         if self.payment_received >= self.payment_required and self.payment_capped:
             self.close_crowdfund(succeeded=True)
         return
 
+    def record_payment(self, payment):
+        """Add a new payment to the running totals"""
+        anonymous = not payment.show or payment.user_id is None
+        # update the totals in the database, so concurrent payments add up
+        Crowdfund.objects.filter(pk=self.pk).update(
+                payment_received=F('payment_received') + payment.amount,
+                payment_count=F('payment_count') + 1,
+                anonymous_payment_count=F('anonymous_payment_count') + int(anonymous),
+                )
+        self.refresh_from_db(fields=TOTAL_FIELDS)
+        cache.delete(self.summary_key())
+        if self.payment_capped and self.payment_received >= self.payment_required:
+            self.close_crowdfund(succeeded=True)
+
     def close_crowdfund(self, succeeded=False):
         """Close the crowdfund and create a new task for it once it reaches its goal."""
+        # only the call which actually closes the crowdfund creates the task
+        closed = Crowdfund.objects.filter(pk=self.pk, closed=False).update(closed=True)
         self.closed = True
-        self.save()
+        if not closed:
+            return
         task.models.CrowdfundTask.objects.create(crowdfund=self)
         verb = 'ended'
         if succeeded:
@@ -84,11 +140,11 @@ class Crowdfund(models.Model):
 
     def contributors_count(self):
         """Return a count of all the contributors to a crowdfund"""
-        return self.payments.count()
+        return self.payment_count
 
     def anonymous_contributors_count(self):
         """Return a count of anonymous contributors"""
-        return self.payments.filter(Q(show=False) | Q(user=None)).count()
+        return self.anonymous_payment_count
 
     def named_contributors(self):
         """Return unique named contributors only."""
@@ -97,6 +153,22 @@ class Crowdfund(models.Model):
                 crowdfundpayment__crowdfund=self,
                 crowdfundpayment__show=True).distinct()
 
+    def summary_key(self):
+        """The cache key for the summary"""
+        return 'cf:%s:summary' % self.pk
+
+    def get_summary(self):
+        """The totals and named contributors shown by the crowdfund
+        templates, cached until the next payment"""
+        return cache_get_or_set(
+                self.summary_key(),
+                lambda: CrowdfundSummary(
+                    self.payment_count,
+                    self.anonymous_payment_count,
+                    list(self.named_contributors()),
+                    ),
+                settings.DEFAULT_CACHE_TIMEOUT)
+
     def get_crowdfund_object(self):
         """Is this for a request or a project?"""
         if hasattr(self, 'foia'):
@@ -134,9 +206,7 @@ class Crowdfund(models.Model):
             show=show,
             charge_id=charge.id
         )
-        cache.delete('cf:%s:crowdfund_widget_data' % self.pk)
         logging.info(payment)
-        self.update_payment_received()
         return payment
 
     @property
@@ -165,6 +235,13 @@ class CrowdfundPayment(models.Model):
     charge_id = models.CharField(max_length=255, blank=True)
     crowdfund = models.ForeignKey(Crowdfund, related_name='payments')
 
+    def save(self, *args, **kwargs):
+        """Add new payments to the crowdfund's running totals"""
+        is_new = self.pk is None
+        super(CrowdfundPayment, self).save(*args, **kwargs)
+        if is_new:
+            self.crowdfund.record_payment(self)
+
     def __unicode__(self):
         return (u'Payment of $%.2f by %s on %s for %s' %
             (self.amount, self.user, self.date.date(),
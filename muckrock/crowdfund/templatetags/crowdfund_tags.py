@@ -10,7 +10,6 @@ from django.shortcuts import get_object_or_404
 
 from muckrock.crowdfund.models import Crowdfund
 from muckrock.crowdfund.forms import CrowdfundPaymentForm
-from muckrock.utils import cache_get_or_set
 
 register = template.Library()
 
@@ -92,25 +91,17 @@ def generate_crowdfund_context(the_crowdfund, the_url_name, the_form, the_contex
     payment_form = crowdfund_form(the_crowdfund, the_form)
     logged_in, user_email = crowdfund_user(the_context)
     the_request = the_context.request
-    named, contrib_count, anon_count = (
-            cache_get_or_set(
-                'cf:%s:crowdfund_widget_data' % the_crowdfund.pk,
-                lambda: (
-                    list(the_crowdfund.named_contributors()),
-                    the_crowdfund.contributors_count(),
-                    the_crowdfund.anonymous_contributors_count(),
-                    ),
-                settings.DEFAULT_CACHE_TIMEOUT))
+    summary = the_crowdfund.get_summary()
     contrib_sum = contributor_summary(
-            named,
-            contrib_count,
-            anon_count)
+            summary.named_contributors,
+            summary.contributors_count,
+            summary.anonymous_contributors_count)
     obj_url = the_crowdfund.get_crowdfund_object().get_absolute_url()
     return {
         'crowdfund': the_crowdfund,
-        'named_contributors': named,
-        'contributors_count': contrib_count,
-        'anon_contributors_count': anon_count,
+        'named_contributors': summary.named_contributors,
+        'contributors_count': summary.contributors_count,
+        'anon_contributors_count': summary.anonymous_contributors_count,
         'contributor_summary': contrib_sum,
         'endpoint': endpoint,
         'login_form': AuthenticationForm(),
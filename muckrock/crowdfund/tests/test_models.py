@@ -44,6 +44,15 @@ class TestCrowdfundAbstract(TestCase):
         eq_(CrowdfundTask.objects.count(), crowdfund_task_count + 1,
             'A new crowdfund task should be created.')
 
+    def test_close_once(self):
+        """Only the first close of a crowdfund creates a task,
+        even from a stale instance"""
+        stale = models.Crowdfund.objects.get(pk=self.crowdfund.pk)
+        crowdfund_task_count = CrowdfundTask.objects.count()
+        self.crowdfund.close_crowdfund()
+        stale.close_crowdfund()
+        eq_(CrowdfundTask.objects.count(), crowdfund_task_count + 1)
+
 
 class TestCrowdfund(TestCase):
     """Test crowdfunding"""
@@ -98,6 +107,34 @@ class TestCrowdfundPayment(TestCase):
         ok_(self.crowdfund.closed,
             'Once the cap has been reached, the crowdfund should close.')
 
+    def test_running_totals(self):
+        """Payments should keep the crowdfund's totals up to date."""
+        self.crowdfund.make_payment(self.token, 'test@email.com', Decimal(5))
+        self.crowdfund.make_payment(
+                self.token, 'test@email.com', Decimal(10), show=True)
+        eq_(self.crowdfund.payment_received, Decimal(15))
+        eq_(self.crowdfund.contributors_count(), 2)
+        eq_(self.crowdfund.anonymous_contributors_count(), 2)
+        summary = self.crowdfund.get_summary()
+        eq_(summary.contributors_count, 2)
+        eq_(summary.anonymous_contributors_count, 2)
+        models.Crowdfund.objects.filter(pk=self.crowdfund.pk).update(
+                payment_received=0, payment_count=0)
+        self.crowdfund.update_payment_received()
+        eq_(self.crowdfund.payment_received, Decimal(15))
+        eq_(self.crowdfund.payment_count, 2)
+
+    def test_stale_save(self):
+        """Saving a stale crowdfund should not overwrite its totals"""
+        stale = models.Crowdfund.objects.get(pk=self.crowdfund.pk)
+        self.crowdfund.make_payment(self.token, 'test@email.com', Decimal(5))
+        stale.name = 'Renamed'
+        stale.save()
+        self.crowdfund.refresh_from_db()
+        eq_(self.crowdfund.name, 'Renamed')
+        eq_(self.crowdfund.payment_received, Decimal(5))
+        eq_(self.crowdfund.payment_count, 1)
+
 
 class TestStripeIntegration(TestCase):
     """Test Stripe integration and error handling"""
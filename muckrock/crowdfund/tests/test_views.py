@@ -226,7 +226,7 @@ class TestCrowdfundView(TestCase):
         """The crowdfund should accept payments with cents."""
         self.crowdfund.payment_required = Decimal('257.05')
         self.crowdfund.payment_received = Decimal('150.00')
-        self.crowdfund.save()
+        self.crowdfund.save(update_fields=['payment_required', 'payment_received'])
         cent_payment = 105 # $1.05
         self.data['stripe_amount'] = cent_payment
         self.post(self.data)
@@ -13,6 +13,7 @@ from muckrock.agency.models import Agency, STALE_DURATION
 from muckrock.crowdfund.models import Crowdfund
 from muckrock.foia.models import (
         FOIARequest,
+        FOIAMultiRequest,
         FOIACommunication,
         FOIAFile,
         RawEmail,
@@ -109,6 +110,18 @@ class FOIARequestFactory(factory.django.DjangoModelFactory):
     )
 
 
+class FOIAMultiRequestFactory(factory.django.DjangoModelFactory):
+    """A factory for creating FOIAMultiRequest test objects."""
+    class Meta:
+        model = FOIAMultiRequest
+
+    title = factory.Sequence(lambda n: "FOIA Multi Request %d" % n)
+    slug = factory.LazyAttribute(lambda obj: slugify(obj.title))
+    user = factory.SubFactory(UserFactory)
+    status = 'submitted'
+    requested_docs = 'All of the records'
+
+
 class FOIACommunicationFactory(factory.django.DjangoModelFactory):
     """A factory for creating FOIARequest test objects."""
     class Meta:
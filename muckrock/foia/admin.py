@@ -8,7 +8,7 @@ from django.contrib import admin, messages
 from django.contrib.auth.models import User
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 from django.core.urlresolvers import reverse
-from django.db.models import Count
+from django.db.models import Case, Count, IntegerField, Sum, When
 from django.http import HttpResponseRedirect
 from django.shortcuts import render_to_response, get_object_or_404
 from django.template import RequestContext
@@ -25,7 +25,9 @@ from muckrock.foia.models import (
         FOIAFile,
         FOIACommunication,
         FOIANote,
+        MultiRequestSubmission,
         STATUS,
+        SUBMISSION_STATES,
         CommunicationError,
         CommunicationOpen,
         OutboundAttachment,
@@ -35,6 +37,7 @@ from muckrock.foia.tasks import (
         set_document_cloud_pages,
         autoimport,
         submit_multi_request,
+        send_multi_request_foia,
         )
 from muckrock.jurisdiction.models import Jurisdiction
 
@@ -277,7 +280,7 @@ class FOIARequestAdmin(VersionAdmin):
     list_filter = ['status']
     list_select_related = ('agency', 'jurisdiction', 'user')
     search_fields = ['title', 'description', 'tracking_id', 'mail_id']
-    readonly_fields = ['mail_id']
+    readonly_fields = ['mail_id', 'multirequest']
     filter_horizontal = ('read_collaborators', 'edit_collaborators')
     inlines = [FOIACommunicationInline, FOIANoteInline]
     save_on_top = True
@@ -453,13 +456,78 @@ class FOIARequestAdmin(VersionAdmin):
         return HttpResponseRedirect(reverse('admin:foia_foiarequest_change', args=[foia.pk]))
 
 
+class MultiRequestSubmissionInline(admin.TabularInline):
+    """Multi request submission inline admin options"""
+    model = MultiRequestSubmission
+    fields = ('agency', 'foia', 'state', 'error', 'date_updated')
+    readonly_fields = ('agency', 'foia', 'state', 'error', 'date_updated')
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_queryset(self, request):
+        """Select the agencies and requests"""
+        return (super(MultiRequestSubmissionInline, self)
+                .get_queryset(request)
+                .select_related('agency', 'foia'))
+
+
 class FOIAMultiRequestAdmin(VersionAdmin):
     """FOIA Multi Request admin options"""
     change_form_template = 'admin/foia/multifoiarequest/change_form.html'
     prepopulated_fields = {'slug': ('title',)}
-    list_display = ('title', 'user', 'status')
+    list_display = ('title', 'user', 'status', 'sent', 'pending', 'sending', 'failed')
+    list_select_related = ('user',)
     search_fields = ['title', 'requested_docs']
     filter_horizontal = ['agencies']
+    inlines = [MultiRequestSubmissionInline]
+    actions = ['resend_failed']
+
+    def get_queryset(self, request):
+        """Count the submissions in each state"""
+        queryset = super(FOIAMultiRequestAdmin, self).get_queryset(request)
+        return queryset.annotate(**{
+            '%s_count' % state: Sum(Case(
+                When(submissions__state=state, then=1),
+                default=0,
+                output_field=IntegerField()))
+            for state, _ in SUBMISSION_STATES})
+
+    def sent(self, obj):
+        """Number of agencies the request has been sent to"""
+        # pylint: disable=no-self-use
+        return obj.sent_count or 0
+
+    def pending(self, obj):
+        """Number of agencies still to be sent the request"""
+        # pylint: disable=no-self-use
+        return obj.pending_count or 0
+
+    def sending(self, obj):
+        """Number of agencies the request is being sent to"""
+        # pylint: disable=no-self-use
+        return obj.sending_count or 0
+
+    def failed(self, obj):
+        """Number of agencies the request failed to be sent to"""
+        # pylint: disable=no-self-use
+        return obj.failed_count or 0
+
+    def resend_failed(self, request, queryset):
+        """Try sending the failed requests again, along with any whose
+        sending has stalled"""
+        submissions = MultiRequestSubmission.objects.filter(multirequest__in=queryset)
+        foia_pks = ((submissions.filter(state='failed') | submissions.get_stale())
+                .exclude(foia=None)
+                .values_list('foia_id', flat=True))
+        count = 0
+        for foia_pk in foia_pks:
+            send_multi_request_foia.delay(foia_pk)
+            count += 1
+        self.message_user(request, 'Sending %d failed requests again' % count)
+    resend_failed.short_description = 'Send the failed requests again'
 
     def get_urls(self):
         """Add custom URLs here"""
@@ -21,3 +21,6 @@ class FOIAConfig(AppConfig):
         action.register(FOIACommunication)
         action.register(FOIANote)
         search.register(FOIARequest.objects.get_public())
+        # connected here instead of from the urls, so that changes made
+        # outside of the web process are recorded as well
+        import muckrock.foia.changes # pylint: disable=unused-variable
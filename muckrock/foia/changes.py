@@ -0,0 +1,31 @@
+"""Signal handlers which record changes for the change feed API"""
+
+from django.db.models.signals import post_save, post_delete
+
+from muckrock.agency.models import Agency
+from muckrock.foia.models import FOIARequest, FOIACommunication, FOIAFile, Change
+
+# pylint: disable=unused-argument
+
+CHANGE_MODELS = (FOIARequest, FOIACommunication, FOIAFile, Agency)
+
+def record_save(sender, instance, raw=False, **kwargs):
+    """Record that an object was created or updated"""
+    if not raw:
+        Change.objects.record(instance, 'save')
+
+
+def record_delete(sender, instance, **kwargs):
+    """Record that an object was deleted"""
+    Change.objects.record(instance, 'delete')
+
+
+for model in CHANGE_MODELS:
+    post_save.connect(
+            record_save,
+            sender=model,
+            dispatch_uid='muckrock.foia.changes.save.%s' % model.__name__)
+    post_delete.connect(
+            record_delete,
+            sender=model,
+            dispatch_uid='muckrock.foia.changes.delete.%s' % model.__name__)
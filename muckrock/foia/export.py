@@ -0,0 +1,155 @@
+"""
+Bulk export of public request metadata
+
+Rows are read in fixed size chunks ordered by primary key, each chunk
+starting after the last key of the previous one, so memory use stays flat
+however many rows there are.  This version of Django loads a whole result
+set into memory even when using iterator(), so the chunking is done here.
+"""
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+
+import csv
+import gzip
+import tempfile
+
+from muckrock.foia.models import FOIARequest, FOIACommunication, FOIAFile
+
+CHUNK_SIZE = 2000
+
+EXPORTS = {
+        'requests': {
+            'queryset': lambda: FOIARequest.objects.get_public(),
+            'fields': (
+                'id',
+                'title',
+                'slug',
+                'status',
+                'user__username',
+                'jurisdiction_id',
+                'agency_id',
+                'date_submitted',
+                'date_updated',
+                'date_due',
+                'date_done',
+                'price',
+                ),
+            },
+        'communications': {
+            'queryset': lambda: FOIACommunication.objects.filter(foia__public=True),
+            'fields': (
+                'id',
+                'foia_id',
+                'from_who',
+                'to_who',
+                'subject',
+                'date',
+                'response',
+                'status',
+                'delivered',
+                ),
+            },
+        'files': {
+            'queryset': lambda: FOIAFile.objects.filter(
+                foia__public=True, access='public'),
+            'fields': (
+                'id',
+                'foia_id',
+                'comm_id',
+                'title',
+                'date',
+                'source',
+                'ffile',
+                'pages',
+                'doc_id',
+                ),
+            },
+        }
+
+FORMATS = {
+        'ndjson': 'application/x-ndjson',
+        'csv': 'text/csv',
+        }
+
+
+def export_rows(kind, chunk_size=CHUNK_SIZE):
+    """Yield a dictionary for each row of the export, a chunk at a time"""
+    export = EXPORTS[kind]
+    fields = export['fields']
+    queryset = export['queryset']().order_by('pk').values(*fields)
+    last_pk = None
+    while True:
+        chunk = queryset
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        chunk = list(chunk[:chunk_size])
+        for row in chunk:
+            if 'ffile' in row:
+                row['ffile'] = default_storage.url(row['ffile']) if row['ffile'] else ''
+            yield row
+        if len(chunk) < chunk_size:
+            return
+        last_pk = chunk[-1]['id']
+
+
+def ndjson_lines(kind):
+    """Yield the export as newline delimited JSON"""
+    encoder = DjangoJSONEncoder()
+    for row in export_rows(kind):
+        yield encoder.encode(row) + '\n'
+
+
+class LineBuffer(object):
+    """A file-like object which returns what is written to it, so the csv
+    writer can produce one line at a time"""
+    # pylint: disable=too-few-public-methods, no-self-use
+
+    def write(self, value):
+        """Return the value instead of storing it"""
+        return value
+
+
+def csv_lines(kind):
+    """Yield the export as CSV, starting with a header"""
+    fields = EXPORTS[kind]['fields']
+    writer = csv.writer(LineBuffer())
+    yield writer.writerow(fields)
+    for row in export_rows(kind):
+        yield writer.writerow([
+            unicode(row[field]).encode('utf8') if row[field] is not None else ''
+            for field in fields])
+
+
+def export_lines(kind, fmt):
+    """Yield the lines of the export in the given format"""
+    if fmt == 'csv':
+        return csv_lines(kind)
+    return ndjson_lines(kind)
+
+
+def snapshot_name(kind, fmt, date):
+    """The storage path of a nightly snapshot"""
+    return 'exports/%s/%s.%s.gz' % (date.isoformat(), kind, fmt)
+
+
+def latest_name(kind, fmt):
+    """The storage path of the most recent snapshot"""
+    return 'exports/latest/%s.%s.gz' % (kind, fmt)
+
+
+def write_snapshot(kind, fmt, date):
+    """Write a gzipped snapshot of the export to storage, via a temporary
+    file so the export is never held in memory, and return its name"""
+    with tempfile.TemporaryFile() as temp:
+        with gzip.GzipFile(fileobj=temp, mode='wb') as gz_file:
+            for line in export_lines(kind, fmt):
+                gz_file.write(line)
+        names = [snapshot_name(kind, fmt, date), latest_name(kind, fmt)]
+        for name in names:
+            temp.seek(0)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            default_storage.save(name, File(temp))
+    return names[0]
@@ -5,25 +5,91 @@ Feeds for the FOIA application
 # pylint: disable=no-name-in-module
 from django.contrib.auth.models import User
 from django.contrib.syndication.views import Feed
-from django.http import Http404
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
 from django.template.defaultfilters import escape, linebreaks
 
-from muckrock.foia.models import FOIARequest, FOIACommunication
+from hashlib import md5
 
-class LatestSubmittedRequests(Feed):
+from muckrock.foia.models import FOIARequest, FOIACommunication
+from muckrock.utils import conditional
+
+class ConditionalFeed(Feed):
+    """
+    A feed which answers conditional requests, and shares its rendered body
+    through the cache, so feed readers polling it do not cause it to be
+    built again until it changes
+    """
+    cache_timeout = 5 * 60
+
+    def get_validator(self, *args, **kwargs):
+        """A value, from a cheap query, which changes whenever the feed does,
+        or None to serve the feed without answering conditional requests"""
+        # pylint: disable=no-self-use, unused-argument
+        return None
+
+    def get_last_modified(self, validator):
+        """The last modified time, if the validator includes one"""
+        # pylint: disable=no-self-use, unused-argument
+        return None
+
+    def __call__(self, request, *args, **kwargs):
+        validator = self.get_validator(*args, **kwargs)
+        if validator is None:
+            return super(ConditionalFeed, self).__call__(request, *args, **kwargs)
+        etag = md5(repr((
+            self.__class__.__name__,
+            args,
+            sorted(kwargs.items()),
+            validator,
+            ))).hexdigest()
+        last_modified = self.get_last_modified(validator)
+
+        @conditional(etag, last_modified)
+        def view(request, *args, **kwargs):
+            """Serve the feed from the cache if possible"""
+            key = 'feed:%s' % etag
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+            response = super(ConditionalFeed, self).__call__(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(
+                        key,
+                        (response.content, response['Content-Type']),
+                        self.cache_timeout)
+            return response
+
+        return view(request, *args, **kwargs)
+
+
+class LatestSubmittedRequests(ConditionalFeed):
     """An RSS Feed for submitted FOIA requests"""
     title = 'Muckrock Submitted Requests'
     link = '/foi/'
     description = 'Recently submitted FOI requests on MuckRock'
 
-    def items(self):
-        """Return the items for the rss feed"""
+    def get_queryset(self):
+        """The requests for the feed, newest first"""
         # pylint: disable=no-self-use
         return (FOIARequest.objects
                 .get_submitted()
                 .get_public()
-                .order_by('-date_submitted')
+                .order_by('-date_submitted', '-pk'))
+
+    def get_validator(self):
+        """The feed changes when the newest requests do"""
+        # pylint: disable=arguments-differ
+        return list(self.get_queryset()
+                .with_last_change()
+                .values_list('pk', 'last_change')[:25])
+
+    def items(self):
+        """Return the items for the rss feed"""
+        return (self.get_queryset()
                 .select_related('jurisdiction')
                 .prefetch_related('communications')[:25])
 
@@ -32,19 +98,30 @@ class LatestSubmittedRequests(Feed):
         return linebreaks(escape(item.first_request()))
 
 
-class LatestDoneRequests(Feed):
+class LatestDoneRequests(ConditionalFeed):
     """An RSS Feed for completed FOIA requests"""
     title = 'Muckrock Completed Requests'
     link = '/foi/'
     description = 'Recently completed FOI requests on MuckRock'
 
-    def items(self):
-        """Return the items for the rss feed"""
+    def get_queryset(self):
+        """The requests for the feed, newest first"""
         # pylint: disable=no-self-use
         return (FOIARequest.objects
                 .get_done()
                 .get_public()
-                .order_by('-date_done')
+                .order_by('-date_done', '-pk'))
+
+    def get_validator(self):
+        """The feed changes when the newest requests do"""
+        # pylint: disable=arguments-differ
+        return list(self.get_queryset()
+                .with_last_change()
+                .values_list('pk', 'last_change')[:25])
+
+    def items(self):
+        """Return the items for the rss feed"""
+        return (self.get_queryset()
                 .select_related('jurisdiction')
                 .prefetch_related('communications')[:25])
 
@@ -53,10 +130,26 @@ class LatestDoneRequests(Feed):
         return linebreaks(escape(item.first_request()))
 
 
-class FOIAFeed(Feed):
+class FOIAFeed(ConditionalFeed):
     """Feed for an individual FOI request"""
     # pylint: disable=no-self-use
 
+    def get_validator(self, idx):
+        """The feed changes when the request's communications do"""
+        # pylint: disable=arguments-differ
+        return (FOIARequest.objects
+                .filter(pk=idx, public=True)
+                .annotate(
+                    last_comm=Max('communications__date'),
+                    comm_count=Count('communications'),
+                    )
+                .values_list('title', 'last_comm', 'comm_count')
+                .first())
+
+    def get_last_modified(self, validator):
+        """The date of the latest communication"""
+        return validator[1]
+
     def get_object(self, request, idx):
         """Get the FOIA Request for this feed"""
         # pylint: disable=arguments-differ
@@ -86,10 +179,24 @@ class FOIAFeed(Feed):
         return linebreaks(escape(item.communication))
 
 
-class UserSubmittedFeed(Feed):
+class UserSubmittedFeed(ConditionalFeed):
     """Feed for a user's new submitted requests"""
     # pylint: disable=no-self-use
 
+    def get_queryset(self, username):
+        """The user's requests for the feed, newest first"""
+        return (FOIARequest.objects
+                .get_submitted()
+                .filter(user__username=username, embargo=False)
+                .order_by('-date_submitted', '-pk'))
+
+    def get_validator(self, username):
+        """The feed changes when the user's newest requests do"""
+        # pylint: disable=arguments-differ
+        return list(self.get_queryset(username)
+                .with_last_change()
+                .values_list('pk', 'last_change')[:25])
+
     def get_object(self, request, username):
         """Get the user for this feed"""
         # pylint: disable=arguments-differ
@@ -109,10 +216,7 @@ class UserSubmittedFeed(Feed):
 
     def items(self, obj):
         """The submitted requests are the items for this feed"""
-        return (FOIARequest.objects
-                .get_submitted()
-                .filter(user=obj, embargo=False)
-                .order_by('-date_submitted')
+        return (self.get_queryset(obj.username)
                 .select_related('jurisdiction')
                 .prefetch_related('communications')[:25])
 
@@ -121,10 +225,24 @@ class UserSubmittedFeed(Feed):
         return linebreaks(escape(item.first_request()))
 
 
-class UserDoneFeed(Feed):
+class UserDoneFeed(ConditionalFeed):
     """Feed for a user's completed requests"""
     # pylint: disable=no-self-use
 
+    def get_queryset(self, username):
+        """The user's requests for the feed, newest first"""
+        return (FOIARequest.objects
+                .get_done()
+                .filter(user__username=username, embargo=False)
+                .order_by('-date_submitted', '-pk'))
+
+    def get_validator(self, username):
+        """The feed changes when the user's newest requests do"""
+        # pylint: disable=arguments-differ
+        return list(self.get_queryset(username)
+                .with_last_change()
+                .values_list('pk', 'last_change')[:25])
+
     def get_object(self, request, username):
         """Get the user for this feed"""
         # pylint: disable=arguments-differ
@@ -144,10 +262,7 @@ class UserDoneFeed(Feed):
 
     def items(self, obj):
         """The completed requests are the items for this feed"""
-        return (FOIARequest.objects
-                .get_done()
-                .filter(user=obj, embargo=False)
-                .order_by('-date_submitted')
+        return (self.get_queryset(obj.username)
                 .select_related('jurisdiction')
                 .prefetch_related('communications')[:25])
 
@@ -156,10 +271,27 @@ class UserDoneFeed(Feed):
         return linebreaks(escape(item.first_request()))
 
 
-class UserUpdateFeed(Feed):
+class UserUpdateFeed(ConditionalFeed):
     """Feed for updates to all of user's requests"""
     # pylint: disable=no-self-use
 
+    def get_queryset(self, username):
+        """The communications on the user's requests, newest first"""
+        return (FOIACommunication.objects
+                .filter(foia__user__username=username)
+                .exclude(foia__status='started')
+                .exclude(foia__embargo=True)
+                .order_by('-date'))
+
+    def get_validator(self, username):
+        """The feed changes when the user's newest communications do"""
+        # pylint: disable=arguments-differ
+        return list(self.get_queryset(username).values_list('pk', 'date')[:25])
+
+    def get_last_modified(self, validator):
+        """The date of the latest communication"""
+        return validator[0][1] if validator else None
+
     def get_object(self, request, username):
         """Get the user for this feed"""
         # pylint: disable=arguments-differ
@@ -179,13 +311,7 @@ class UserUpdateFeed(Feed):
 
     def items(self, obj):
         """The communications are the items for this feed"""
-        communications = (FOIACommunication.objects
-                .filter(foia__user=obj)
-                .exclude(foia__status='started')
-                .exclude(foia__embargo=True)
-                .select_related('foia__jurisdiction')
-                .order_by('-date'))
-        return communications[:25]
+        return self.get_queryset(obj.username).select_related('foia__jurisdiction')[:25]
 
     def item_description(self, item):
         """The description of each rss item"""
@@ -0,0 +1,33 @@
+"""
+Write gzipped snapshots of the public request metadata to storage
+"""
+
+from django.core.management.base import BaseCommand
+
+from datetime import date
+
+from muckrock.foia.export import EXPORTS, FORMATS, write_snapshot
+
+class Command(BaseCommand):
+    """Export public requests, communications and files"""
+    help = 'Write gzipped snapshots of the public request metadata to storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+                '--kind',
+                action='append',
+                choices=sorted(EXPORTS),
+                help='What to export, may be given more than once (default all)')
+        parser.add_argument(
+                '--format',
+                action='append',
+                choices=sorted(FORMATS),
+                help='Format to export, may be given more than once (default all)')
+
+    def handle(self, *args, **kwargs):
+        """Write each snapshot"""
+        today = date.today()
+        for kind in kwargs['kind'] or sorted(EXPORTS):
+            for fmt in kwargs['format'] or sorted(FORMATS):
+                name = write_snapshot(kind, fmt, today)
+                self.stdout.write('Wrote %s' % name)
@@ -0,0 +1,28 @@
+"""
+Rebuild the denormalized public flags and access rows of requests
+"""
+
+from django.core.management.base import BaseCommand
+
+from muckrock.foia.models import FOIARequest
+
+class Command(BaseCommand):
+    """Rebuild the public flags and access rows of all requests"""
+    help = 'Recalculate the public flag and access rows of every request in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+                '--batch-size',
+                type=int,
+                default=1000,
+                help='Number of requests in each batch')
+
+    def handle(self, *args, **kwargs):
+        """Rebuild the requests one range of primary keys at a time"""
+        batch_size = kwargs['batch_size']
+        pks = list(FOIARequest.objects.order_by('pk').values_list('pk', flat=True))
+        for start in xrange(0, len(pks), batch_size):
+            (FOIARequest.objects
+                    .filter(pk__in=pks[start:start + batch_size])
+                    .update_access())
+        self.stdout.write('Rebuilt access for %d requests' % len(pks))
@@ -0,0 +1,68 @@
+"""
+Recalculate the full text search vectors of requests and communications
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from multiprocessing import Pool
+
+from muckrock.foia.search import COLUMNS, reindex
+
+def reindex_batch(args):
+    """Reindex one batch, in a worker process"""
+    table, start, stop = args
+    return reindex(table, start, stop)
+
+
+def close_connection():
+    """Each worker process must open its own database connection, rather
+    than sharing the one inherited from the parent"""
+    connection.close()
+
+
+class Command(BaseCommand):
+    """Reindex requests and communications for full text search"""
+    help = 'Recalculate the full text search vectors in parallel batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+                '--table',
+                action='append',
+                choices=sorted(COLUMNS),
+                help='Table to reindex, may be given more than once (default all)')
+        parser.add_argument(
+                '--processes',
+                type=int,
+                default=4,
+                help='Number of batches to reindex at once')
+        parser.add_argument(
+                '--batch-size',
+                type=int,
+                default=5000,
+                help='Number of rows in each batch')
+
+    def handle(self, *args, **kwargs):
+        """Split each table into ranges of primary keys and reindex them"""
+        batch_size = kwargs['batch_size']
+        batches = []
+        for table in kwargs['table'] or sorted(COLUMNS):
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT min(id), max(id) FROM %s' % table)
+                min_id, max_id = cursor.fetchone()
+            if min_id is None:
+                continue
+            batches.extend(
+                    (table, start, start + batch_size)
+                    for start in xrange(min_id, max_id + 1, batch_size))
+        connection.close()
+
+        pool = Pool(kwargs['processes'], initializer=close_connection)
+        try:
+            total = 0
+            for count in pool.imap_unordered(reindex_batch, batches):
+                total += count
+            self.stdout.write('Reindexed %d rows in %d batches' % (total, len(batches)))
+        finally:
+            pool.close()
+            pool.join()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+def set_public(apps, schema_editor):
+    """Initialize the public field"""
+    FOIARequest = apps.get_model('foia', 'FOIARequest')
+    (FOIARequest.objects
+            .exclude(status='started')
+            .filter(embargo=False)
+            .update(public=True))
+
+# fill in the access table in bulk from the current owners, collaborators,
+# organization sharing and agency users
+populate_access_sql = """
+    INSERT INTO foia_foiaaccess (user_id, foia_id, level)
+        SELECT user_id, id, 'owner' FROM foia_foiarequest;
+    INSERT INTO foia_foiaaccess (user_id, foia_id, level)
+        SELECT user_id, foiarequest_id, 'edit' FROM foia_foiarequest_edit_collaborators;
+    INSERT INTO foia_foiaaccess (user_id, foia_id, level)
+        SELECT user_id, foiarequest_id, 'view' FROM foia_foiarequest_read_collaborators;
+    INSERT INTO foia_foiaaccess (user_id, foia_id, level)
+        SELECT member.user_id, foia.id, 'org'
+        FROM foia_foiarequest AS foia
+        INNER JOIN accounts_profile AS owner ON owner.user_id = foia.user_id
+        INNER JOIN accounts_profile AS member
+            ON member.organization_id = owner.organization_id
+        WHERE owner.org_share AND member.user_id != foia.user_id;
+    INSERT INTO foia_foiaaccess (user_id, foia_id, level)
+        SELECT profile.user_id, foia.id, 'agency'
+        FROM foia_foiarequest AS foia
+        INNER JOIN accounts_profile AS profile ON profile.agency_id = foia.agency_id
+        WHERE profile.acct_type = 'agency' AND foia.status != 'started';
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounts', '0027_auto_20170423_2126'),
+        ('foia', '0032_auto_20170423_2156'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foiarequest',
+            name='public',
+            field=models.BooleanField(db_index=True, default=False, editable=False, help_text=b'Denormalized - is this request neither a draft nor embargoed'),
+        ),
+        migrations.CreateModel(
+            name='FOIAAccess',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(choices=[(b'owner', b'Owner'), (b'edit', b'Editor'), (b'view', b'Viewer'), (b'org', b'Organization'), (b'agency', b'Agency')], max_length=6)),
+                ('foia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='access', to='foia.FOIARequest')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='foia_access', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'FOIA Access',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='foiaaccess',
+            unique_together=set([('user', 'foia', 'level')]),
+        ),
+        migrations.RunPython(set_public, migrations.RunPython.noop),
+        migrations.RunSQL(populate_access_sql, 'DELETE FROM foia_foiaaccess;'),
+    ]
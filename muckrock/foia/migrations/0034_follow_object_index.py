@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Index the follow table by followed object, so follower counts and
+    notification fan out do not scan the whole table"""
+
+    dependencies = [
+        ('actstream', '0001_initial'),
+        ('foia', '0033_foia_access'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX actstream_follow_object_idx '
+            'ON actstream_follow (content_type_id, object_id);',
+            'DROP INDEX actstream_follow_object_idx;',
+        ),
+    ]
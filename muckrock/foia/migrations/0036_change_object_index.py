@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('foia', '0035_change'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='change',
+            index_together=set([('content_type', 'object_id')]),
+        ),
+    ]
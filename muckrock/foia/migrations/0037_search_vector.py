@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from muckrock.foia.search import trigger_sql, reverse_trigger_sql
+
+TABLES = ('foia_foiarequest', 'foia_foiacommunication')
+
+
+class Migration(migrations.Migration):
+    """Add full text search vectors to requests and communications, kept up
+    to date by triggers.  The columns are left empty here - fill them in
+    with the reindex_search command, which works in parallel batches."""
+
+    dependencies = [
+        ('foia', '0036_change_object_index'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'ALTER TABLE {table} ADD COLUMN search_vector tsvector;'
+            .format(table=table),
+            'ALTER TABLE {table} DROP COLUMN search_vector;'
+            .format(table=table),
+        ) for table in TABLES
+    ] + [
+        migrations.RunSQL(trigger_sql(table), reverse_trigger_sql(table))
+        for table in TABLES
+    ] + [
+        migrations.RunSQL(
+            'CREATE INDEX {table}_search_vector_idx '
+            'ON {table} USING gin (search_vector);'
+            .format(table=table),
+            'DROP INDEX {table}_search_vector_idx;'
+            .format(table=table),
+        ) for table in TABLES
+    ]
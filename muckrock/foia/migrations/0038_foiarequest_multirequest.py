@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foia', '0037_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foiarequest',
+            name='multirequest',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='foias', to='foia.FOIAMultiRequest'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agency', '0010_agency_search_document'),
+        ('foia', '0038_foiarequest_multirequest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MultiRequestSubmission',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(choices=[(b'pending', b'Pending'), (b'sent', b'Sent'), (b'failed', b'Failed')], db_index=True, default=b'pending', max_length=7)),
+                ('error', models.TextField(blank=True)),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+                ('agency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='agency.Agency')),
+                ('foia', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='foia.FOIARequest')),
+                ('multirequest', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submissions', to='foia.FOIAMultiRequest')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='multirequestsubmission',
+            unique_together=set([('multirequest', 'agency')]),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foia', '0039_multirequestsubmission'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='foiacommunication',
+            index_together=set([('foia', 'response', 'date')]),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Parse the sender's domain out of each communication once, so orphans
+    can be matched against the blacklist with an index"""
+
+    dependencies = [
+        ('foia', '0040_foiacommunication_response_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foiacommunication',
+            name='sender_domain',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.RunSQL(
+            "UPDATE foia_foiacommunication "
+            "SET sender_domain = COALESCE(lower(substring("
+            "priv_from_who from '@([^@<>[:space:]]+)>?[[:space:]]*$')), '') "
+            "WHERE priv_from_who LIKE '%%@%%';",
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foia', '0041_foiacommunication_sender_domain'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='multirequestsubmission',
+            name='state',
+            field=models.CharField(choices=[(b'pending', b'Pending'), (b'sending', b'Sending'), (b'sent', b'Sent'), (b'failed', b'Failed')], db_index=True, default=b'pending', max_length=7),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Store the sender's domain reversed, so orphans from a blacklisted
+    domain's subdomains can be found with an indexed prefix match instead of
+    a suffix scan"""
+
+    dependencies = [
+        ('foia', '0042_multirequestsubmission_sending'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='foiacommunication',
+            name='sender_domain',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='foiacommunication',
+            name='sender_domain_reversed',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.RunSQL(
+            "UPDATE foia_foiacommunication "
+            "SET sender_domain_reversed = reverse(sender_domain) "
+            "WHERE sender_domain != '';",
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -6,3 +6,5 @@ from muckrock.foia.models.request import *
 from muckrock.foia.models.multirequest import *
 from muckrock.foia.models.communication import *
 from muckrock.foia.models.file import *
+from muckrock.foia.models.access import *
+from muckrock.foia.models.change import *
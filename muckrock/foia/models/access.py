@@ -0,0 +1,178 @@
+"""
+Models for the FOIA application
+"""
+
+from django.contrib.auth.models import User
+from django.db import models, transaction
+
+from collections import defaultdict
+
+ACCESS_LEVELS = (
+        ('owner', 'Owner'),
+        ('edit', 'Editor'),
+        ('view', 'Viewer'),
+        ('org', 'Organization'),
+        ('agency', 'Agency'),
+        )
+
+class FOIAAccessQuerySet(models.QuerySet):
+    """Object manager for FOIA access"""
+
+    def foia_grants(self, foia):
+        """Calculate the (user id, level) pairs which should have access to a request"""
+        # pylint: disable=no-self-use
+        grants = set([(foia.user_id, 'owner')])
+        grants.update((pk, 'edit') for pk in
+                foia.edit_collaborators.values_list('pk', flat=True))
+        grants.update((pk, 'view') for pk in
+                foia.read_collaborators.values_list('pk', flat=True))
+        profile = foia.user.profile
+        if profile.org_share and profile.organization_id is not None:
+            grants.update((pk, 'org') for pk in User.objects
+                    .filter(profile__organization=profile.organization_id)
+                    .exclude(pk=foia.user_id)
+                    .values_list('pk', flat=True))
+        if foia.agency_id is not None and foia.status != 'started':
+            grants.update((pk, 'agency') for pk in User.objects
+                    .filter(
+                        profile__acct_type='agency',
+                        profile__agency=foia.agency_id,
+                        )
+                    .values_list('pk', flat=True))
+        return grants
+
+    def rebuild_for_foia(self, foia):
+        """Bring the access rows for a request up to date"""
+        grants = self.foia_grants(foia)
+        with transaction.atomic():
+            existing = set(self.filter(foia=foia).values_list('user_id', 'level'))
+            for user_id, level in existing - grants:
+                self.filter(foia=foia, user=user_id, level=level).delete()
+            self.bulk_create([
+                self.model(foia_id=foia.pk, user_id=user_id, level=level)
+                for user_id, level in grants - existing])
+
+    def rebuild_for_foias(self, foias):
+        """
+        Bring the access rows for many requests up to date, with a fixed
+        number of queries
+
+        The requests should have their user's profile selected
+        """
+        # avoid circular imports
+        from muckrock.foia.models.request import FOIARequest
+        foias = list(foias)
+        pks = [foia.pk for foia in foias]
+        grants = {foia.pk: set([(foia.user_id, 'owner')]) for foia in foias}
+        for field, level in (('edit_collaborators', 'edit'), ('read_collaborators', 'view')):
+            through = getattr(FOIARequest, field).through
+            for foia_id, user_id in (through.objects
+                    .filter(foiarequest__in=pks)
+                    .values_list('foiarequest_id', 'user_id')):
+                grants[foia_id].add((user_id, level))
+        shared = {foia.pk: foia.user.profile.organization_id for foia in foias
+                if foia.user.profile.org_share and
+                foia.user.profile.organization_id is not None}
+        members = defaultdict(list)
+        for user_id, org_id in (User.objects
+                .filter(profile__organization__in=set(shared.values()))
+                .values_list('pk', 'profile__organization')):
+            members[org_id].append(user_id)
+        agency_users = defaultdict(list)
+        for user_id, agency_id in (User.objects
+                .filter(
+                    profile__acct_type='agency',
+                    profile__agency__in=set(foia.agency_id for foia in foias),
+                    )
+                .values_list('pk', 'profile__agency')):
+            agency_users[agency_id].append(user_id)
+        for foia in foias:
+            if foia.pk in shared:
+                grants[foia.pk].update((pk, 'org') for pk in members[shared[foia.pk]]
+                        if pk != foia.user_id)
+            if foia.agency_id is not None and foia.status != 'started':
+                grants[foia.pk].update(
+                        (pk, 'agency') for pk in agency_users[foia.agency_id])
+        with transaction.atomic():
+            stale = []
+            for pk, foia_id, user_id, level in (self
+                    .filter(foia__in=pks)
+                    .values_list('pk', 'foia_id', 'user_id', 'level')):
+                if (user_id, level) in grants[foia_id]:
+                    grants[foia_id].discard((user_id, level))
+                else:
+                    stale.append(pk)
+            if stale:
+                self.filter(pk__in=stale).delete()
+            self.bulk_create([
+                self.model(foia_id=foia_id, user_id=user_id, level=level)
+                for foia_id, new_grants in grants.iteritems()
+                for user_id, level in new_grants],
+                batch_size=1000)
+
+    def rebuild_for_user(self, user):
+        """
+        Bring the organization and agency access rows involving a user up to
+        date, after their organization, sharing or agency has changed
+        """
+        from muckrock.foia.models.request import FOIARequest
+        profile = user.profile
+        rows = []
+        if profile.org_share and profile.organization_id is not None:
+            # the user's requests are shared with their fellow members
+            members = (User.objects
+                    .filter(profile__organization=profile.organization_id)
+                    .exclude(pk=user.pk)
+                    .values_list('pk', flat=True))
+            foias = FOIARequest.objects.filter(user=user).values_list('pk', flat=True)
+            rows.extend(self.model(foia_id=foia_id, user_id=member_id, level='org')
+                    for foia_id in foias for member_id in members)
+        if profile.organization_id is not None:
+            # the user can view requests shared by their fellow members
+            foias = (FOIARequest.objects
+                    .filter(
+                        user__profile__organization=profile.organization_id,
+                        user__profile__org_share=True,
+                        )
+                    .exclude(user=user)
+                    .values_list('pk', flat=True))
+            rows.extend(self.model(foia_id=foia_id, user_id=user.pk, level='org')
+                    for foia_id in foias)
+        if profile.acct_type == 'agency' and profile.agency_id is not None:
+            foias = (FOIARequest.objects
+                    .filter(agency=profile.agency_id)
+                    .exclude(status='started')
+                    .values_list('pk', flat=True))
+            rows.extend(self.model(foia_id=foia_id, user_id=user.pk, level='agency')
+                    for foia_id in foias)
+        with transaction.atomic():
+            self.filter(
+                    models.Q(user=user) | models.Q(foia__user=user),
+                    level='org',
+                    ).delete()
+            self.filter(user=user, level='agency').delete()
+            self.bulk_create(rows, batch_size=1000)
+
+
+class FOIAAccess(models.Model):
+    """
+    A denormalized record of a user's access to a request
+
+    Kept up to date from the request's owner, collaborators, organization
+    sharing and agency, so that the requests a user may view can be found
+    with a single indexed lookup
+    """
+    user = models.ForeignKey(User, related_name='foia_access')
+    foia = models.ForeignKey('foia.FOIARequest', related_name='access')
+    level = models.CharField(max_length=6, choices=ACCESS_LEVELS)
+
+    objects = FOIAAccessQuerySet.as_manager()
+
+    def __unicode__(self):
+        return u'%s: %s (%s)' % (self.user, self.foia, self.get_level_display())
+
+    class Meta:
+        # pylint: disable=too-few-public-methods
+        app_label = 'foia'
+        verbose_name = 'FOIA Access'
+        unique_together = (('user', 'foia', 'level'),)
@@ -0,0 +1,56 @@
+"""
+Models for the FOIA application
+"""
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+
+CHANGE_ACTIONS = (
+        ('save', 'Saved'),
+        ('delete', 'Deleted'),
+        )
+
+class ChangeQuerySet(models.QuerySet):
+    """Object manager for changes"""
+
+    def record(self, instance, action):
+        """Record that an object has changed"""
+        return self.create(
+                content_type=ContentType.objects.get_for_model(instance),
+                object_id=instance.pk,
+                action=action,
+                )
+
+    def record_many(self, model, object_ids, action='save'):
+        """Record that many objects of a model have changed, for changes
+        made in bulk which do not send signals"""
+        content_type = ContentType.objects.get_for_model(model)
+        return self.bulk_create([
+            self.model(content_type=content_type, object_id=object_id, action=action)
+            for object_id in object_ids],
+            batch_size=1000)
+
+
+class Change(models.Model):
+    """
+    An append only log of changes to requests, communications, files and
+    agencies
+
+    The ids increase monotonically, so API clients can ask for every change
+    after the last one they saw
+    """
+    content_type = models.ForeignKey(ContentType)
+    object_id = models.PositiveIntegerField()
+    action = models.CharField(max_length=6, choices=CHANGE_ACTIONS)
+    datetime = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    objects = ChangeQuerySet.as_manager()
+
+    def __unicode__(self):
+        return u'%s %s %s' % (self.content_type, self.object_id, self.action)
+
+    class Meta:
+        # pylint: disable=too-few-public-methods
+        app_label = 'foia'
+        ordering = ['pk']
+        index_together = [('content_type', 'object_id')]
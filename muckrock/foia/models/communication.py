@@ -7,6 +7,7 @@ from django.core.exceptions import ValidationError
 from django.core.files.base import ContentFile
 from django.core.validators import validate_email
 from django.db import models
+from django.db.models import Q
 from django.shortcuts import get_object_or_404
 
 from datetime import datetime
@@ -49,6 +50,19 @@ class FOIACommunication(models.Model):
     from_who = models.CharField(max_length=255)
     to_who = models.CharField(max_length=255, blank=True)
     priv_from_who = models.CharField(max_length=255, blank=True)
+    # parsed from priv_from_who, for matching senders against the blacklist
+    sender_domain = models.CharField(
+            max_length=255,
+            blank=True,
+            editable=False,
+            )
+    # reversed, so subdomains can be matched with an indexed prefix search
+    sender_domain_reversed = models.CharField(
+            max_length=255,
+            blank=True,
+            db_index=True,
+            editable=False,
+            )
     priv_to_who = models.CharField(max_length=255, blank=True)
     subject = models.CharField(max_length=255, blank=True)
     date = models.DateTimeField(db_index=True)
@@ -105,12 +119,9 @@ class FOIACommunication(models.Model):
 
     def save(self, *args, **kwargs):
         """Remove controls characters from text before saving"""
-        remove_control = dict.fromkeys(range(0, 9) + range(11, 13) + range(14, 32))
-        self.communication = unicode(self.communication).translate(remove_control)
-        # limit communication length to 150k
-        self.communication = self.communication[:150000]
-        # special handling for certain agencies
-        self._presave_special_handling()
+        self.clean_communication()
+        self.sender_domain = self.get_sender_domain() or ''
+        self.sender_domain_reversed = self.sender_domain[::-1]
         # update foia's date updated if this is the latest communication
         if (self.foia and
                 (self.foia.date_updated is None or
@@ -118,6 +129,13 @@ class FOIACommunication(models.Model):
             self.foia.date_updated = self.date.date()
             self.foia.save(comment='update date_updated due to new comm')
         super(FOIACommunication, self).save(*args, **kwargs)
+        if self.response and self.foia and self.foia.agency_id:
+            # avoid circular imports
+            from muckrock.agency.models import Agency
+            (Agency.objects
+                    .filter(pk=self.foia.agency_id)
+                    .filter(Q(last_response=None) | Q(last_response__date__lte=self.date))
+                    .update(last_response=self))
 
     def anchor(self):
         """Anchor name"""
@@ -139,6 +157,9 @@ class FOIACommunication(models.Model):
             each_file.foia = move_to_request
             each_file.save()
         self.save()
+        # avoid circular imports
+        from muckrock.task.models import Task
+        Task.objects.update_communication(self)
         logger.info('Communication #%d moved to request #%d', self.id, self.foia.id)
         # if cloning happens, self gets overwritten. so we save it to a variable here
         this_comm = FOIACommunication.objects.get(pk=self.pk)
@@ -244,6 +265,24 @@ class FOIACommunication(models.Model):
         self.foia.save(comment='update primary email from comm')
         return
 
+    def get_sender_domain(self):
+        """Gets the domain of the sender's email address"""
+        _, email_address = email.utils.parseaddr(self.priv_from_who)
+        if '@' not in email_address:
+            return None
+        else:
+            return email_address.split('@')[1].lower()
+
+    def clean_communication(self):
+        """Normalize the text, as it is before saving - also used when the
+        communications are bulk created"""
+        remove_control = dict.fromkeys(range(0, 9) + range(11, 13) + range(14, 32))
+        self.communication = unicode(self.communication).translate(remove_control)
+        # limit communication length to 150k
+        self.communication = self.communication[:150000]
+        # special handling for certain agencies
+        self._presave_special_handling()
+
     def _presave_special_handling(self):
         """Special handling before saving
         For example, strip out BoP excessive quoting"""
@@ -324,6 +363,8 @@ class FOIACommunication(models.Model):
         ordering = ['date']
         verbose_name = 'FOIA Communication'
         app_label = 'foia'
+        # for finding the latest response to a request or an agency
+        index_together = [('foia', 'response', 'date')]
 
 
 class RawEmail(models.Model):
@@ -5,12 +5,20 @@ Models for the FOIA application
 
 from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
-from django.db import models
+from django.db import models, transaction, connection
+from django.db.models import Count, Q
+from django.template import Context
+from django.template.defaultfilters import slugify
+from django.template.loader import get_template
 
+from collections import Counter
+from datetime import date, datetime, timedelta
 from taggit.managers import TaggableManager
 import logging
 
-from muckrock.foia.models.request import STATUS
+from muckrock.foia.models.access import FOIAAccess
+from muckrock.foia.models.change import Change
+from muckrock.foia.models.request import FOIARequest, STATUS
 from muckrock.tags.models import TaggedItemBase
 
 logger = logging.getLogger(__name__)
@@ -45,6 +53,142 @@ class FOIAMultiRequest(models.Model):
                 'foia-multi-draft',
                 kwargs={'slug': self.slug, 'idx': self.pk})
 
+    def create_foias(self):
+        """
+        Create a draft request and its communication for each agency which
+        does not have one yet, in bulk in a single transaction, and return
+        their primary keys
+
+        Agencies which already have a request are skipped, so this may be
+        safely run again after being interrupted.  The request text only
+        depends on the jurisdiction, so it is rendered once per
+        jurisdiction.  The submitted and due dates are left for submit() to
+        set, as the requests may not be sent today
+        """
+        # pylint: disable=too-many-locals
+        from muckrock.foia.models.communication import FOIACommunication
+        template = get_template('text/foia/request.txt')
+        user_name = self.user.get_full_name()
+        today = date.today()
+        now = datetime.now()
+        texts = {}
+        foias = []
+        agencies = (self.agencies
+                .select_related('jurisdiction__parent')
+                .exclude(pk__in=self.foias.values('agency_id')))
+        for agency in agencies:
+            jurisdiction = agency.jurisdiction
+            if jurisdiction.pk not in texts:
+                context = Context({
+                    'document_request': self.requested_docs,
+                    'jurisdiction': jurisdiction,
+                    'user_name': user_name,
+                    })
+                texts[jurisdiction.pk] = (template.render(context)
+                        .split('\n', 1)[1].strip())
+            title = '%s (%s)' % (self.title, agency.name)
+            foia = FOIARequest(
+                    user_id=self.user_id,
+                    status='started',
+                    title=title.strip(),
+                    slug=slugify(title),
+                    jurisdiction=jurisdiction,
+                    agency=agency,
+                    embargo=self.embargo,
+                    requested_docs=self.requested_docs,
+                    description=self.requested_docs,
+                    multirequest=self,
+                    email=agency.get_email(),
+                    other_emails=agency.other_emails,
+                    date_updated=today,
+                    )
+            foias.append(foia)
+
+        with transaction.atomic():
+            # lock the multi request, so a retry running alongside the
+            # original can not create the same requests again
+            FOIAMultiRequest.objects.select_for_update().get(pk=self.pk)
+            new_agencies = set(foia.agency_id for foia in foias)
+            new_agencies.difference_update(
+                    self.foias.values_list('agency_id', flat=True))
+            foias = [draft for draft in foias if draft.agency_id in new_agencies]
+            FOIARequest.objects.bulk_create(foias, batch_size=500)
+            # this version of Django does not set the primary keys of bulk
+            # created objects, so fetch them back
+            created = {
+                    foia.agency_id: foia
+                    for foia in self.foias
+                    .filter(agency__in=new_agencies)
+                    .select_related('agency', 'user__profile')}
+            created_pks = [draft.pk for draft in created.itervalues()]
+            comms = []
+            for foia in created.itervalues():
+                comm = FOIACommunication(
+                        foia=foia,
+                        from_who=user_name,
+                        to_who=foia.get_to_who(),
+                        date=now,
+                        response=False,
+                        full_html=False,
+                        communication=texts[foia.jurisdiction_id],
+                        )
+                comm.clean_communication()
+                comms.append(comm)
+            FOIACommunication.objects.bulk_create(comms, batch_size=500)
+            # bulk creating skips the signals which feed the change log
+            Change.objects.record_many(FOIARequest, created_pks)
+            Change.objects.record_many(
+                    FOIACommunication,
+                    FOIACommunication.objects
+                    .filter(foia__in=created_pks)
+                    .values_list('pk', flat=True))
+            # bulk creating skips save, so build the access rows here
+            FOIAAccess.objects.rebuild_for_foias(created.itervalues())
+            self.create_submissions()
+            self.link_submissions()
+        return created_pks
+
+    def create_submissions(self):
+        """Start tracking the submission to each agency"""
+        existing = self.submissions.values_list('agency_id', flat=True)
+        MultiRequestSubmission.objects.bulk_create([
+            MultiRequestSubmission(multirequest=self, agency_id=agency_id)
+            for agency_id in self.agencies
+            .exclude(pk__in=existing)
+            .values_list('pk', flat=True)])
+
+    def link_submissions(self):
+        """Link each submission to the request created for its agency"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                    'UPDATE foia_multirequestsubmission AS submission '
+                    'SET foia_id = foia.id '
+                    'FROM foia_foiarequest AS foia '
+                    'WHERE submission.multirequest_id = %s '
+                    'AND submission.foia_id IS NULL '
+                    'AND foia.multirequest_id = submission.multirequest_id '
+                    'AND foia.agency_id = submission.agency_id',
+                    [self.pk])
+
+    def progress(self):
+        """How many of the agencies the requests have been sent to, are
+        pending, are being sent to, or have failed, counted from the
+        prefetched submissions if there are any"""
+        progress = dict.fromkeys(
+                [state for state, _ in SUBMISSION_STATES] + ['total'], 0)
+        if 'submissions' in getattr(self, '_prefetched_objects_cache', {}):
+            counts = Counter(
+                    submission.state for submission in self.submissions.all())
+        else:
+            counts = dict(self.submissions
+                    .order_by()
+                    .values_list('state')
+                    .annotate(Count('pk')))
+        for state, count in counts.iteritems():
+            progress[state] = count
+            progress['total'] += count
+        return progress
+
     class Meta:
         # pylint: disable=too-few-public-methods
         ordering = ['title']
@@ -53,3 +197,68 @@ class FOIAMultiRequest(models.Model):
         permissions = (
             ('file_multirequest', 'Can submit requests to multiple agencies'),
             )
+
+
+SUBMISSION_STATES = (
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+        )
+
+# a submission still being sent after this long was claimed by a worker
+# which has since died, and may be claimed again
+SENDING_TIMEOUT = timedelta(minutes=30)
+
+class MultiRequestSubmissionQuerySet(models.QuerySet):
+    """Object manager for multi request submissions"""
+
+    def get_stale(self):
+        """Submissions whose sending has not finished in time"""
+        return self.filter(
+                state='sending',
+                date_updated__lt=datetime.now() - SENDING_TIMEOUT)
+
+    def get_claimable(self):
+        """Submissions which may be claimed to be sent"""
+        return self.filter(
+                Q(state__in=['pending', 'failed']) |
+                Q(state='sending', date_updated__lt=datetime.now() - SENDING_TIMEOUT))
+
+    def claim(self):
+        """Claim the submissions to be sent, returning how many were
+        claimed - the time of the claim is recorded, as updating does not
+        set it"""
+        return self.get_claimable().update(
+                state='sending', date_updated=datetime.now())
+
+
+class MultiRequestSubmission(models.Model):
+    """The state of a multi request's submission to one of its agencies"""
+    multirequest = models.ForeignKey(FOIAMultiRequest, related_name='submissions')
+    agency = models.ForeignKey('agency.Agency', related_name='+')
+    foia = models.ForeignKey(
+            FOIARequest,
+            related_name='+',
+            blank=True,
+            null=True,
+            on_delete=models.SET_NULL,
+            )
+    state = models.CharField(
+            max_length=7,
+            choices=SUBMISSION_STATES,
+            default='pending',
+            db_index=True,
+            )
+    error = models.TextField(blank=True)
+    date_updated = models.DateTimeField(auto_now=True)
+
+    objects = MultiRequestSubmissionQuerySet.as_manager()
+
+    def __unicode__(self):
+        return u'%s: %s (%s)' % (self.multirequest, self.agency, self.get_state_display())
+
+    class Meta:
+        # pylint: disable=too-few-public-methods
+        app_label = 'foia'
+        unique_together = (('multirequest', 'agency'),)
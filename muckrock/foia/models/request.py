@@ -5,14 +5,15 @@ Models for the FOIA application
 
 from django.conf import settings
 from django.contrib.auth.models import User, AnonymousUser
+from django.contrib.contenttypes.models import ContentType
 from django.core.mail import EmailMultiAlternatives
 from django.core.urlresolvers import reverse
-from django.db import models, connection
-from django.db.models import Q, Sum, Count
+from django.db import models, connection, transaction
+from django.db.models import Q, Sum, Count, Case, When, BooleanField
 from django.template.defaultfilters import escape, linebreaks, slugify
 from django.template.loader import render_to_string
+from django.utils.functional import cached_property
 
-from actstream.models import followers
 from datetime import datetime, date, timedelta
 from hashlib import md5
 import logging
@@ -21,6 +22,8 @@ from reversion import revisions as reversion
 from taggit.managers import TaggableManager
 
 from muckrock.accounts.models import Notification
+from muckrock.foia.models.access import FOIAAccess
+from muckrock.foia import search
 from muckrock.tags.models import Tag, TaggedItemBase, parse_tags
 from muckrock import task
 from muckrock import fields
@@ -28,10 +31,36 @@ from muckrock import utils
 
 logger = logging.getLogger(__name__)
 
+# the fields which the public flag and the access rows are derived from
+ACCESS_FIELDS = set(['status', 'embargo', 'user', 'user_id', 'agency', 'agency_id'])
+
 class FOIARequestQuerySet(models.QuerySet):
     """Object manager for FOIA requests"""
     # pylint: disable=too-many-public-methods
 
+    def update(self, **kwargs):
+        """Keep the public flag and access rows of the updated requests
+        current when any of the fields they are derived from change"""
+        if not ACCESS_FIELDS.intersection(kwargs):
+            return super(FOIARequestQuerySet, self).update(**kwargs)
+        with transaction.atomic():
+            pks = list(self.values_list('pk', flat=True))
+            count = super(FOIARequestQuerySet, self).update(**kwargs)
+            self.model.objects.filter(pk__in=pks).update_access()
+        return count
+
+    def update_access(self):
+        """Recalculate the public flag and rebuild the access rows of these
+        requests, after they have been changed without being saved"""
+        with transaction.atomic():
+            self.update(public=Case(
+                When(~Q(status='started') & Q(embargo=False), then=True),
+                default=False,
+                output_field=BooleanField(),
+                ))
+            FOIAAccess.objects.rebuild_for_foias(
+                    self.select_related('user__profile'))
+
     def get_submitted(self):
         """Get all submitted FOIA requests"""
         return self.exclude(status='started')
@@ -46,34 +75,36 @@ class FOIARequestQuerySet(models.QuerySet):
 
     def get_viewable(self, user):
         """Get all viewable FOIA requests for given user"""
-
         if user.is_staff:
             return self.all()
 
-        # Requests are visible if you own them, have view or edit permissions,
-        # or if they are not drafts and not embargoed
-        if user.is_authenticated() and user.profile.acct_type == 'agency':
-            return self.filter(
-                    Q(user=user) |
-                    Q(edit_collaborators=user) |
-                    Q(read_collaborators=user) |
-                    Q(agency=user.profile.agency) |
-                    (~Q(status='started') & ~Q(embargo=True)))
-        elif user.is_authenticated():
+        # Requests are visible if they are public, or if the user has been
+        # granted access to them, as the owner, a collaborator, through their
+        # organization or as the agency
+        if user.is_authenticated():
             return self.filter(
-                    Q(user=user) |
-                    Q(edit_collaborators=user) |
-                    Q(read_collaborators=user) |
-                    (~Q(status='started') & ~Q(embargo=True)))
+                    Q(public=True) |
+                    Q(pk__in=FOIAAccess.objects
+                        .filter(user=user)
+                        .values('foia_id')))
         else:
             # anonymous user, filter out drafts and embargoes
-            return (self.exclude(status='started')
-                        .exclude(embargo=True))
+            return self.filter(public=True)
 
     def get_public(self):
         """Get all publically viewable FOIA requests"""
         return self.get_viewable(AnonymousUser())
 
+    def with_last_change(self):
+        """Add the time each request was last saved, from the change log"""
+        content_type = ContentType.objects.get_for_model(self.model)
+        return self.extra(
+                select={'last_change':
+                    'SELECT MAX(datetime) FROM foia_change '
+                    'WHERE content_type_id = %s AND object_id = foia_foiarequest.id'},
+                select_params=(content_type.pk,),
+                )
+
     def get_overdue(self):
         """Get all overdue FOIA requests"""
         return self.filter(status__in=['ack', 'processed'], date_due__lt=date.today())
@@ -141,6 +172,40 @@ class FOIARequestQuerySet(models.QuerySet):
             foias.append(foia)
         return foias
 
+    def search(self, query):
+        """Full text search of requests and their communications, annotated
+        with a relevance rank and ordered by it"""
+        return (self
+                .extra(
+                    select={'rank': search.RANK},
+                    select_params=[query, query, query],
+                    where=[search.MATCH],
+                    params=[query, query],
+                    )
+                .order_by('-rank'))
+
+    def facets(self, limit=10):
+        """Count the requests by status, jurisdiction and agency"""
+        queryset = self.order_by()
+        statuses = dict(STATUS)
+        return {
+                'status': [
+                    dict(row, label=statuses.get(row['status'], row['status']))
+                    for row in queryset
+                    .values('status')
+                    .annotate(count=Count('pk', distinct=True))
+                    .order_by('-count')],
+                'jurisdiction': list(queryset
+                    .values('jurisdiction', 'jurisdiction__name')
+                    .annotate(count=Count('pk', distinct=True))
+                    .order_by('-count')[:limit]),
+                'agency': list(queryset
+                    .exclude(agency=None)
+                    .values('agency', 'agency__name')
+                    .annotate(count=Count('pk', distinct=True))
+                    .order_by('-count')[:limit]),
+                }
+
 
 STATUS = [
     ('started', 'Draft'),
@@ -175,8 +240,68 @@ class Action():
         return self.test
 
 
+class FOIAPermissionContext(object):
+    """
+    The data needed to check permissions on a request, loaded once
+
+    The permission predicates consult this instead of querying for each
+    check, so checking every permission a page needs loads the request's
+    collaborators and thanks status at most once.  Prefetched collaborators
+    and communications are used when present.
+    """
+
+    def __init__(self, foia):
+        self.foia = foia
+
+    def _prefetched(self, name):
+        """Return the prefetched related objects, if they were prefetched"""
+        # pylint: disable=protected-access
+        return getattr(self.foia, '_prefetched_objects_cache', {}).get(name)
+
+    def _user_ids(self, name):
+        """Return the set of user ids for a collaborator relation"""
+        users = self._prefetched(name)
+        if users is not None:
+            return set(user.pk for user in users)
+        return set(getattr(self.foia, name).values_list('pk', flat=True))
+
+    @cached_property
+    def editor_ids(self):
+        """IDs of the users with edit access"""
+        return self._user_ids('edit_collaborators')
+
+    @cached_property
+    def viewer_ids(self):
+        """IDs of the users with view access"""
+        return self._user_ids('read_collaborators')
+
+    @cached_property
+    def has_thanks(self):
+        """Has a thank you been sent for this request?"""
+        comms = self._prefetched('communications')
+        if comms is not None:
+            return any(comm.thanks for comm in comms)
+        return self.foia.communications.filter(thanks=True).exists()
+
+    @property
+    def shared_organization_id(self):
+        """The owner's organization, if they share their requests with it"""
+        profile = self.foia.user.profile
+        if profile.org_share:
+            return profile.organization_id
+        return None
+
+
 class FOIARequest(models.Model):
-    """A Freedom of Information Act request"""
+    """
+    A Freedom of Information Act request
+
+    The public flag and the FOIAAccess rows are derived from the status,
+    embargo, owner and agency, and are kept current by save() and by the
+    queryset's update().  Anything else which changes those fields, such as
+    bulk_create or raw SQL, must call update_access() on the changed
+    requests, or run the rebuild_foia_access command
+    """
     # pylint: disable=too-many-public-methods
     # pylint: disable=too-many-instance-attributes
 
@@ -197,6 +322,12 @@ class FOIARequest(models.Model):
     date_processing = models.DateField(blank=True, null=True)
     embargo = models.BooleanField(default=False)
     permanent_embargo = models.BooleanField(default=False)
+    public = models.BooleanField(
+            default=False,
+            db_index=True,
+            editable=False,
+            help_text='Denormalized - is this request neither a draft nor embargoed',
+            )
     date_embargo = models.DateField(blank=True, null=True)
     price = models.DecimalField(max_digits=14, decimal_places=2, default='0.00')
     requested_docs = models.TextField(blank=True)
@@ -215,6 +346,13 @@ class FOIARequest(models.Model):
             help_text='This request requires a proxy to file, but no such '
             'proxy was avilable upon draft creation.')
     parent = models.ForeignKey('self', blank=True, null=True, on_delete=models.SET_NULL)
+    multirequest = models.ForeignKey(
+            'foia.FOIAMultiRequest',
+            related_name='foias',
+            blank=True,
+            null=True,
+            on_delete=models.SET_NULL,
+            )
     block_incoming = models.BooleanField(
         default=False,
         help_text=('Block emails incoming to this request from '
@@ -267,6 +405,7 @@ class FOIARequest(models.Model):
                 self.date_embargo = None
         if self.status == 'submitted' and self.date_processing is None:
             self.date_processing = date.today()
+        self.public = self.status != 'started' and not self.embargo
 
         # add a reversion comment if possible
         if 'comment' in kwargs:
@@ -274,6 +413,28 @@ class FOIARequest(models.Model):
             if reversion.revision_context_manager.is_active():
                 reversion.set_comment(comment)
         super(FOIARequest, self).save(*args, **kwargs)
+        access_state = self.get_access_state()
+        if access_state != getattr(self, '_access_state', None):
+            FOIAAccess.objects.rebuild_for_foia(self)
+            self._access_state = access_state
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the fields which determine access when loading a request"""
+        instance = super(FOIARequest, cls).from_db(db, field_names, values)
+        instance._access_state = instance.get_access_state()
+        return instance
+
+    def get_access_state(self):
+        """The fields which determine who has been granted access to this
+        request, besides the collaborators"""
+        # read from __dict__ so that deferred fields are not loaded
+        status = self.__dict__.get('status')
+        return (
+                self.__dict__.get('user_id'),
+                self.__dict__.get('agency_id'),
+                status == 'started' if status is not None else None,
+                )
 
     def is_editable(self):
         """Can this request be updated?"""
@@ -303,6 +464,21 @@ class FOIARequest(models.Model):
         """Short cut for checking a FOIA permission"""
         return user.has_perm('foia.%s_foiarequest' % perm, self)
 
+    def get_perm_context(self):
+        """Get the permission context for this request, creating it if needed"""
+        if getattr(self, '_perm_context', None) is None:
+            self._perm_context = FOIAPermissionContext(self)
+        return self._perm_context
+
+    def reset_perm_context(self):
+        """Discard loaded permission data after the collaborators change"""
+        self._perm_context = None
+
+    def __reduce__(self):
+        """Do not pickle loaded permission data along with the request"""
+        self.__dict__.pop('_perm_context', None)
+        return super(FOIARequest, self).__reduce__()
+
     ## Creator
 
     def created_by(self, user):
@@ -313,15 +489,13 @@ class FOIARequest(models.Model):
 
     def has_editor(self, user):
         """Checks whether the given user is an editor."""
-        user_is_editor = False
-        if self.edit_collaborators.filter(pk=user.pk).exists():
-            user_is_editor = True
-        return user_is_editor
+        return user.pk in self.get_perm_context().editor_ids
 
     def add_editor(self, user):
         """Grants the user permission to edit this request."""
         if not self.has_viewer(user) and not self.has_editor(user) and not self.created_by(user):
             self.edit_collaborators.add(user)
+            self.reset_perm_context()
             self.save()
             logger.info('%s granted edit access to %s', user, self)
         return
@@ -330,6 +504,7 @@ class FOIARequest(models.Model):
         """Revokes the user's permission to edit this request."""
         if self.has_editor(user):
             self.edit_collaborators.remove(user)
+            self.reset_perm_context()
             self.save()
             logger.info('%s revoked edit access from %s', user, self)
         return
@@ -344,15 +519,13 @@ class FOIARequest(models.Model):
 
     def has_viewer(self, user):
         """Checks whether the given user is a viewer."""
-        user_is_viewer = False
-        if self.read_collaborators.filter(pk=user.pk).exists():
-            user_is_viewer = True
-        return user_is_viewer
+        return user.pk in self.get_perm_context().viewer_ids
 
     def add_viewer(self, user):
         """Grants the user permission to view this request."""
         if not self.has_viewer(user) and not self.has_editor(user) and not self.created_by(user):
             self.read_collaborators.add(user)
+            self.reset_perm_context()
             self.save()
             logger.info('%s granted view access to %s', user, self)
         return
@@ -361,6 +534,7 @@ class FOIARequest(models.Model):
         """Revokes the user's permission to view this request."""
         if self.has_viewer(user):
             self.read_collaborators.remove(user)
+            self.reset_perm_context()
             logger.info('%s revoked view access from %s', user, self)
             self.save()
         return
@@ -472,7 +646,7 @@ class FOIARequest(models.Model):
             notification.mark_read()
         utils.notify(self.user, action)
         if self.is_public():
-            utils.notify(followers(self), action)
+            utils.notify(utils.follower_users(self), action)
 
     def submit(self, appeal=False, snail=False, thanks=False):
         """
@@ -820,7 +994,7 @@ class FOIARequest(models.Model):
                 user.profile.acct_type == 'agency')
         can_follow = (user.is_authenticated() and not is_owner and
                 not is_agency_user)
-        is_following = user.is_authenticated() and user in followers(self)
+        is_following = utils.is_follower(user, self)
         is_admin = user.is_staff
         kwargs = {
             'jurisdiction': self.jurisdiction.slug,
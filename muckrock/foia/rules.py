@@ -59,24 +59,20 @@ def is_owner(user, foia):
 @skip_if_not_foia
 def is_editor(user, foia):
     return (user.is_authenticated() and
-            foia.edit_collaborators.filter(pk=user.pk).exists())
+            user.pk in foia.get_perm_context().editor_ids)
 
 @predicate
 @skip_if_not_foia
 def is_read_collaborator(user, foia):
     return (user.is_authenticated() and
-            foia.read_collaborators.filter(pk=user.pk).exists())
+            user.pk in foia.get_perm_context().viewer_ids)
 
 @predicate
 @skip_if_not_foia
 @user_authenticated
 def is_org_shared(user, foia):
-    return (
-            foia.user.is_authenticated() and
-            foia.user.profile.org_share and
-            foia.user.profile.organization is not None and
-            foia.user.profile.organization == user.profile.organization
-            )
+    org_id = foia.get_perm_context().shared_organization_id
+    return org_id is not None and org_id == user.profile.organization_id
 
 is_viewer = is_read_collaborator | is_org_shared
 
@@ -94,7 +90,7 @@ is_deletable = has_status('started')
 @predicate
 @skip_if_not_foia
 def has_thanks(user, foia):
-    return foia.communications.filter(thanks=True).exists()
+    return foia.get_perm_context().has_thanks
 
 is_thankable = ~has_thanks & has_status(*END_STATUS)
 
@@ -0,0 +1,130 @@
+"""
+Full text search of requests and communications
+
+Requests and communications each have a `search_vector` tsvector column
+with a GIN index, kept up to date by database triggers.  The columns are
+not model fields, so the documents are never loaded along with the
+objects - they are only used through the SQL here.
+"""
+
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+# the columns making up the document of each table
+COLUMNS = {
+        'foia_foiarequest': ('title', 'description'),
+        'foia_foiacommunication': ('subject', 'communication'),
+        }
+
+# the documents for each table, weighting titles and subjects above bodies
+DOCUMENTS = {
+        'foia_foiarequest':
+            "setweight(to_tsvector('english', coalesce({row}title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce({row}description, '')), 'B')",
+        'foia_foiacommunication':
+            "setweight(to_tsvector('english', coalesce({row}subject, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce({row}communication, '')), 'B')",
+        }
+
+# the vector is only recalculated when the document's columns have
+# actually changed, so saving a request for other reasons stays cheap
+TRIGGER_FUNCTION = """
+CREATE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        NEW.search_vector := {document};
+    ELSIF {changed} THEN
+        NEW.search_vector := {document};
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+CREATE TRIGGER {table}_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF {columns} ON {table}
+    FOR EACH ROW EXECUTE PROCEDURE {table}_search_vector_update();
+"""
+
+# a request matches if its own document or any of its communications match
+MATCH = (
+        "(foia_foiarequest.search_vector @@ plainto_tsquery('english', %s) OR "
+        "foia_foiarequest.id IN (SELECT foia_id FROM foia_foiacommunication "
+        "WHERE search_vector @@ plainto_tsquery('english', %s)))"
+        )
+
+# matches in the request itself count for more than matches in its
+# communications
+RANK = (
+        "coalesce(ts_rank(foia_foiarequest.search_vector, "
+        "plainto_tsquery('english', %s)), 0) + 0.5 * coalesce(("
+        "SELECT max(ts_rank(search_vector, plainto_tsquery('english', %s))) "
+        "FROM foia_foiacommunication "
+        "WHERE foia_id = foia_foiarequest.id "
+        "AND search_vector @@ plainto_tsquery('english', %s)), 0)"
+        )
+
+HEADLINE_START = '[[['
+HEADLINE_STOP = ']]]'
+HEADLINE_OPTIONS = (
+        'StartSel="%s", StopSel="%s", MaxFragments=2, MaxWords=30, MinWords=10'
+        % (HEADLINE_START, HEADLINE_STOP))
+
+
+def document(table, row=''):
+    """The SQL expression for a table's search document"""
+    return DOCUMENTS[table].format(row=row)
+
+
+def trigger_sql(table):
+    """SQL creating the trigger which maintains a table's search vector"""
+    return TRIGGER_FUNCTION.format(
+            table=table,
+            columns=', '.join(COLUMNS[table]),
+            changed=' OR '.join(
+                'NEW.{0} IS DISTINCT FROM OLD.{0}'.format(column)
+                for column in COLUMNS[table]),
+            document=document(table, 'NEW.'))
+
+
+def reverse_trigger_sql(table):
+    """SQL dropping the trigger which maintains a table's search vector"""
+    return (
+            'DROP TRIGGER {table}_search_vector_trigger ON {table};\n'
+            'DROP FUNCTION {table}_search_vector_update();'
+            .format(table=table))
+
+
+def reindex(table, start, stop):
+    """Recalculate the search vectors of a range of primary keys"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+                'UPDATE {table} SET search_vector = {document} '
+                'WHERE id >= %s AND id < %s'
+                .format(table=table, document=document(table)),
+                [start, stop])
+        return cursor.rowcount
+
+
+def headlines(foia_ids, query):
+    """
+    Get HTML highlighting the search terms in the descriptions of the given
+    requests, in a single query, as a dictionary keyed by request id
+    """
+    if not foia_ids:
+        return {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+                "SELECT id, ts_headline('english', description, "
+                "plainto_tsquery('english', %s), %s) "
+                "FROM foia_foiarequest WHERE id IN %s",
+                [query, HEADLINE_OPTIONS, tuple(foia_ids)])
+        rows = cursor.fetchall()
+    # the description is escaped before the highlighting tags are added,
+    # as it is user supplied
+    return {
+            foia_id: mark_safe(escape(headline)
+                .replace(HEADLINE_START, '<mark>')
+                .replace(HEADLINE_STOP, '</mark>'))
+            for foia_id, headline in rows
+            if HEADLINE_START in headline
+            }
@@ -5,7 +5,15 @@ Serilizers for the FOIA application API
 from rest_framework import serializers, permissions
 
 from muckrock.agency.models import Agency
-from muckrock.foia.models import FOIARequest, FOIACommunication, FOIAFile, FOIANote
+from muckrock.foia.models import (
+        Change,
+        FOIARequest,
+        FOIACommunication,
+        FOIAFile,
+        FOIAMultiRequest,
+        FOIANote,
+        MultiRequestSubmission,
+        )
 from muckrock.jurisdiction.models import Jurisdiction
 
 # pylint: disable=too-few-public-methods
@@ -72,6 +80,43 @@ class FOIANoteSerializer(serializers.ModelSerializer):
         exclude = ('id', 'foia')
 
 
+class FOIARequestListSerializer(serializers.ModelSerializer):
+    """A lean serializer for lists of FOIA requests, with counts of the
+    communications and files instead of their contents"""
+    username = serializers.StringRelatedField(source='user')
+    tags = serializers.StringRelatedField(many=True)
+    communication_count = serializers.IntegerField(read_only=True)
+    file_count = serializers.IntegerField(read_only=True)
+    absolute_url = serializers.ReadOnlyField(source='get_absolute_url')
+
+    class Meta:
+        model = FOIARequest
+        fields = (
+            # request details
+            'id',
+            'title',
+            'slug',
+            'status',
+            'embargo',
+            'user',
+            'username',
+            'jurisdiction',
+            'agency',
+            # request dates
+            'date_submitted',
+            'date_due',
+            'date_followup',
+            'date_done',
+            'date_embargo',
+            # connected models
+            'tags',
+            'communication_count',
+            'file_count',
+            # computed fields
+            'absolute_url',
+            )
+
+
 class FOIARequestSerializer(serializers.ModelSerializer):
     """Serializer for FOIA Request model"""
     username = serializers.StringRelatedField(source='user')
@@ -151,3 +196,42 @@ class FOIARequestSerializer(serializers.ModelSerializer):
             # computed fields
             'absolute_url',
             )
+
+
+class ChangeSerializer(serializers.ModelSerializer):
+    """Serializer for the change feed"""
+    model = serializers.SerializerMethodField()
+
+    def get_model(self, obj):
+        """The model of the changed object, as app_label.model"""
+        # pylint: disable=no-self-use
+        content_type = obj.content_type
+        return '%s.%s' % (content_type.app_label, content_type.model)
+
+    class Meta:
+        model = Change
+        fields = ('id', 'model', 'object_id', 'action', 'datetime')
+
+
+class MultiRequestSubmissionSerializer(serializers.ModelSerializer):
+    """Serializer for the state of a multi request's submission to an agency"""
+    agency_name = serializers.CharField(source='agency.name', read_only=True)
+
+    class Meta:
+        model = MultiRequestSubmission
+        fields = ('agency', 'agency_name', 'foia', 'state', 'error', 'date_updated')
+
+
+class FOIAMultiRequestProgressSerializer(serializers.ModelSerializer):
+    """Serializer for the progress of a multi request's submission"""
+    progress = serializers.SerializerMethodField()
+    submissions = MultiRequestSubmissionSerializer(many=True, read_only=True)
+
+    def get_progress(self, obj):
+        """Count the submissions in each state"""
+        # pylint: disable=no-self-use
+        return obj.progress()
+
+    class Meta:
+        model = FOIAMultiRequest
+        fields = ('id', 'title', 'user', 'status', 'progress', 'submissions')
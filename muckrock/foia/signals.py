@@ -1,11 +1,17 @@
 """Model signal handlers for the FOIA applicaiton"""
 
 from django.conf import settings
-from django.db.models.signals import pre_save, post_delete
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
 
 from boto.s3.connection import S3Connection
 
-from muckrock.foia.models import FOIARequest, FOIAFile, OutboundAttachment
+from muckrock.accounts.models import Profile
+from muckrock.foia.models import (
+        FOIARequest,
+        FOIAFile,
+        FOIAAccess,
+        OutboundAttachment,
+        )
 from muckrock.foia.tasks import upload_document_cloud
 
 
@@ -58,6 +64,55 @@ def attachment_delete_s3(sender, **kwargs):
             key.delete()
 
 
+def foia_collaborators_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep the access rows up to date when collaborators change"""
+    # pylint: disable=unused-argument
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # instance is the user
+        if action == 'post_clear':
+            # the access rows have not been updated yet, so they still
+            # show which requests the user collaborated on
+            foias = (FOIARequest.objects
+                    .filter(
+                        access__user=instance,
+                        access__level__in=('edit', 'view'),
+                        )
+                    .distinct())
+        else:
+            foias = FOIARequest.objects.filter(pk__in=pk_set)
+        for foia in foias.select_related('user__profile'):
+            FOIAAccess.objects.rebuild_for_foia(foia)
+    else:
+        FOIAAccess.objects.rebuild_for_foia(instance)
+
+
+ACCESS_PROFILE_FIELDS = ('organization_id', 'org_share', 'acct_type', 'agency_id')
+
+def profile_access_check(sender, instance, **kwargs):
+    """Note if a profile change may change which requests the user can view"""
+    # pylint: disable=unused-argument
+    if instance.pk is None:
+        instance._access_changed = True # pylint: disable=protected-access
+        return
+    old = (Profile.objects
+            .filter(pk=instance.pk)
+            .values(*ACCESS_PROFILE_FIELDS)
+            .first())
+    # pylint: disable=protected-access
+    instance._access_changed = old is None or any(
+            old[field] != getattr(instance, field)
+            for field in ACCESS_PROFILE_FIELDS)
+
+
+def profile_access_update(sender, instance, **kwargs):
+    """Update the access rows for the user after their profile changes"""
+    # pylint: disable=unused-argument
+    if getattr(instance, '_access_changed', True):
+        FOIAAccess.objects.rebuild_for_user(instance.user)
+
+
 pre_save.connect(
         foia_update_embargo,
         sender=FOIARequest,
@@ -77,3 +132,27 @@ post_delete.connect(
         sender=OutboundAttachment,
         dispatch_uid='muckrock.foia.signals.attachment_delete_s3',
         )
+
+
+for through in (
+        FOIARequest.edit_collaborators.through,
+        FOIARequest.read_collaborators.through):
+    m2m_changed.connect(
+            foia_collaborators_changed,
+            sender=through,
+            dispatch_uid='muckrock.foia.signals.collaborators.%s' % through.__name__,
+            )
+
+
+pre_save.connect(
+        profile_access_check,
+        sender=Profile,
+        dispatch_uid='muckrock.foia.signals.profile_access_check',
+        )
+
+
+post_save.connect(
+        profile_access_update,
+        sender=Profile,
+        dispatch_uid='muckrock.foia.signals.profile_access_update',
+        )
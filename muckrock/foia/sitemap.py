@@ -19,3 +19,8 @@ class FoiaSitemap(LimitSitemap):
     def items(self):
         """Return all public FOIA requests"""
         return FOIARequest.objects.select_related('jurisdiction').get_public()
+
+    def lastmod(self, obj):
+        """When was the request last updated?"""
+        # pylint: disable=no-self-use
+        return obj.date_updated
@@ -6,11 +6,10 @@ from celery.task import periodic_task, task
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.files.storage import default_storage
+from django.core.management import call_command
 from django.core.mail import send_mail
 from django.core.urlresolvers import reverse
-from django.template.defaultfilters import slugify
-from django.template.loader import render_to_string, get_template
-from django.template import Context
+from django.template.loader import render_to_string
 
 import dill as pickle
 import dbsettings
@@ -35,11 +34,13 @@ from raven.contrib.celery import register_logger_signal, register_signal
 from scipy.sparse import hstack
 from urllib import quote_plus
 
+from muckrock.accounts.models import Notification
 from muckrock.foia.models import (
     FOIAFile,
     FOIARequest,
     FOIAMultiRequest,
     FOIACommunication,
+    MultiRequestSubmission,
     )
 from muckrock.foia.codes import CODES
 from muckrock.task.models import ResponseTask
@@ -170,36 +171,77 @@ def set_document_cloud_pages(doc_pk, **kwargs):
 
 @task(ignore_result=True, max_retries=10, name='muckrock.foia.tasks.submit_multi_request')
 def submit_multi_request(req_pk, **kwargs):
-    """Submit a multi request to all agencies"""
+    """Create a request to each of the multi request's agencies, and send
+    them all in parallel
+
+    Safe to retry - agencies which already have a request are skipped, and
+    only the requests which are still pending, or whose sending has stalled,
+    are sent"""
+    # pylint: disable=unused-argument
+    req = FOIAMultiRequest.objects.select_related('user').get(pk=req_pk)
+    req.create_foias()
+    pending = ((req.submissions.filter(state='pending') |
+                req.submissions.get_stale())
+            .exclude(foia=None)
+            .values_list('foia_id', flat=True))
+    for foia_pk in pending:
+        send_multi_request_foia.delay(foia_pk)
+    # the multi request is kept, to track the progress of the sending
+    for task_ in req.multirequesttask_set.filter(resolved=False):
+        task_.resolve()
+
+
+@task(ignore_result=True, max_retries=3, name='muckrock.foia.tasks.send_multi_request_foia')
+def send_multi_request_foia(foia_pk, **kwargs):
+    """Submit one of the requests created for a multi request
+
+    The submission is claimed first, with a single conditional update, so
+    that if the request has been queued more than once, only one worker
+    sends it.  A claim which has gone stale may be taken over - the request
+    is only submitted if it is still a draft, so it is not sent twice"""
+    submissions = MultiRequestSubmission.objects.filter(foia=foia_pk)
+    if not submissions.claim():
+        return
+    foia = (FOIARequest.objects
+            .select_related('agency__appeal_agency', 'jurisdiction__parent', 'user')
+            .get(pk=foia_pk))
+    if foia.status == 'started':
+        try:
+            foia.submit()
+        except Exception as exc: # pylint: disable=broad-except
+            logger.error('Failed to send multi request foia %d: %s', foia_pk, exc)
+            submissions.update(
+                    state='failed', error=unicode(exc), date_updated=datetime.now())
+            send_multi_request_foia.retry(
+                    args=[foia_pk], countdown=300, kwargs=kwargs, exc=exc)
+    submissions.update(state='sent', error='', date_updated=datetime.now())
+
+@task(ignore_result=True, max_retries=3, name='muckrock.foia.tasks.update_status_changes')
+def update_status_changes(foia_pks, **kwargs):
+    """Update the dates of requests whose status has been changed in bulk,
+    and notify their users"""
     # pylint: disable=unused-argument
-    req = FOIAMultiRequest.objects.get(pk=req_pk)
-
-    # break the agencies into chunks of 50 to not timeout the database
-    agencies = req.agencies.all()
-    agency_chunks = [agencies[i*50:(i+1)*50] for i in xrange(agencies.count()/50 + 1)]
-
-    for agency_chunk in agency_chunks:
-        for agency in agency_chunk:
-            # make a copy of the foia (and its communication) for each agency
-            title = '%s (%s)' % (req.title, agency.name)
-            template = get_template('text/foia/request.txt')
-            context = Context({'document_request': req.requested_docs,
-                               'jurisdiction': agency.jurisdiction,
-                               'user_name': req.user.get_full_name()})
-            foia_request = template.render(context).split('\n', 1)[1].strip()
-
-            new_foia = FOIARequest.objects.create(
-                user=req.user, status='started', title=title, slug=slugify(title),
-                jurisdiction=agency.jurisdiction, agency=agency, embargo=req.embargo,
-                requested_docs=req.requested_docs, description=req.requested_docs)
-
-            FOIACommunication.objects.create(
-                foia=new_foia, from_who=new_foia.user.get_full_name(),
-                to_who=new_foia.get_to_who(), date=datetime.now(), response=False,
-                full_html=False, communication=foia_request)
-
-            new_foia.submit()
-    req.delete()
+    # avoid circular imports
+    from muckrock.sidebar.context_processors import invalidate_user_payload
+    foias = (FOIARequest.objects
+            .filter(pk__in=foia_pks)
+            .select_related('jurisdiction', 'user'))
+    user_ids = set()
+    for foia in foias:
+        foia.update_dates()
+        foia.notify(generate_status_action(foia))
+        # Mark generic '<Agency> sent a communication to <FOIARequest> as read.'
+        # https://github.com/MuckRock/muckrock/issues/1003
+        notifications = (Notification.objects
+                .for_object(foia)
+                .get_unread()
+                .filter(action__verb='sent a communication'))
+        user_ids.update(notifications.values_list('user_id', flat=True))
+        notifications.update(read=True)
+    # the update skips the signals which clear the cached unread counts
+    if user_ids:
+        invalidate_user_payload(*user_ids)
+
 
 @task(ignore_result=True, max_retries=3, name='muckrock.foia.tasks.classify_status')
 def classify_status(task_pk, **kwargs):
@@ -422,6 +464,13 @@ def retry_stuck_documents():
     for doc in docs:
         upload_document_cloud.apply_async(args=[doc.pk, False])
 
+@periodic_task(run_every=crontab(hour=4, minute=30),
+               name='muckrock.foia.tasks.export_snapshots',
+               time_limit=3600)
+def export_snapshots():
+    """Write the nightly snapshots of the public request metadata"""
+    call_command('export_foia')
+
 class SizeError(Exception):
     """Uploaded file is not the correct size"""
 
@@ -0,0 +1,125 @@
+"""
+Tests the denormalized access rows used to filter viewable requests
+"""
+
+from django.contrib.auth.models import AnonymousUser
+from django.test import TestCase
+
+from nose.tools import eq_, ok_
+
+from muckrock.factories import (
+        AgencyFactory,
+        FOIARequestFactory,
+        OrganizationFactory,
+        UserFactory,
+        )
+from muckrock.foia.models import FOIARequest, FOIAAccess
+import muckrock.foia.signals # pylint: disable=unused-import
+
+# pylint: disable=no-self-use
+
+class TestFOIAAccess(TestCase):
+    """Viewable requests should be found through the access rows"""
+
+    def viewable(self, user):
+        """The pks of the requests viewable by the user"""
+        return set(FOIARequest.objects.get_viewable(user).values_list('pk', flat=True))
+
+    def test_public_flag(self):
+        """The public flag should follow the status and embargo"""
+        foia = FOIARequestFactory(status='started')
+        ok_(not foia.public)
+        foia.status = 'submitted'
+        foia.save()
+        ok_(foia.public)
+        foia.embargo = True
+        foia.save()
+        ok_(not foia.public)
+
+    def test_anonymous(self):
+        """Anonymous users should only see public requests"""
+        public = FOIARequestFactory(status='done')
+        FOIARequestFactory(status='done', embargo=True)
+        FOIARequestFactory(status='started')
+        eq_(self.viewable(AnonymousUser()), set([public.pk]))
+
+    def test_collaborators(self):
+        """Owners, editors and viewers should see embargoed requests"""
+        foia = FOIARequestFactory(status='done', embargo=True)
+        editor = UserFactory()
+        viewer = UserFactory()
+        stranger = UserFactory()
+        foia.add_editor(editor)
+        foia.add_viewer(viewer)
+        ok_(foia.pk in self.viewable(foia.user))
+        ok_(foia.pk in self.viewable(editor))
+        ok_(foia.pk in self.viewable(viewer))
+        ok_(foia.pk not in self.viewable(stranger))
+        foia.remove_viewer(viewer)
+        ok_(foia.pk not in self.viewable(viewer))
+        eq_(self.viewable(UserFactory(is_staff=True)), set([foia.pk]))
+
+    def test_organization(self):
+        """Organization members should see requests shared with them"""
+        org = OrganizationFactory()
+        foia = FOIARequestFactory(status='done', embargo=True)
+        member = UserFactory()
+        member.profile.organization = org
+        member.profile.save()
+        ok_(foia.pk not in self.viewable(member))
+        profile = foia.user.profile
+        profile.organization = org
+        profile.org_share = True
+        profile.save()
+        ok_(foia.pk in self.viewable(member))
+        profile.org_share = False
+        profile.save()
+        ok_(foia.pk not in self.viewable(member))
+
+    def test_agency(self):
+        """Agency users should see their agency's submitted requests"""
+        agency = AgencyFactory()
+        agency_user = UserFactory(profile__acct_type='agency', profile__agency=agency)
+        draft = FOIARequestFactory(agency=agency, status='started', embargo=True)
+        foia = FOIARequestFactory(agency=agency, status='ack', embargo=True)
+        eq_(self.viewable(agency_user), set([foia.pk]))
+        draft.status = 'submitted'
+        draft.save()
+        eq_(self.viewable(agency_user), set([foia.pk, draft.pk]))
+
+    def test_rebuild(self):
+        """Rebuilding should not duplicate or lose rows"""
+        foia = FOIARequestFactory()
+        FOIAAccess.objects.rebuild_for_foia(foia)
+        FOIAAccess.objects.rebuild_for_foia(foia)
+        eq_(list(foia.access.values_list('user_id', 'level')),
+                [(foia.user_id, 'owner')])
+
+    def test_queryset_update(self):
+        """Updating the status or embargo in bulk should keep access current"""
+        agency = AgencyFactory()
+        agency_user = UserFactory(profile__acct_type='agency', profile__agency=agency)
+        foia = FOIARequestFactory(agency=agency, status='started', embargo=True)
+        FOIARequest.objects.filter(pk=foia.pk).update(status='ack')
+        eq_(self.viewable(agency_user), set([foia.pk]))
+        ok_(foia.pk not in self.viewable(AnonymousUser()))
+        FOIARequest.objects.filter(pk=foia.pk).update(embargo=False)
+        ok_(foia.pk in self.viewable(AnonymousUser()))
+
+    def test_rebuild_for_foias(self):
+        """Rebuilding in bulk should match rebuilding one at a time"""
+        org = OrganizationFactory()
+        owner = UserFactory(profile__organization=org, profile__org_share=True)
+        member = UserFactory(profile__organization=org)
+        editor = UserFactory()
+        foias = FOIARequestFactory.create_batch(3, user=owner, status='done')
+        foias[0].add_editor(editor)
+        expected = set(FOIAAccess.objects.values_list('foia_id', 'user_id', 'level'))
+        ok_((foias[0].pk, editor.pk, 'edit') in expected)
+        ok_((foias[2].pk, member.pk, 'org') in expected)
+        FOIAAccess.objects.all().delete()
+        FOIAAccess.objects.create(foia=foias[1], user=editor, level='view')
+        FOIAAccess.objects.rebuild_for_foias(
+                FOIARequest.objects.select_related('user__profile'))
+        eq_(set(FOIAAccess.objects.values_list('foia_id', 'user_id', 'level')),
+                expected)
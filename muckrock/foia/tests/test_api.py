@@ -0,0 +1,116 @@
+"""
+Tests the FOIA request API
+"""
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+
+from datetime import date, timedelta
+import json
+from nose.tools import eq_, ok_
+
+from muckrock.factories import (
+        AgencyFactory,
+        FOIARequestFactory,
+        FOIACommunicationFactory,
+        FOIAFileFactory,
+        UserFactory,
+        )
+
+class TestFOIARequestAPI(TestCase):
+    """The FOIA request list should be lean and walkable by cursor"""
+
+    def setUp(self):
+        today = date.today()
+        self.foias = [
+                FOIARequestFactory(status='done', date_submitted=today - timedelta(days))
+                for days in (3, 2, 2, 1)]
+        self.foias.append(FOIARequestFactory(status='submitted', date_submitted=None))
+        comm = FOIACommunicationFactory(foia=self.foias[0])
+        FOIACommunicationFactory(foia=self.foias[0])
+        FOIAFileFactory(foia=self.foias[0], comm=comm)
+
+    def get(self, url, **params):
+        """Get the decoded JSON response"""
+        response = self.client.get(url, params)
+        eq_(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_lean_list(self):
+        """The list should show counts instead of communications"""
+        data = self.get(reverse('api-foia-list'))
+        foia = [f for f in data['results'] if f['id'] == self.foias[0].pk][0]
+        ok_('communications' not in foia)
+        eq_(foia['communication_count'], 2)
+        eq_(foia['file_count'], 1)
+
+    def test_expand(self):
+        """Communications are included when asked for"""
+        data = self.get(reverse('api-foia-list'), expand='communications')
+        foia = [f for f in data['results'] if f['id'] == self.foias[0].pk][0]
+        eq_(len(foia['communications']), 2)
+
+    def test_cursor(self):
+        """Following the cursor should visit every request once, in order"""
+        url = reverse('api-foia-list')
+        data = self.get(url, cursor='', page_size=2)
+        pks = [f['id'] for f in data['results']]
+        while data['next']:
+            response = self.client.get(data['next'])
+            data = json.loads(response.content)
+            pks.extend(f['id'] for f in data['results'])
+        eq_(pks, [f.pk for f in self.foias])
+
+    def test_bad_cursor(self):
+        """An invalid cursor is not found"""
+        response = self.client.get(reverse('api-foia-list'), {'cursor': 'bad'})
+        eq_(response.status_code, 404)
+
+
+@override_settings(CHANGE_FEED_DELAY=0)
+class TestChangeFeed(TestCase):
+    """The change feed should list changes since the cursor"""
+
+    def setUp(self):
+        self.client.force_login(UserFactory(is_staff=True))
+
+    def get(self, **params):
+        """Get the decoded JSON response"""
+        response = self.client.get(reverse('api-change-list'), params)
+        eq_(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_private(self):
+        """Changes to private requests are only listed for those who may
+        view them"""
+        public = FOIARequestFactory(status='done')
+        private = FOIARequestFactory(status='done', embargo=True)
+        public_comm = FOIACommunicationFactory(foia=public)
+        private_comm = FOIACommunicationFactory(foia=private)
+        listed = lambda: set(
+                (c['model'], c['object_id']) for c in self.get(cursor='')['results'])
+        self.client.logout()
+        changes = listed()
+        ok_(('foia.foiarequest', public.pk) in changes)
+        ok_(('foia.foiacommunication', public_comm.pk) in changes)
+        ok_(('foia.foiarequest', private.pk) not in changes)
+        ok_(('foia.foiacommunication', private_comm.pk) not in changes)
+        self.client.force_login(private.user)
+        changes = listed()
+        ok_(('foia.foiarequest', private.pk) in changes)
+        ok_(('foia.foiacommunication', private_comm.pk) in changes)
+
+    def test_resume(self):
+        """Only changes after the cursor are listed"""
+        foia = FOIARequestFactory()
+        data = self.get(cursor='')
+        ok_(any(c['model'] == 'foia.foiarequest' and c['object_id'] == foia.pk
+            for c in data['results']))
+        cursor = data['cursor']
+        eq_(self.get(cursor=cursor)['results'], [])
+        agency = AgencyFactory()
+        agency_pk = agency.pk
+        agency.delete()
+        data = self.get(cursor=cursor, model='agency.agency')
+        eq_([(c['object_id'], c['action']) for c in data['results']],
+                [(agency_pk, 'save'), (agency_pk, 'delete')])
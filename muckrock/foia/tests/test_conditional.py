@@ -0,0 +1,117 @@
+"""
+Tests conditional responses for the FOIA feeds and detail page
+"""
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase, modify_settings
+
+from nose.tools import eq_, ok_
+
+from muckrock.factories import FOIARequestFactory, FOIACommunicationFactory
+
+class TestConditionalFeeds(TestCase):
+    """Feeds should not be rebuilt for readers which are up to date"""
+
+    def setUp(self):
+        self.foia = FOIARequestFactory(status='submitted')
+        FOIACommunicationFactory(foia=self.foia)
+
+    def check_not_modified(self, url, change):
+        """The feed is not modified until the change is made"""
+        response = self.client.get(url)
+        eq_(response.status_code, 200)
+        etag = response['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        eq_(response.status_code, 304)
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        eq_(response.status_code, 200)
+        ok_(response['ETag'] != etag)
+
+    def test_submitted(self):
+        """A newly submitted request changes the submitted feed"""
+        self.check_not_modified(
+                reverse('foia-submitted-feed'),
+                lambda: FOIARequestFactory(status='submitted'))
+
+    def test_same_day_edit(self):
+        """Editing a request in the feed changes it, even on the same day"""
+        def edit():
+            """Change the title"""
+            self.foia.title = 'A new title'
+            self.foia.save()
+        self.check_not_modified(reverse('foia-submitted-feed'), edit)
+
+    def test_request(self):
+        """A new communication changes the request's feed"""
+        response = self.client.get(reverse('foia-feed', kwargs={'idx': self.foia.pk}))
+        ok_(response.has_header('Last-Modified'))
+        self.check_not_modified(
+                reverse('foia-feed', kwargs={'idx': self.foia.pk}),
+                lambda: FOIACommunicationFactory(foia=self.foia))
+
+    def test_private(self):
+        """Embargoed requests' feeds are not found"""
+        foia = FOIARequestFactory(status='submitted', embargo=True)
+        response = self.client.get(reverse('foia-feed', kwargs={'idx': foia.pk}))
+        eq_(response.status_code, 404)
+        ok_(not response.has_header('ETag'))
+
+
+class TestConditionalDetail(TestCase):
+    """Anonymous visitors should be told when the request has not changed"""
+
+    def setUp(self):
+        self.foia = FOIARequestFactory(status='submitted')
+        FOIACommunicationFactory(foia=self.foia)
+        self.url = self.foia.get_absolute_url()
+
+    def test_not_modified(self):
+        """Until the request changes"""
+        response = self.client.get(self.url)
+        eq_(response.status_code, 200)
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        eq_(response.status_code, 304)
+        self.foia.status = 'done'
+        self.foia.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        eq_(response.status_code, 200)
+
+    def test_logged_in(self):
+        """Logged in users always get the full page"""
+        self.client.force_login(self.foia.user)
+        response = self.client.get(self.url)
+        ok_(not response.has_header('ETag'))
+
+
+@modify_settings(MIDDLEWARE_CLASSES={
+    'prepend': 'django.middleware.gzip.GZipMiddleware'})
+class TestConditionalGzip(TestCase):
+    """The ETags of compressed responses should still match"""
+
+    def setUp(self):
+        self.foia = FOIARequestFactory(status='submitted')
+        FOIACommunicationFactory(foia=self.foia)
+
+    def check_not_modified(self, url):
+        """The ETag sent back with the gzip suffix is not modified"""
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        eq_(response.status_code, 200)
+        eq_(response['Content-Encoding'], 'gzip')
+        etag = response['ETag']
+        ok_(etag.endswith(';gzip"'))
+        response = self.client.get(
+                url,
+                HTTP_ACCEPT_ENCODING='gzip',
+                HTTP_IF_NONE_MATCH=etag)
+        eq_(response.status_code, 304)
+
+    def test_feed(self):
+        """The request's feed"""
+        self.check_not_modified(reverse('foia-feed', kwargs={'idx': self.foia.pk}))
+
+    def test_detail(self):
+        """The request's detail page"""
+        self.check_not_modified(self.foia.get_absolute_url())
@@ -0,0 +1,86 @@
+"""
+Tests the bulk export of public request metadata
+"""
+
+from django.core.files.storage import FileSystemStorage
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from datetime import date
+import gzip
+import json
+from mock import patch
+from nose.tools import eq_
+import shutil
+import tempfile
+
+from muckrock.factories import (
+        FOIARequestFactory,
+        FOIACommunicationFactory,
+        UserFactory,
+        )
+from muckrock.foia.export import export_rows, write_snapshot
+
+class TestExport(TestCase):
+    """Only public metadata should be exported"""
+
+    def setUp(self):
+        self.public = FOIARequestFactory.create_batch(3, status='done')
+        FOIARequestFactory(status='done', embargo=True)
+        FOIARequestFactory(status='started')
+        FOIACommunicationFactory(foia=self.public[0])
+
+    def test_chunks(self):
+        """Every public request is exported once, whatever the chunk size"""
+        eq_([row['id'] for row in export_rows('requests', chunk_size=2)],
+                [foia.pk for foia in self.public])
+
+    def test_ndjson_view(self):
+        """The export is streamed to staff as one JSON object per line"""
+        self.client.force_login(UserFactory(is_staff=True))
+        response = self.client.get(reverse(
+            'foia-export', kwargs={'kind': 'requests', 'fmt': 'ndjson'}))
+        eq_(response.status_code, 200)
+        lines = ''.join(response.streaming_content).splitlines()
+        eq_([json.loads(line)['id'] for line in lines],
+                [foia.pk for foia in self.public])
+
+    def test_csv_view(self):
+        """The CSV export starts with a header"""
+        self.client.force_login(UserFactory(is_staff=True))
+        response = self.client.get(reverse(
+            'foia-export', kwargs={'kind': 'communications', 'fmt': 'csv'}))
+        lines = ''.join(response.streaming_content).splitlines()
+        eq_(lines[0].split(',')[:2], ['id', 'foia_id'])
+        eq_(len(lines), 2)
+
+    def test_snapshot(self):
+        """Snapshots are written gzipped to storage"""
+        location = tempfile.mkdtemp()
+        try:
+            storage = FileSystemStorage(location=location)
+            with patch('muckrock.foia.export.default_storage', storage):
+                name = write_snapshot('requests', 'ndjson', date(2017, 5, 1))
+                eq_(name, 'exports/2017-05-01/requests.ndjson.gz')
+                with gzip.GzipFile(fileobj=storage.open(name)) as gz_file:
+                    eq_(len(gz_file.read().splitlines()), 3)
+                eq_(storage.exists('exports/latest/requests.ndjson.gz'), True)
+        finally:
+            shutil.rmtree(location)
+
+    def test_public_view(self):
+        """Everyone else is sent to the latest snapshot"""
+        url = reverse('foia-export', kwargs={'kind': 'requests', 'fmt': 'ndjson'})
+        location = tempfile.mkdtemp()
+        try:
+            storage = FileSystemStorage(location=location, base_url='/exports/')
+            with patch('muckrock.foia.export.default_storage', storage), \
+                    patch('muckrock.foia.views.views.default_storage', storage):
+                eq_(self.client.get(url).status_code, 404)
+                write_snapshot('requests', 'ndjson', date(2017, 5, 1))
+                response = self.client.get(url)
+                eq_(response.status_code, 302)
+                eq_(response['Location'].endswith(
+                    '/exports/exports/latest/requests.ndjson.gz'), True)
+        finally:
+            shutil.rmtree(location)
@@ -0,0 +1,108 @@
+"""
+Tests submitting multi requests
+"""
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from datetime import datetime, timedelta
+from mock import patch
+from nose.tools import eq_, ok_
+
+from muckrock.factories import AgencyFactory, FOIAMultiRequestFactory, UserFactory
+from muckrock.foia.models import Change, FOIARequest, FOIACommunication
+from muckrock.foia.tasks import submit_multi_request, send_multi_request_foia
+
+class TestMultiRequestSubmit(TestCase):
+    """A multi request is sent as a request to each of its agencies"""
+
+    def setUp(self):
+        self.agencies = [
+                AgencyFactory(email='foia@agency%d.gov' % i) for i in range(3)]
+        self.agencies.append(AgencyFactory(
+            jurisdiction=self.agencies[0].jurisdiction, email=''))
+        self.multi = FOIAMultiRequestFactory()
+        self.multi.agencies.add(*self.agencies)
+
+    def test_create_foias(self):
+        """A draft request and communication is created for each agency"""
+        pks = self.multi.create_foias()
+        eq_(len(pks), 4)
+        foias = FOIARequest.objects.filter(multirequest=self.multi)
+        eq_(set(foia.agency for foia in foias), set(self.agencies))
+        ok_(all(foia.status == 'started' for foia in foias))
+        # the dates are set when each request is sent
+        ok_(all(foia.date_submitted is None and foia.date_due is None
+            for foia in foias))
+        eq_(FOIACommunication.objects.filter(foia__in=foias).count(), 4)
+        # the owner can see their drafts
+        eq_(FOIARequest.objects.get_viewable(self.multi.user).count(), 4)
+        # and they are in the change feed
+        eq_(set(Change.objects
+            .filter(content_type__model='foiarequest')
+            .values_list('object_id', flat=True)), set(pks))
+        eq_(Change.objects.filter(content_type__model='foiacommunication').count(), 4)
+
+    def test_submit(self):
+        """Each request is sent, and the progress is tracked"""
+        submit_multi_request(self.multi.pk)
+        foias = FOIARequest.objects.filter(multirequest=self.multi)
+        emailed = foias.exclude(agency=self.agencies[-1])
+        ok_(all(foia.status == 'ack' for foia in emailed))
+        ok_(all(foia.date_due is not None for foia in emailed))
+        eq_(foias.get(agency=self.agencies[-1]).status, 'submitted')
+        eq_(self.multi.progress(),
+                {'sent': 4, 'sending': 0, 'pending': 0, 'failed': 0, 'total': 4})
+
+    def test_resume(self):
+        """Running again only creates the missing requests"""
+        self.multi.create_foias()
+        FOIARequest.objects.filter(agency=self.agencies[0]).delete()
+        eq_(len(self.multi.create_foias()), 1)
+        eq_(FOIARequest.objects.filter(multirequest=self.multi).count(), 4)
+        eq_(FOIACommunication.objects
+                .filter(foia__multirequest=self.multi).count(), 4)
+        eq_(self.multi.submissions.exclude(foia=None).count(), 4)
+        eq_(len(self.multi.create_foias()), 0)
+
+    def test_failed(self):
+        """Failures to send are recorded for each agency"""
+        with patch('muckrock.foia.models.FOIARequest.submit',
+                side_effect=ValueError('No route')):
+            submit_multi_request(self.multi.pk)
+        eq_(self.multi.progress()['failed'], 4)
+        ok_(all(submission.error == 'No route'
+            for submission in self.multi.submissions.all()))
+
+    def test_claimed(self):
+        """A request which is already being sent is not sent again"""
+        pks = self.multi.create_foias()
+        self.multi.submissions.update(state='sending')
+        with patch('muckrock.foia.models.FOIARequest.submit') as mock_submit:
+            send_multi_request_foia(pks[0])
+        ok_(not mock_submit.called)
+        eq_(self.multi.progress()['sending'], 4)
+
+    def test_stale_claim(self):
+        """A request whose sending stalled is claimed again"""
+        pks = self.multi.create_foias()
+        self.multi.submissions.update(
+                state='sending', date_updated=datetime.now() - timedelta(hours=1))
+        eq_(self.multi.submissions.get_stale().count(), 4)
+        submit_multi_request(self.multi.pk)
+        eq_(self.multi.progress()['sent'], 4)
+        ok_(FOIARequest.objects.get(pk=pks[0]).status != 'started')
+
+    def test_progress_api(self):
+        """The owner can see the progress of each agency"""
+        submit_multi_request(self.multi.pk)
+        self.client.force_login(self.multi.user)
+        response = self.client.get(
+                reverse('api-multirequest-detail', kwargs={'pk': self.multi.pk}))
+        eq_(response.status_code, 200)
+        eq_(response.data['progress']['sent'], 4)
+        eq_(len(response.data['submissions']), 4)
+        self.client.force_login(UserFactory())
+        response = self.client.get(
+                reverse('api-multirequest-detail', kwargs={'pk': self.multi.pk}))
+        eq_(response.status_code, 404)
@@ -0,0 +1,92 @@
+"""
+Tests the permission rules for FOIA requests
+"""
+
+from django.contrib.auth.models import AnonymousUser
+from django.test import TestCase
+
+from nose.tools import eq_, ok_
+
+from muckrock.factories import (
+        FOIARequestFactory,
+        FOIACommunicationFactory,
+        UserFactory,
+        OrganizationFactory,
+        )
+from muckrock.foia.models import FOIARequest
+
+# pylint: disable=no-self-use
+
+class TestRequestPermissions(TestCase):
+    """The permission context should grant the same permissions as the rules"""
+    def setUp(self):
+        org = OrganizationFactory()
+        self.foia = FOIARequestFactory(status='done', embargo=True)
+        self.users = {
+                'owner': self.foia.user,
+                'editor': UserFactory(),
+                'viewer': UserFactory(),
+                'org_member': org.owner,
+                'staff': UserFactory(is_staff=True),
+                'stranger': UserFactory(),
+                'anonymous': AnonymousUser(),
+                }
+        owner_profile = self.foia.user.profile
+        owner_profile.acct_type = 'pro'
+        owner_profile.organization = org
+        owner_profile.org_share = True
+        owner_profile.save()
+        org.owner.profile.organization = org
+        org.owner.profile.save()
+        self.foia.add_editor(self.users['editor'])
+        self.foia.add_viewer(self.users['viewer'])
+
+    def check_matrix(self, foia, matrix):
+        """Check each permission against the expected users"""
+        for perm, allowed in matrix.iteritems():
+            for name, user in self.users.iteritems():
+                eq_(foia.has_perm(user, perm), name in allowed,
+                        '%s should %sbe granted %s' % (
+                            name, '' if name in allowed else 'not ', perm))
+
+    def test_grant_matrix(self):
+        """Each type of user should get the expected permissions"""
+        editors = ('owner', 'editor', 'staff')
+        self.check_matrix(FOIARequest.objects.get(pk=self.foia.pk), {
+            'view': editors + ('viewer', 'org_member'),
+            'change': editors,
+            'embargo': ('owner',),
+            'thank': editors,
+            'flag': editors + ('viewer', 'org_member', 'stranger'),
+            'upload_attachment': editors,
+            })
+
+    def test_thanked(self):
+        """Requests which have been thanked may not be thanked again"""
+        FOIACommunicationFactory(foia=self.foia, thanks=True)
+        self.check_matrix(FOIARequest.objects.get(pk=self.foia.pk), {'thank': ()})
+
+    def test_loaded_once(self):
+        """The collaborators and thanks status should only be loaded once"""
+        foia = (FOIARequest.objects
+                .select_related('user__profile')
+                .get(pk=self.foia.pk))
+        user = self.users['viewer']
+        user.profile # pylint: disable=pointless-statement
+        ok_(foia.has_perm(user, 'view'))
+        foia.has_perm(user, 'thank')
+        with self.assertNumQueries(0):
+            for perm in ('view', 'change', 'embargo', 'thank', 'flag', 'upload_attachment'):
+                foia.has_perm(user, perm)
+
+    def test_prefetched(self):
+        """Prefetched collaborators should be used"""
+        foia = (FOIARequest.objects
+                .select_related('user__profile')
+                .prefetch_related('edit_collaborators', 'read_collaborators', 'communications')
+                .get(pk=self.foia.pk))
+        user = self.users['editor']
+        user.profile # pylint: disable=pointless-statement
+        with self.assertNumQueries(0):
+            ok_(foia.has_perm(user, 'change'))
+            ok_(foia.has_perm(user, 'thank'))
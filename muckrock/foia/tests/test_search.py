@@ -0,0 +1,62 @@
+"""
+Tests the full text search of requests and communications
+"""
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from nose.tools import eq_, ok_
+
+from muckrock.factories import FOIARequestFactory, FOIACommunicationFactory
+from muckrock.foia.models import FOIARequest
+from muckrock.foia.search import headlines
+
+class TestSearch(TestCase):
+    """Requests should be found by their own text or their communications'"""
+
+    def setUp(self):
+        self.title_match = FOIARequestFactory(
+                status='done', title='Police budget records')
+        self.body_match = FOIARequestFactory(
+                status='submitted',
+                title='Spending',
+                description='All records of the police overtime budget')
+        self.comm_match = FOIARequestFactory(status='done', title='Contracts')
+        FOIACommunicationFactory(
+                foia=self.comm_match,
+                communication='The attached police budget is responsive.')
+        self.no_match = FOIARequestFactory(status='done', title='Parks')
+
+    def test_search(self):
+        """Matches are ranked, with titles first"""
+        results = list(FOIARequest.objects.search('police budget'))
+        eq_(set(results), set([self.title_match, self.body_match, self.comm_match]))
+        eq_(results[0], self.title_match)
+
+    def test_updated(self):
+        """The trigger keeps the search vector up to date"""
+        self.no_match.title = 'Police budget for parks'
+        self.no_match.save()
+        ok_(self.no_match in FOIARequest.objects.search('police budget'))
+
+    def test_facets(self):
+        """Matches are counted by status"""
+        facets = FOIARequest.objects.search('police budget').facets()
+        eq_({row['status']: row['count'] for row in facets['status']},
+                {'done': 2, 'submitted': 1})
+
+    def test_headlines(self):
+        """The search terms are highlighted and the description escaped"""
+        self.body_match.description = '<b>Police</b> budget'
+        self.body_match.save()
+        results = headlines([self.body_match.pk, self.no_match.pk], 'police')
+        eq_(results.keys(), [self.body_match.pk])
+        ok_('<mark>Police</mark>' in results[self.body_match.pk])
+        ok_('&lt;b&gt;' in results[self.body_match.pk])
+
+    def test_list_view(self):
+        """The request list uses the full text search"""
+        response = self.client.get(reverse('foia-list'), {'q': 'police budget'})
+        eq_(response.status_code, 200)
+        eq_(response.context['object_list'][0], self.title_match)
+        ok_('facets' in response.context)
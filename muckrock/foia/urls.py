@@ -95,6 +95,8 @@ urlpatterns = patterns(
         views.drag_drop, name='foia-drag-drop'),
     url(r'^raw_email/(?P<idx>\d+)/$',
         views.raw, name='foia-raw'),
+    url(r'^export/(?P<kind>requests|communications|files)\.(?P<fmt>ndjson|csv)$',
+        views.export, name='foia-export'),
 
     # Feeds
     url(r'^feeds/submitted/$',
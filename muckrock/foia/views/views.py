@@ -7,9 +7,10 @@ from django.contrib import messages
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.core.exceptions import PermissionDenied
+from django.core.files.storage import default_storage
 from django.core.urlresolvers import reverse
-from django.db.models import Prefetch, Count
-from django.http import HttpResponse, Http404
+from django.db.models import Prefetch, Count, Max
+from django.http import HttpResponse, Http404, StreamingHttpResponse
 from django.shortcuts import render_to_response, get_object_or_404, redirect
 from django.template.defaultfilters import slugify
 from django.template import RequestContext
@@ -17,6 +18,7 @@ from django.views.generic import DetailView, TemplateView
 
 from actstream.models import following
 from datetime import datetime, timedelta
+from hashlib import md5
 import json
 import logging
 
@@ -25,6 +27,8 @@ from muckrock.agency.forms import AgencyForm
 from muckrock.agency.models import Agency
 from muckrock.crowdfund.forms import CrowdfundForm
 from muckrock.foia.codes import CODES
+from muckrock.foia.export import export_lines, latest_name, FORMATS
+from muckrock.foia import search
 from muckrock.foia.filters import (
     FOIARequestFilterSet,
     MyFOIARequestFilterSet,
@@ -65,7 +69,8 @@ from muckrock.qanda.models import Question
 from muckrock.qanda.forms import QuestionForm
 from muckrock.tags.models import Tag
 from muckrock.task.models import Task, FlaggedTask, StatusChangeTask, ResponseTask
-from muckrock.utils import new_action
+from muckrock.task.templatetags.task_tags import preload_tasks
+from muckrock.utils import conditional, new_action
 from muckrock.views import class_view_decorator, MRFilterListView, MRSearchFilterListView
 
 # pylint: disable=too-many-ancestors
@@ -161,6 +166,29 @@ class RequestList(MRSearchFilterListView):
         objects = objects.select_related_view()
         return objects.get_viewable(self.request.user)
 
+    def search_queryset(self, queryset, query):
+        """Use the full text search, ranked by relevance"""
+        return queryset.search(query)
+
+    def sort_queryset(self, queryset):
+        """Keep the relevance ordering for searches, unless a sort is chosen"""
+        if self.get_query() and 'sort' not in self.request.GET:
+            return queryset
+        return super(RequestList, self).sort_queryset(queryset)
+
+    def get_context_data(self, **kwargs):
+        """Add facets and highlighted descriptions to searches"""
+        context = super(RequestList, self).get_context_data(**kwargs)
+        query = self.get_query()
+        if query:
+            context['facets'] = context['filter'].qs.facets()
+            foias = list(context['object_list'])
+            headlines = search.headlines([foia.pk for foia in foias], query)
+            for foia in foias:
+                foia.search_headline = headlines.get(foia.pk)
+            context['object_list'] = foias
+        return context
+
 
 @class_view_decorator(login_required)
 class MyRequestList(RequestList):
@@ -255,6 +283,36 @@ class FormError(Exception):
     """If a form fails validation"""
 
 
+def detail_validators(idx):
+    """
+    A cheap ETag and last modified time for the anonymous view of a public
+    request, from a single query, or None if they should not be used
+    """
+    row = (FOIARequest.objects
+            .filter(pk=idx, public=True)
+            .annotate(
+                last_comm=Max('communications__date'),
+                comm_count=Count('communications', distinct=True),
+                file_count=Count('files', distinct=True),
+                )
+            .with_last_change()
+            .values_list(
+                'last_change',
+                'last_comm',
+                'comm_count',
+                'file_count',
+                'crowdfund__payment_received',
+                'sidebar_html',
+                )
+            .first())
+    if row is None or row[-1]:
+        # the sidebar html is shown as a message, which needs a session
+        return None
+    etag = md5(repr(row[:-1])).hexdigest()
+    dates = [date for date in row[:2] if date is not None]
+    return etag, max(dates) if dates else None
+
+
 # pylint: disable=no-self-use
 class Detail(DetailView):
     """Details of a single FOIA request as well
@@ -269,7 +327,7 @@ class Detail(DetailView):
         super(Detail, self).__init__(*args, **kwargs)
 
     def dispatch(self, request, *args, **kwargs):
-        """If request is a draft, then redirect to drafting interface"""
+        """Handle posts, and conditional requests from anonymous visitors"""
         if request.POST:
             try:
                 return self.post(request)
@@ -277,6 +335,20 @@ class Detail(DetailView):
                 # if their is a form error, continue onto the GET path
                 # and show the invalid form with errors displayed
                 return self.get(request, *args, **kwargs)
+        # anonymous visitors without a session all see the same page,
+        # so they may be told it has not changed
+        if (request.method == 'GET' and
+                not request.user.is_authenticated() and
+                settings.SESSION_COOKIE_NAME not in request.COOKIES):
+            validators = detail_validators(kwargs['idx'])
+            if validators is not None:
+                etag, last_modified = validators
+                return conditional(etag, last_modified)(
+                        self.dispatch_detail)(request, *args, **kwargs)
+        return self.dispatch_detail(request, *args, **kwargs)
+
+    def dispatch_detail(self, request, *args, **kwargs):
+        """Show the request, or redirect drafts to the drafting interface"""
         foia = self.get_object()
         if foia.status == 'started':
             return redirect(
@@ -368,7 +440,8 @@ class Detail(DetailView):
 
         if user_can_edit or user.is_staff:
             all_tasks = Task.objects.filter_by_foia(foia, user)
-            open_tasks = [task for task in all_tasks if not task.resolved]
+            open_tasks = preload_tasks(
+                    [task for task in all_tasks if not task.resolved])
             context['task_count'] = len(all_tasks)
             context['open_task_count'] = len(open_tasks)
             context['open_tasks'] = open_tasks
@@ -757,3 +830,24 @@ def acronyms(request):
         {'codes': codes},
         context_instance=RequestContext(request)
     )
+
+
+def export(request, kind, fmt):
+    """
+    Export the metadata for all public requests, communications or files
+
+    Reading the whole export is expensive, so everyone but staff is sent
+    to the latest nightly snapshot in storage
+    """
+    if not request.user.is_staff:
+        name = latest_name(kind, fmt)
+        if not default_storage.exists(name):
+            raise Http404
+        return redirect(default_storage.url(name))
+    response = StreamingHttpResponse(
+            export_lines(kind, fmt),
+            content_type=FORMATS[fmt],
+            )
+    response['Content-Disposition'] = (
+            'attachment; filename="muckrock-%s.%s"' % (kind, fmt))
+    return response
@@ -3,29 +3,43 @@ Viewsets for the FOIA API
 """
 
 from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
 from django.core.files.base import ContentFile
+from django.db.models import Count, Prefetch, Q
 from django.template.defaultfilters import slugify
 from django.template.loader import get_template
 from django.template import RequestContext
 
 import actstream
-from datetime import datetime
+from datetime import datetime, timedelta
 from rest_framework import decorators, status as http_status, viewsets
 from rest_framework.permissions import IsAuthenticated, DjangoModelPermissions
 from rest_framework.response import Response
 import django_filters
 import logging
+import operator
 import requests
 
 from muckrock.agency.models import Agency
-from muckrock.foia.models import FOIARequest, FOIACommunication, FOIAFile
+from muckrock.foia.models import (
+        Change,
+        FOIARequest,
+        FOIACommunication,
+        FOIAFile,
+        FOIAMultiRequest,
+        MultiRequestSubmission,
+        )
 from muckrock.foia.serializers import (
         FOIARequestSerializer,
+        FOIARequestListSerializer,
+        ChangeSerializer,
         FOIACommunicationSerializer,
+        FOIAMultiRequestProgressSerializer,
         FOIAPermissions,
         IsOwner,
         )
 from muckrock.jurisdiction.models import Jurisdiction
+from muckrock.pagination import KeysetPagination
 
 # pylint: disable=too-many-ancestors
 # pylint: disable=bad-continuation
@@ -36,6 +50,19 @@ logger = logging.getLogger(__name__)
 class MimeError(Exception):
     """Try to attach a file with a disallowed mime type"""
 
+
+class FOIARequestCursorPagination(KeysetPagination):
+    """Walk requests in the order they were submitted"""
+    ordering_field = 'date_submitted'
+
+
+class ChangePagination(KeysetPagination):
+    """Walk changes in the order they were made"""
+    ordering_field = 'id'
+    page_size = 200
+    max_page_size = 1000
+
+
 class FOIARequestViewSet(viewsets.ModelViewSet):
     """
     API views for FOIARequest
@@ -47,9 +74,14 @@ class FOIARequestViewSet(viewsets.ModelViewSet):
     * jurisdiction, by id
     * agency, by id
     * tags, by name
+
+    Lists show a summary of each request, with counts of its communications
+    and files.  Pass `expand=communications` to include the full requests.
+
+    Pass `cursor` (empty to start) to walk the requests in submission order
+    a page at a time, following the `next` links, at a constant cost per page.
     """
     # pylint: disable=too-many-public-methods
-    serializer_class = FOIARequestSerializer
     permission_classes = (FOIAPermissions,)
 
     class Filter(django_filters.FilterSet):
@@ -66,21 +98,62 @@ class FOIARequestViewSet(viewsets.ModelViewSet):
 
     filter_class = Filter
 
+    def is_lean(self):
+        """Should the lean list representation be used?"""
+        return (getattr(self, 'action', None) == 'list' and
+                self.request.query_params.get('expand') != 'communications')
+
+    def get_serializer_class(self):
+        if self.is_lean():
+            return FOIARequestListSerializer
+        return FOIARequestSerializer
+
     def get_queryset(self):
-        return (FOIARequest.objects.get_viewable(self.request.user)
+        queryset = (FOIARequest.objects.get_viewable(self.request.user)
             .select_related(
                 'user',
                 'agency',
                 'jurisdiction'
-            )
-            .prefetch_related(
+            ))
+        if self.is_lean():
+            return queryset.prefetch_related('tags')
+        return queryset.prefetch_related(
                 'communications__files',
                 'notes',
                 'tags',
                 'edit_collaborators',
                 'read_collaborators'
             )
-        )
+
+    @property
+    def paginator(self):
+        """Use keyset pagination if a cursor is given"""
+        if not hasattr(self, '_paginator'):
+            if 'cursor' in self.request.query_params:
+                self._paginator = FOIARequestCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def paginate_queryset(self, queryset):
+        """Add the communication and file counts to a lean page"""
+        page = super(FOIARequestViewSet, self).paginate_queryset(queryset)
+        if page is not None and self.is_lean():
+            pks = [foia.pk for foia in page]
+            comm_counts = dict(FOIACommunication.objects
+                    .filter(foia__in=pks)
+                    .order_by()
+                    .values_list('foia')
+                    .annotate(Count('pk')))
+            file_counts = dict(FOIAFile.objects
+                    .filter(foia__in=pks)
+                    .order_by()
+                    .values_list('foia')
+                    .annotate(Count('pk')))
+            for foia in page:
+                foia.communication_count = comm_counts.get(foia.pk, 0)
+                foia.file_count = file_counts.get(foia.pk, 0)
+        return page
 
     def create(self, request):
         """Submit new request"""
@@ -250,3 +323,86 @@ class FOIACommunicationViewSet(viewsets.ModelViewSet):
             fields = ('max_date', 'min_date', 'foia', 'status', 'response', 'delivered')
 
     filter_class = Filter
+
+
+class ChangeViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    API views for the change feed
+
+    Lists the requests, communications, files and agencies which have been
+    saved or deleted, oldest first.  Pass the `cursor` from the last response
+    to get only the changes made since.
+
+    Changes from the last few seconds are held back, so that changes from
+    transactions which commit out of order are not skipped.
+
+    Saves of requests, communications and files are only listed if the
+    request may be viewed, and files only if they are public.  Deletions
+    are always listed, as the objects are gone.
+
+    Filter fields:
+    * model, as app_label.model, such as foia.foiarequest
+    """
+    # pylint: disable=too-many-public-methods
+    serializer_class = ChangeSerializer
+    pagination_class = ChangePagination
+    permission_classes = ()
+    filter_backends = ()
+
+    def get_queryset(self):
+        queryset = (Change.objects
+                .select_related('content_type')
+                .filter(datetime__lt=datetime.now() -
+                    timedelta(seconds=settings.CHANGE_FEED_DELAY)))
+        user = self.request.user
+        if not user.is_staff:
+            foias = FOIARequest.objects.get_viewable(user)
+            viewable = {
+                    FOIARequest: foias,
+                    FOIACommunication: FOIACommunication.objects
+                        .filter(foia__in=foias),
+                    FOIAFile: FOIAFile.objects
+                        .filter(foia__in=foias, access='public'),
+                    }
+            get_type = ContentType.objects.get_for_model
+            queryset = queryset.filter(
+                    Q(action='delete') |
+                    Q(content_type=get_type(Agency)) |
+                    reduce(operator.or_, [
+                        Q(content_type=get_type(model),
+                            object_id__in=objects.values('pk'))
+                        for model, objects in viewable.iteritems()]))
+        model = self.request.query_params.get('model')
+        if model and '.' in model:
+            app_label, model = model.split('.', 1)
+            queryset = queryset.filter(
+                    content_type__app_label=app_label,
+                    content_type__model=model,
+                    )
+        return queryset
+
+
+class FOIAMultiRequestViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    API views for the progress of multi requests
+
+    Shows how many of the agencies each multi request has been sent to, is
+    pending for, or has failed for, along with the state for each agency.
+    Users may see their own multi requests, staff may see all of them.
+    """
+    # pylint: disable=too-many-public-methods
+    serializer_class = FOIAMultiRequestProgressSerializer
+    permission_classes = (IsAuthenticated,)
+    filter_backends = ()
+
+    def get_queryset(self):
+        queryset = (FOIAMultiRequest.objects
+                .exclude(status='started')
+                .prefetch_related(Prefetch(
+                    'submissions',
+                    queryset=MultiRequestSubmission.objects
+                        .select_related('agency')
+                        .order_by('agency__name'))))
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(user=self.request.user)
+        return queryset
@@ -0,0 +1,188 @@
+"""
+Low overhead query and latency instrumentation
+
+A sample of requests record the number of queries they run, the time spent
+in SQL, duplicate queries and the time spent rendering, per view.  Samples
+are passed to the sinks listed in the QUERY_STATS_SINKS setting.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from collections import Counter, defaultdict
+import logging
+import re
+import socket
+
+logger = logging.getLogger(__name__)
+
+number_re = re.compile(r'\b\d+\b')
+string_re = re.compile(r"'(?:[^']|'')*'")
+in_re = re.compile(r'\bIN \((?:\?, )*\?\)')
+
+def fingerprint(sql):
+    """Normalize a SQL statement so that queries differing only
+    in their parameters compare equal"""
+    sql = string_re.sub('?', sql)
+    sql = number_re.sub('?', sql)
+    return in_re.sub('IN (...)', sql)
+
+
+class QueryRecorder(object):
+    """
+    Record the queries run on all database connections
+
+    Django does not provide a hook into cursor execution, so this forces
+    the debug cursor on, which logs each query along with its run time
+    """
+
+    def __init__(self):
+        self.queries = []
+        self._starts = {}
+        self._forced = {}
+
+    def start(self):
+        """Start recording queries"""
+        for conn in connections.all():
+            self._forced[conn.alias] = conn.force_debug_cursor
+            self._starts[conn.alias] = len(conn.queries_log)
+            conn.force_debug_cursor = True
+
+    def stop(self):
+        """Stop recording queries and collect what was recorded"""
+        for conn in connections.all():
+            if conn.alias not in self._starts:
+                continue
+            self.queries.extend(
+                    list(conn.queries_log)[self._starts[conn.alias]:])
+            conn.force_debug_cursor = self._forced[conn.alias]
+            if not conn.force_debug_cursor and not settings.DEBUG:
+                # do not let the query log grow across requests
+                conn.queries_log.clear()
+        return self.queries
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def count(self):
+        """Number of queries run"""
+        return len(self.queries)
+
+    @property
+    def sql_time(self):
+        """Total time spent in SQL, in seconds"""
+        return sum(float(query['time']) for query in self.queries)
+
+    def duplicates(self):
+        """Fingerprints of queries which ran more than once, with their counts"""
+        counts = Counter(fingerprint(query['sql']) for query in self.queries)
+        return [(sql, count) for sql, count in counts.most_common() if count > 1]
+
+
+def record_sample(sample):
+    """Send a sample to all of the configured sinks"""
+    for sink_path in settings.QUERY_STATS_SINKS:
+        try:
+            import_string(sink_path)().record(sample)
+        except Exception as exc: # pylint: disable=broad-except
+            # instrumentation should never break a request
+            logger.warning('Error recording query stats: %s', exc)
+
+
+class CacheRingBufferSink(object):
+    """
+    Store samples in a fixed size ring buffer in the shared cache
+
+    Each sample takes the next slot, as given by an atomically incremented
+    counter, so all processes share the same buffer
+    """
+    # pylint: disable=no-self-use
+    prefix = 'qstats'
+
+    def size(self):
+        """The number of samples to keep"""
+        return settings.QUERY_STATS_BUFFER_SIZE
+
+    def record(self, sample):
+        """Store the sample in the next slot"""
+        key = '%s:next' % self.prefix
+        cache.add(key, 0, None)
+        try:
+            index = cache.incr(key)
+        except ValueError:
+            # the counter was evicted between the add and the incr
+            return
+        cache.set('%s:%d' % (self.prefix, index % self.size()), sample, None)
+
+    def samples(self):
+        """Return all samples currently in the buffer"""
+        keys = ['%s:%d' % (self.prefix, i) for i in xrange(self.size())]
+        return cache.get_many(keys).values()
+
+    def clear(self):
+        """Remove all samples from the buffer"""
+        keys = ['%s:%d' % (self.prefix, i) for i in xrange(self.size())]
+        cache.delete_many(keys + ['%s:next' % self.prefix])
+
+
+class StatsdSink(object):
+    """Send samples to a statsd compatible server over UDP"""
+    # pylint: disable=no-self-use
+
+    def record(self, sample):
+        """Send timers and counters for the sample's view"""
+        name = 'muckrock.view.%s' % sample['view'].replace('.', '_')
+        lines = [
+                '%s.queries:%d|ms' % (name, sample['queries']),
+                '%s.sql_time:%d|ms' % (name, sample['sql_time'] * 1000),
+                '%s.time:%d|ms' % (name, sample['time'] * 1000),
+                '%s.duplicates:%d|ms' % (name, sum(c for _, c in sample['duplicates'])),
+                ]
+        if sample['render_time'] is not None:
+            lines.append('%s.render_time:%d|ms' % (name, sample['render_time'] * 1000))
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.sendto('\n'.join(lines), (settings.STATSD_HOST, settings.STATSD_PORT))
+        finally:
+            sock.close()
+
+
+def top_offenders(samples, sort='queries'):
+    """Aggregate samples per view, worst first"""
+    views = defaultdict(lambda: {
+        'requests': 0,
+        'queries': 0,
+        'max_queries': 0,
+        'sql_time': 0.0,
+        'time': 0.0,
+        'duplicates': Counter(),
+        })
+    for sample in samples:
+        view = views[sample['view']]
+        view['requests'] += 1
+        view['queries'] += sample['queries']
+        view['max_queries'] = max(view['max_queries'], sample['queries'])
+        view['sql_time'] += sample['sql_time']
+        view['time'] += sample['time']
+        for sql, count in sample['duplicates']:
+            view['duplicates'][sql] = max(view['duplicates'][sql], count)
+    offenders = []
+    for name, view in views.iteritems():
+        requests = view['requests']
+        offenders.append({
+            'view': name,
+            'requests': requests,
+            'queries': float(view['queries']) / requests,
+            'max_queries': view['max_queries'],
+            'sql_time': view['sql_time'] / requests,
+            'time': view['time'] / requests,
+            'duplicates': view['duplicates'].most_common(5),
+            })
+    return sorted(offenders, key=lambda o: o.get(sort, o['queries']), reverse=True)
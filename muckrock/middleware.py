@@ -5,10 +5,14 @@ Middleware for MuckRock
 from django.conf import settings
 from django.http import HttpResponseRedirect
 
+import random
+import time
 from urllib import urlencode
 
 from lot import middleware
 
+from muckrock.instrumentation import QueryRecorder, record_sample
+
 class RemoveTokenMiddleware(object):
     """Remove login token from URL"""
 
@@ -30,3 +34,60 @@ class LOTMiddleware(middleware.LOTMiddleware):
         if request.user.is_authenticated():
             return
         super(LOTMiddleware, self).process_request(request)
+
+
+class QueryStatsMiddleware(object):
+    """Record query counts and timings for a sample of requests"""
+    # pylint: disable=no-self-use
+
+    def process_request(self, request):
+        """Start recording if this request is sampled"""
+        if random.random() >= settings.QUERY_STATS_SAMPLE_RATE:
+            return
+        request.query_stats = {
+                'recorder': QueryRecorder(),
+                'start': time.time(),
+                'view': None,
+                'render_start': None,
+                'render_time': None,
+                }
+        request.query_stats['recorder'].start()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Note which view is handling the request"""
+        # pylint: disable=unused-argument
+        if hasattr(request, 'query_stats'):
+            request.query_stats['view'] = '%s.%s' % (
+                    view_func.__module__,
+                    getattr(view_func, '__name__', view_func.__class__.__name__),
+                    )
+
+    def process_template_response(self, request, response):
+        """Time the rendering of template responses"""
+        if hasattr(request, 'query_stats'):
+            stats = request.query_stats
+            stats['render_start'] = time.time()
+            def render_done(_):
+                """Record the render time once the response is rendered"""
+                stats['render_time'] = time.time() - stats['render_start']
+            response.add_post_render_callback(render_done)
+        return response
+
+    def process_response(self, request, response):
+        """Stop recording and send the sample off"""
+        if not hasattr(request, 'query_stats'):
+            return response
+        stats = request.query_stats
+        recorder = stats['recorder']
+        recorder.stop()
+        record_sample({
+            'view': stats['view'] or request.path,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'sql_time': recorder.sql_time,
+            'duplicates': recorder.duplicates()[:10],
+            'time': time.time() - stats['start'],
+            'render_time': stats['render_time'],
+            })
+        return response
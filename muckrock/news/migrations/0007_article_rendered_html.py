@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+import bleach
+import markdown
+
+
+def render_markdown(text):
+    """Render markdown to bleached HTML, as it was when this migration was
+    written"""
+    html = markdown.markdown(text, extensions=[
+        'markdown.extensions.smarty',
+        'markdown.extensions.tables',
+        'pymdownx.magiclink',
+        ])
+    allowed_attributes = bleach.ALLOWED_ATTRIBUTES.copy()
+    allowed_attributes.update({
+        'iframe': ['src', 'width', 'height', 'frameborder', 'marginheight', 'marginwidth'],
+        'img': ['src', 'alt', 'title', 'width', 'height'],
+        })
+    return bleach.clean(
+            html,
+            tags=bleach.ALLOWED_TAGS +
+            [u'h1', u'h2', u'h3', u'h4', u'h5', u'h6', u'p', u'img', u'iframe'],
+            attributes=allowed_attributes,
+            )
+
+
+def render_articles(apps, schema_editor):
+    """Render the kicker and summary of every article"""
+    # pylint: disable=unused-argument
+    Article = apps.get_model('news', 'Article')
+    for article in Article.objects.only('kicker', 'summary').iterator():
+        Article.objects.filter(pk=article.pk).update(
+                kicker_html=render_markdown(article.kicker),
+                summary_html=render_markdown(article.summary),
+                )
+
+
+class Migration(migrations.Migration):
+    """Store the kicker and summary of articles pre-rendered from markdown"""
+
+    dependencies = [
+        ('news', '0006_auto_20170423_2126'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='kicker_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='summary_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(render_articles, migrations.RunPython.noop),
+    ]
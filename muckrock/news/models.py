@@ -15,7 +15,7 @@ from taggit.managers import TaggableManager
 
 from muckrock.foia.models import FOIARequest
 from muckrock.tags.models import TaggedItemBase
-from muckrock.utils import get_image_storage
+from muckrock.utils import get_image_storage, render_markdown
 
 
 class ArticleQuerySet(models.QuerySet):
@@ -54,6 +54,9 @@ class Article(models.Model):
     slug = models.SlugField(unique=True,
             help_text='A "Slug" is a unique URL-friendly title for an object.')
     summary = models.TextField(help_text='A single paragraph summary or preview of the article.')
+    # the kicker and summary rendered from markdown, filled in on save
+    kicker_html = models.TextField(blank=True, editable=False)
+    summary_html = models.TextField(blank=True, editable=False)
     body = models.TextField('Body text')
     authors = models.ManyToManyField(User, related_name='authored_articles')
     editors = models.ManyToManyField(
@@ -98,6 +101,8 @@ class Article(models.Model):
         """Save the news article"""
         # epiceditor likes to stick non breaking spaces in here for some reason
         self.body = self.body.replace(u'\xa0', ' ')
+        self.kicker_html = render_markdown(self.kicker)
+        self.summary_html = render_markdown(self.summary)
         # invalidate the template cache for the page on a save
         if self.pk:
             cache.delete(make_template_fragment_key('article_detail', [self.pk]))
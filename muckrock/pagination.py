@@ -2,10 +2,118 @@
 Provides a pagination class for the API
 """
 
-from rest_framework.pagination import PageNumberPagination
+from django.db.models import Q
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+import json
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 class StandardPagination(PageNumberPagination):
     """Defines default and maximum page size for pagination"""
     page_size = 50
     max_page_size = 200
     page_size_query_param = 'page_size'
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginates by the position of the last item on the previous page instead
+    of by page number, so each page costs the same however deep into the
+    results it is.  Results are ordered ascending by `ordering_field`, with
+    ties broken by the primary key.  Nulls are sorted last, as Postgres does.
+    """
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering_field = None
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self):
+        self.request = None
+        self.position = None
+        self.next_position = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Get the page of results following the cursor"""
+        self.request = request
+        page_size = self.get_page_size(request)
+        self.position = self.decode_cursor(request)
+        field = self.ordering_field
+
+        queryset = queryset.order_by(field, 'pk')
+        if self.position is not None:
+            value, pk = self.position
+            if value is None:
+                queryset = queryset.filter(
+                        Q(**{'%s__isnull' % field: True}) & Q(pk__gt=pk))
+            else:
+                queryset = queryset.filter(
+                        Q(**{'%s__gt' % field: value}) |
+                        Q(**{field: value, 'pk__gt': pk}) |
+                        Q(**{'%s__isnull' % field: True}))
+
+        results = list(queryset[:page_size + 1])
+        has_next = len(results) > page_size
+        results = results[:page_size]
+        if results:
+            self.position = self.get_position(results[-1])
+        if has_next:
+            self.next_position = self.position
+        return results
+
+    def get_position(self, obj):
+        """The position of an object in the ordering"""
+        value = getattr(obj, self.ordering_field)
+        if value is not None and hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        return (value, obj.pk)
+
+    def get_page_size(self, request):
+        """Get the page size from the request, within the maximum"""
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        """Get the position encoded in the cursor, if any"""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            value, pk = json.loads(urlsafe_b64decode(str(cursor)))
+            return value, int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        """Encode a position as an opaque cursor"""
+        return urlsafe_b64encode(json.dumps(position))
+
+    def get_next_link(self):
+        """The URL of the next page, if there is one"""
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+                url,
+                self.cursor_query_param,
+                self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        # the cursor of the last result is always returned, so clients
+        # can resume from it later once there are more results
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('cursor', self.encode_cursor(self.position)
+                if self.position is not None else None),
+            ('results', data),
+            ]))
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+import bleach
+import markdown
+
+
+def render_markdown(text):
+    """Render markdown to bleached HTML, as it was when this migration was
+    written"""
+    html = markdown.markdown(text, extensions=[
+        'markdown.extensions.smarty',
+        'markdown.extensions.tables',
+        'pymdownx.magiclink',
+        ])
+    allowed_attributes = bleach.ALLOWED_ATTRIBUTES.copy()
+    allowed_attributes.update({
+        'iframe': ['src', 'width', 'height', 'frameborder', 'marginheight', 'marginwidth'],
+        'img': ['src', 'alt', 'title', 'width', 'height'],
+        })
+    return bleach.clean(
+            html,
+            tags=bleach.ALLOWED_TAGS +
+            [u'h1', u'h2', u'h3', u'h4', u'h5', u'h6', u'p', u'img', u'iframe'],
+            attributes=allowed_attributes,
+            )
+
+
+def render_projects(apps, schema_editor):
+    """Render the description of every project"""
+    # pylint: disable=unused-argument
+    Project = apps.get_model('project', 'Project')
+    projects = Project.objects.exclude(description=None).exclude(description='')
+    for project in projects.only('description').iterator():
+        Project.objects.filter(pk=project.pk).update(
+                description_html=render_markdown(project.description))
+
+
+class Migration(migrations.Migration):
+    """Store the description of projects pre-rendered from markdown"""
+
+    dependencies = [
+        ('project', '0013_auto_20170423_2126'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='description_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(render_projects, migrations.RunPython.noop),
+    ]
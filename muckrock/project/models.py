@@ -10,7 +10,7 @@ from muckrock.crowdfund.models import Crowdfund
 from muckrock.foia.models import FOIARequest
 from muckrock.news.models import Article
 from muckrock.task.models import ProjectReviewTask
-from muckrock.utils import get_image_storage
+from muckrock.utils import get_image_storage, render_markdown
 
 import taggit
 
@@ -48,8 +48,7 @@ class ProjectQuerySet(models.QuerySet):
         return (self.annotate(request_count=models.Count('requests', distinct=True))
                     .annotate(article_count=models.Count('articles', distinct=True))
                     .prefetch_related(models.Prefetch('crowdfunds',
-                        queryset=Crowdfund.objects.order_by('-date_due')
-                        .annotate(contributors_count=models.Count('payments'))))
+                        queryset=Crowdfund.objects.order_by('-date_due')))
         )
 
 
@@ -66,6 +65,8 @@ class Project(models.Model):
         help_text='The slug is automatically generated based on the title.')
     summary = models.TextField(blank=True, null=True)
     description = models.TextField(blank=True, null=True)
+    # the description rendered from markdown, filled in on save
+    description_html = models.TextField(blank=True, editable=False)
     image = models.ImageField(
             upload_to='project_images/%Y/%m/%d',
             blank=True,
@@ -122,6 +123,7 @@ class Project(models.Model):
     def save(self, *args, **kwargs):
         """Autogenerates the slug based on the title"""
         self.slug = slugify(self.title)
+        self.description_html = render_markdown(self.description or '')
         super(Project, self).save(*args, **kwargs)
 
     def get_absolute_url(self):
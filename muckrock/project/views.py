@@ -18,7 +18,6 @@ from django.views.generic import (
 )
 from django.utils.decorators import method_decorator
 
-from actstream.models import followers
 from datetime import date, timedelta
 
 from muckrock.crowdfund.models import Crowdfund
@@ -28,7 +27,7 @@ from muckrock.project.models import Project, ProjectCrowdfunds
 from muckrock.project.filters import ProjectFilterSet
 from muckrock.project.forms import ProjectCreateForm, ProjectUpdateForm, ProjectPublishForm
 from muckrock.views import MRSearchFilterListView
-from muckrock.utils import new_action
+from muckrock.utils import new_action, follower_count
 
 class ProjectExploreView(TemplateView):
     """Provides a space for exploring our different projects."""
@@ -129,7 +128,7 @@ class ProjectDetailView(DetailView):
         return self._obj
 
     def get_context_data(self, **kwargs):
-        """Adds visible requests and followers to project context"""
+        """Adds visible requests and the follower count to project context"""
         context = super(ProjectDetailView, self).get_context_data(**kwargs)
         project = context['object']
         user = self.request.user
@@ -144,7 +143,7 @@ class ProjectDetailView(DetailView):
                     'agency__jurisdiction',
                     'user__profile',
                 ).get_public_file_count())
-        context['followers'] = followers(project)
+        context['follower_count'] = follower_count(project)
         context['articles'] = (project.articles
                 .get_published()
                 .prefetch_related(
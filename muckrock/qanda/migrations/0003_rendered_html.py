@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+import bleach
+import markdown
+
+
+def render_markdown(text):
+    """Render markdown to bleached HTML, as it was when this migration was
+    written"""
+    html = markdown.markdown(text, extensions=[
+        'markdown.extensions.smarty',
+        'markdown.extensions.tables',
+        'pymdownx.magiclink',
+        ])
+    allowed_attributes = bleach.ALLOWED_ATTRIBUTES.copy()
+    allowed_attributes.update({
+        'iframe': ['src', 'width', 'height', 'frameborder', 'marginheight', 'marginwidth'],
+        'img': ['src', 'alt', 'title', 'width', 'height'],
+        })
+    return bleach.clean(
+            html,
+            tags=bleach.ALLOWED_TAGS +
+            [u'h1', u'h2', u'h3', u'h4', u'h5', u'h6', u'p', u'img', u'iframe'],
+            attributes=allowed_attributes,
+            )
+
+
+def render_questions(apps, schema_editor):
+    """Render every question and answer"""
+    # pylint: disable=unused-argument
+    Question = apps.get_model('qanda', 'Question')
+    Answer = apps.get_model('qanda', 'Answer')
+    for question in Question.objects.only('question').iterator():
+        Question.objects.filter(pk=question.pk).update(
+                question_html=render_markdown(question.question))
+    for answer in Answer.objects.only('answer').iterator():
+        Answer.objects.filter(pk=answer.pk).update(
+                answer_html=render_markdown(answer.answer))
+
+
+class Migration(migrations.Migration):
+    """Store questions and answers pre-rendered from markdown"""
+
+    dependencies = [
+        ('qanda', '0002_auto_20150614_2154'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='question_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='answer',
+            name='answer_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(render_questions, migrations.RunPython.noop),
+    ]
@@ -6,13 +6,12 @@ from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
 from django.db import models
 
-from actstream.models import followers
 from taggit.managers import TaggableManager
 
 from muckrock.accounts.models import Profile
 from muckrock.foia.models import FOIARequest
 from muckrock.tags.models import TaggedItemBase
-from muckrock.utils import new_action, notify
+from muckrock.utils import new_action, notify, follower_users, render_markdown
 
 class Question(models.Model):
     """A question to which the community can respond"""
@@ -22,6 +21,8 @@ class Question(models.Model):
     slug = models.SlugField(max_length=255)
     foia = models.ForeignKey(FOIARequest, blank=True, null=True)
     question = models.TextField()
+    # the question rendered from markdown, filled in on save
+    question_html = models.TextField(blank=True, editable=False)
     date = models.DateTimeField()
     # We store the date of the most recent answer on the question
     # to increase performance when displaying questions in a list
@@ -35,6 +36,7 @@ class Question(models.Model):
     def save(self, *args, **kwargs):
         """Creates an action if question is newly asked"""
         is_new = True if self.pk is None else False
+        self.question_html = render_markdown(self.question)
         super(Question, self).save(*args, **kwargs)
         if is_new:
             action = new_action(self.user, 'asked', target=self)
@@ -67,6 +69,8 @@ class Answer(models.Model):
     date = models.DateTimeField()
     question = models.ForeignKey(Question, related_name='answers')
     answer = models.TextField()
+    # the answer rendered from markdown, filled in on save
+    answer_html = models.TextField(blank=True, editable=False)
 
     reindex_related = ('question',)
 
@@ -76,6 +80,7 @@ class Answer(models.Model):
     def save(self, *args, **kwargs):
         """Update the questions answer date when you save the answer"""
         is_new = True if self.pk is None else False
+        self.answer_html = render_markdown(self.answer)
         super(Answer, self).save(*args, **kwargs)
         self.question.answer_date = self.date
         self.question.save()
@@ -83,7 +88,7 @@ class Answer(models.Model):
             action = new_action(self.user, 'answered', action_object=self, target=self.question)
             # Notify the question's owner and its followers about the new answer
             notify(self.question.user, action)
-            notify(followers(self.question), action)
+            notify(follower_users(self.question), action)
 
     class Meta:
         # pylint: disable=too-few-public-methods
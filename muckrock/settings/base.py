@@ -138,6 +138,7 @@ MIDDLEWARE_CLASSES = (
     'django_hosts.middleware.HostsRequestMiddleware',
     'djangosecure.middleware.SecurityMiddleware',
     'dogslow.WatchdogMiddleware',
+    'muckrock.middleware.QueryStatsMiddleware',
     'django.middleware.gzip.GZipMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -259,6 +260,7 @@ CELERY_IMPORTS = (
     'muckrock.foia.tasks',
     'muckrock.accounts.tasks',
     'muckrock.agency.tasks',
+    'muckrock.tasks',
     )
 CELERYD_MAX_TASKS_PER_CHILD = os.environ.get('CELERYD_MAX_TASKS_PER_CHILD', 100)
 CELERYD_TASK_TIME_LIMIT = os.environ.get('CELERYD_TASK_TIME_LIMIT', 5 * 60)
@@ -436,13 +438,71 @@ DATABASES = {
             }
         }
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+if 'MEMCACHIER_SERVERS' in os.environ:
+    os.environ['MEMCACHE_SERVERS'] = os.environ.get('MEMCACHIER_SERVERS', '').replace(',', ';')
+    os.environ['MEMCACHE_USERNAME'] = os.environ.get('MEMCACHIER_USERNAME', '')
+    os.environ['MEMCACHE_PASSWORD'] = os.environ.get('MEMCACHIER_PASSWORD', '')
+
+# use a shared memcached cache when one is configured, so that cached data
+# is shared between all web processes, and fall back to a per process
+# local memory cache otherwise
+if 'MEMCACHE_SERVERS' in os.environ:
+    CACHES = {
+        'default': {
+            # Use pylibmc
+            'BACKEND': 'django_pylibmc.memcached.PyLibMCCache',
+
+            # Use binary memcache protocol (needed for authentication)
+            'BINARY': True,
+
+            # TIMEOUT is not the connection timeout! It's the default expiration
+            # timeout that should be applied to keys! Setting it to `None`
+            # disables expiration.
+            'TIMEOUT': None,
+
+            'OPTIONS': {
+                # Enable faster IO
+                'no_block': True,
+                'tcp_nodelay': True,
+
+                # Keep connection alive
+                'tcp_keepalive': True,
+
+                # Timeout for set/get requests
+                '_poll_timeout': 2000,
+
+                # Use consistent hashing for failover
+                'ketama': True,
+
+                # Configure failover timings
+                'connect_timeout': 2000,
+                'remove_failed': 4,
+                'retry_timeout': 2,
+                'dead_timeout': 10
+            }
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
     }
-}
 DEFAULT_CACHE_TIMEOUT = 15 * 60
 
+# seconds to hold back the most recent changes from the change feed API
+CHANGE_FEED_DELAY = 10
+
+# Query instrumentation settings
+# fraction of requests to record query counts and timings for
+QUERY_STATS_SAMPLE_RATE = float(os.environ.get('QUERY_STATS_SAMPLE_RATE', 0.01))
+QUERY_STATS_BUFFER_SIZE = 1000
+QUERY_STATS_SINKS = ('muckrock.instrumentation.CacheRingBufferSink',)
+STATSD_HOST = os.environ.get('STATSD_HOST', 'localhost')
+STATSD_PORT = int(os.environ.get('STATSD_PORT', 8125))
+if 'STATSD_HOST' in os.environ:
+    QUERY_STATS_SINKS += ('muckrock.instrumentation.StatsdSink',)
+
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'muckrock.pagination.StandardPagination',
     'DEFAULT_FILTER_BACKENDS':
@@ -30,44 +30,3 @@ TEMPLATE_LOADERS = (
         'django.template.loaders.app_directories.Loader',
     )),
 )
-
-if 'MEMCACHIER_SERVERS' in os.environ:
-    os.environ['MEMCACHE_SERVERS'] = os.environ.get('MEMCACHIER_SERVERS', '').replace(',', ';')
-    os.environ['MEMCACHE_USERNAME'] = os.environ.get('MEMCACHIER_USERNAME', '')
-    os.environ['MEMCACHE_PASSWORD'] = os.environ.get('MEMCACHIER_PASSWORD', '')
-
-    CACHES = {
-        'default': {
-            # Use pylibmc
-            'BACKEND': 'django_pylibmc.memcached.PyLibMCCache',
-
-            # Use binary memcache protocol (needed for authentication)
-            'BINARY': True,
-
-            # TIMEOUT is not the connection timeout! It's the default expiration
-            # timeout that should be applied to keys! Setting it to `None`
-            # disables expiration.
-            'TIMEOUT': None,
-
-            'OPTIONS': {
-                # Enable faster IO
-                'no_block': True,
-                'tcp_nodelay': True,
-
-                # Keep connection alive
-                'tcp_keepalive': True,
-
-                # Timeout for set/get requests
-                '_poll_timeout': 2000,
-
-                # Use consistent hashing for failover
-                'ketama': True,
-
-                # Configure failover timings
-                'connect_timeout': 2000,
-                'remove_failed': 4,
-                'retry_timeout': 2,
-                'dead_timeout': 10
-            }
-        }
-    }
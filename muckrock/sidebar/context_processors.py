@@ -2,6 +2,8 @@
 
 from django.conf import settings
 from django.contrib.auth.forms import AuthenticationForm
+from django.core.cache import cache
+from django.db.models import Count
 
 from datetime import datetime, timedelta
 
@@ -10,9 +12,11 @@ from muckrock.foia.models import FOIARequest
 from muckrock.news.models import Article
 from muckrock.organization.models import Organization
 from muckrock.project.models import Project
-from muckrock.sidebar.models import Broadcast
+from muckrock.sidebar.models import Broadcast, SIDEBAR_TITLES
 from muckrock.utils import cache_get_or_set
 
+ACTIONABLE_STATUSES = ('started', 'payment', 'fix')
+
 def get_recent_articles():
     """Lists last five recent news articles"""
     return (Article.objects
@@ -23,15 +27,12 @@ def get_recent_articles():
 
 def get_actionable_requests(user):
     """Gets requests that require action or attention"""
-    requests = FOIARequest.objects.filter(user=user)
-    started = requests.filter(status='started').count()
-    payment = requests.filter(status='payment').count()
-    fix = requests.filter(status='fix').count()
-    return {
-        'started': started,
-        'payment': payment,
-        'fix': fix,
-    }
+    counts = dict(FOIARequest.objects
+            .filter(user=user, status__in=ACTIONABLE_STATUSES)
+            .order_by()
+            .values_list('status')
+            .annotate(Count('pk')))
+    return {status: counts.get(status, 0) for status in ACTIONABLE_STATUSES}
 
 
 def get_unread_notifications(user):
@@ -44,70 +45,98 @@ def get_unread_notifications(user):
 
 def get_organization(user):
     """Gets organization, if it exists"""
-    def load_organization(user):
-        """Return a function to load the user's organization"""
-        def inner():
-            """Argument-less function to load user's organization"""
-            org = None
-            if user.profile.organization:
-                org = user.profile.organization
-            owned_org = Organization.objects.filter(owner=user)
-            if owned_org.exists():
-                # there should only ever be one. if there is more than one, just get the first.
-                org = owned_org.first()
-            return org
-        return inner
-
-    return cache_get_or_set(
-            'sb:%s:user_org' % user.username,
-            load_organization(user),
-            settings.DEFAULT_CACHE_TIMEOUT)
+    org = None
+    if user.profile.organization:
+        org = user.profile.organization
+    owned_org = Organization.objects.filter(owner=user).first()
+    if owned_org is not None:
+        # there should only ever be one. if there is more than one, just get the first.
+        org = owned_org
+    return org
+
+
+def get_user_class(user):
+    """Get the account type used to pick the broadcast for a user"""
+    try:
+        return user.profile.acct_type if user.is_authenticated() else 'anonymous'
+    except Profile.DoesNotExist:
+        return 'anonymous'
 
 
 def sidebar_broadcast(user):
     """Displays a broadcast to a given usertype"""
+    try:
+        # exclude stale broadcasts from displaying
+        last_week = datetime.now() - timedelta(7)
+        return Broadcast.objects.get(
+                updated__gte=last_week,
+                context=get_user_class(user),
+                ).text
+    except Broadcast.DoesNotExist:
+        return ''
 
-    def load_broadcast(user_class):
-        """Return a function to load the correct broadcast"""
-        def inner():
-            """Argument-less function to load correct broadcast"""
-            try:
-                # exclude stale broadcasts from displaying
-                last_week = datetime.now() - timedelta(7)
-                broadcast = Broadcast.objects.get(updated__gte=last_week, context=user_class).text
-            except Broadcast.DoesNotExist:
-                broadcast = ''
-            return broadcast
-        return inner
 
-    try:
-        user_class = user.profile.acct_type if user.is_authenticated() else 'anonymous'
-    except Profile.DoesNotExist:
-        user_class = 'anonymous'
+def shared_payload_key(user_class):
+    """Cache key for the sidebar content shared by all users of a class"""
+    return 'sb:%s:shared' % user_class
+
+
+def user_payload_key(user_id):
+    """Cache key for a user's own sidebar content"""
+    return 'sb:%s:payload' % user_id
+
+
+def get_shared_payload(user):
+    """Sidebar content shared by all users with the same account type"""
+    return cache_get_or_set(
+            shared_payload_key(get_user_class(user)),
+            lambda: {
+                'dropdown_recent_articles': list(get_recent_articles()),
+                'broadcast': sidebar_broadcast(user),
+                },
+            settings.DEFAULT_CACHE_TIMEOUT)
+
+
+def get_user_payload(user):
+    """Sidebar content for a logged in user"""
     return cache_get_or_set(
-            'sb:%s:broadcast' % user_class,
-            load_broadcast(user_class),
+            user_payload_key(user.pk),
+            lambda: {
+                'unread_notifications_count':
+                    get_unread_notifications(user).count(),
+                'actionable_requests': get_actionable_requests(user),
+                'organization': get_organization(user),
+                'my_projects': list(Project.objects
+                    .get_for_contributor(user)
+                    .optimize()
+                    [:4]),
+                },
             settings.DEFAULT_CACHE_TIMEOUT)
 
 
+def invalidate_user_payload(*user_ids):
+    """Clear the cached sidebar content for the given users"""
+    cache.delete_many([user_payload_key(user_id) for user_id in user_ids])
+
+
+def invalidate_shared_payload(*user_classes):
+    """Clear the cached shared sidebar content for the given account types,
+    or for all account types if none are given"""
+    if not user_classes:
+        user_classes = [user_class for user_class, _ in SIDEBAR_TITLES]
+    cache.delete_many([shared_payload_key(user_class) for user_class in user_classes])
+
+
 def sidebar_info(request):
     """Displays info about a user's requsts in the sidebar"""
     # content for all users
     if request.path.startswith(('/admin/', '/sitemap', '/news-sitemaps')):
         return {}
-    sidebar_info_dict = {
-        'dropdown_recent_articles': get_recent_articles(),
-        'broadcast': sidebar_broadcast(request.user),
-        'login_form': AuthenticationForm()
-    }
+    sidebar_info_dict = {'login_form': AuthenticationForm()}
+    sidebar_info_dict.update(get_shared_payload(request.user))
     if request.user.is_authenticated():
         # content for logged in users
-        sidebar_info_dict.update({
-            'unread_notifications': get_unread_notifications(request.user),
-            'actionable_requests': get_actionable_requests(request.user),
-            'organization': get_organization(request.user),
-            'my_projects': Project.objects.get_for_contributor(request.user).optimize()[:4],
-            'payment_failed': request.user.profile.payment_failed
-        })
+        sidebar_info_dict.update(get_user_payload(request.user))
+        sidebar_info_dict['payment_failed'] = request.user.profile.payment_failed
 
     return sidebar_info_dict
@@ -0,0 +1,109 @@
+"""Signals to keep the cached sidebar content up to date"""
+
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+
+from muckrock.accounts.models import Notification, Profile
+from muckrock.foia.models import FOIARequest
+from muckrock.news.models import Article
+from muckrock.organization.models import Organization
+from muckrock.project.models import Project
+from muckrock.sidebar.context_processors import (
+        invalidate_user_payload,
+        invalidate_shared_payload,
+        )
+from muckrock.sidebar.models import Broadcast
+
+# pylint: disable=unused-argument
+
+def user_changed(sender, instance, **kwargs):
+    """A request, notification or profile belonging to the user changed"""
+    invalidate_user_payload(instance.user_id)
+
+
+def organization_changed(sender, instance, **kwargs):
+    """An organization changed, clear it for its owner and members"""
+    members = (Profile.objects
+            .filter(organization=instance)
+            .values_list('user_id', flat=True))
+    invalidate_user_payload(instance.owner_id, *members)
+
+
+def project_changed(sender, instance, **kwargs):
+    """A project changed, clear it for its contributors"""
+    invalidate_user_payload(
+            *instance.contributors.values_list('pk', flat=True))
+
+
+def project_contributors_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Project membership changed"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        # instance is the user
+        invalidate_user_payload(instance.pk)
+    elif action == 'pre_clear':
+        project_changed(sender, instance)
+    else:
+        invalidate_user_payload(*pk_set)
+
+
+def broadcast_changed(sender, instance, **kwargs):
+    """A broadcast changed, clear it for every account type, as its
+    account type may have been changed"""
+    invalidate_shared_payload()
+
+
+def article_changed(sender, instance, **kwargs):
+    """An article changed, clear the recent articles for everyone"""
+    invalidate_shared_payload()
+
+
+for model in (FOIARequest, Notification, Profile):
+    post_save.connect(
+            user_changed,
+            sender=model,
+            dispatch_uid='muckrock.sidebar.signals.user_changed.save.%s' % model.__name__)
+    post_delete.connect(
+            user_changed,
+            sender=model,
+            dispatch_uid='muckrock.sidebar.signals.user_changed.delete.%s' % model.__name__)
+
+post_save.connect(
+        organization_changed,
+        sender=Organization,
+        dispatch_uid='muckrock.sidebar.signals.organization_changed')
+
+post_save.connect(
+        project_changed,
+        sender=Project,
+        dispatch_uid='muckrock.sidebar.signals.project_changed')
+
+pre_delete.connect(
+        project_changed,
+        sender=Project,
+        dispatch_uid='muckrock.sidebar.signals.project_deleted')
+
+m2m_changed.connect(
+        project_contributors_changed,
+        sender=Project.contributors.through,
+        dispatch_uid='muckrock.sidebar.signals.project_contributors_changed')
+
+post_save.connect(
+        broadcast_changed,
+        sender=Broadcast,
+        dispatch_uid='muckrock.sidebar.signals.broadcast_changed')
+
+post_delete.connect(
+        broadcast_changed,
+        sender=Broadcast,
+        dispatch_uid='muckrock.sidebar.signals.broadcast_deleted')
+
+post_save.connect(
+        article_changed,
+        sender=Article,
+        dispatch_uid='muckrock.sidebar.signals.article_changed')
+
+post_delete.connect(
+        article_changed,
+        sender=Article,
+        dispatch_uid='muckrock.sidebar.signals.article_deleted')
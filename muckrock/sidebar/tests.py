@@ -2,15 +2,29 @@
 Tests for the sidebar application
 """
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 
 from datetime import timedelta
 from mock import patch
-from nose.tools import eq_
+from nose.tools import eq_, ok_
 
-from muckrock.factories import UserFactory
+from muckrock.factories import (
+        UserFactory,
+        FOIARequestFactory,
+        NotificationFactory,
+        ProjectFactory,
+        )
 from muckrock.sidebar.models import Broadcast
-from muckrock.sidebar.context_processors import sidebar_broadcast
+from muckrock.sidebar.context_processors import (
+        sidebar_broadcast,
+        get_actionable_requests,
+        get_shared_payload,
+        get_user_payload,
+        shared_payload_key,
+        user_payload_key,
+        )
+import muckrock.sidebar.signals # pylint: disable=unused-import
 
 
 class TestBroadcasts(TestCase):
@@ -34,3 +48,59 @@ class TestBroadcasts(TestCase):
             self.broadcast.save()
             broadcast = sidebar_broadcast(self.user)
             eq_(broadcast, '')
+
+
+class TestActionableRequests(TestCase):
+    """Actionable requests are counted by status"""
+    def test_counts(self):
+        """Each actionable status should be counted"""
+        user = UserFactory()
+        FOIARequestFactory.create_batch(2, user=user, status='started')
+        FOIARequestFactory(user=user, status='fix')
+        FOIARequestFactory(user=user, status='done')
+        eq_(get_actionable_requests(user), {'started': 2, 'payment': 0, 'fix': 1})
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TestSidebarPayload(TestCase):
+    """The sidebar payload is cached per user and cleared when it changes"""
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        get_user_payload(self.user)
+
+    def assert_cleared(self):
+        """The user's payload should no longer be cached"""
+        ok_(cache.get(user_payload_key(self.user.pk)) is None)
+
+    def test_cached(self):
+        """The payload should be cached"""
+        ok_(cache.get(user_payload_key(self.user.pk)) is not None)
+
+    def test_request_saved(self):
+        """Saving a request should clear the payload"""
+        FOIARequestFactory(user=self.user, status='started')
+        self.assert_cleared()
+
+    def test_notification(self):
+        """New notifications should clear the payload"""
+        NotificationFactory(user=self.user)
+        self.assert_cleared()
+
+    def test_project(self):
+        """Joining a project should clear the payload"""
+        project = ProjectFactory()
+        project.contributors.add(self.user)
+        self.assert_cleared()
+
+    def test_broadcast_deleted(self):
+        """Deleting or moving a broadcast should clear every shared payload"""
+        broadcast = Broadcast.objects.create(context='basic', text='Hello')
+        get_shared_payload(self.user)
+        broadcast.context = 'pro'
+        broadcast.save()
+        ok_(cache.get(shared_payload_key('basic')) is None)
+        get_shared_payload(self.user)
+        broadcast.delete()
+        ok_(cache.get(shared_payload_key('basic')) is None)
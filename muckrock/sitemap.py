@@ -0,0 +1,189 @@
+"""
+Precomputed sitemaps
+
+A periodic task renders each sitemap section into gzipped files in storage,
+one file per fixed range of primary keys, along with a sitemap index.  Only
+the pages holding objects which have changed since the last run are
+rendered again, and the files are served from storage and the cache, so
+crawlers never cause database queries.
+"""
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.urlresolvers import reverse
+from django.db.models import Max
+from django.template.loader import render_to_string
+
+from io import BytesIO
+import gzip
+import json
+
+from muckrock.agency.sitemap import AgencySitemap
+from muckrock.foia.models import Change
+from muckrock.foia.sitemap import FoiaSitemap
+from muckrock.jurisdiction.sitemap import JurisdictionSitemap
+from muckrock.news.sitemap import ArticleSitemap
+from muckrock.project.sitemap import ProjectSitemap
+from muckrock.qanda.sitemap import QuestionSitemap
+
+sitemaps = {
+    'FOIA': FoiaSitemap,
+    'News': ArticleSitemap,
+    'Agency': AgencySitemap,
+    'Jurisdiction': JurisdictionSitemap,
+    'Question': QuestionSitemap,
+    'Project': ProjectSitemap,
+}
+
+# the models whose changes are recorded in the change log, whose sections
+# can be refreshed incrementally - other sections are small enough to be
+# rendered in full on every run
+INCREMENTAL_SECTIONS = ('FOIA', 'Agency')
+
+PAGE_SIZE = 5000
+INDEX_NAME = 'sitemap.xml'
+MANIFEST_NAME = 'sitemaps/manifest.json'
+
+
+def page_name(section, page):
+    """The file name of a page of a section"""
+    return 'sitemap-%s-%d.xml.gz' % (section, page)
+
+
+def storage_name(name):
+    """The storage path of a sitemap file"""
+    return 'sitemaps/%s' % name
+
+
+def cache_key(name):
+    """The cache key for a sitemap file"""
+    return 'sitemap:%s' % name
+
+
+def absolute_url(path):
+    """Make a path into an absolute URL"""
+    return 'https://%s%s' % (settings.MUCKROCK_URL, path)
+
+
+def _get(sitemap, name, item):
+    """Get a sitemap attribute, calling it with the item if it is callable"""
+    attr = getattr(sitemap, name, None)
+    if callable(attr):
+        return attr(item)
+    return attr
+
+
+def render_page(sitemap, items):
+    """Render the gzipped sitemap XML for a page of items"""
+    urlset = [{
+        'location': absolute_url(_get(sitemap, 'location', item)),
+        'lastmod': _get(sitemap, 'lastmod', item),
+        'changefreq': _get(sitemap, 'changefreq', item),
+        'priority': _get(sitemap, 'priority', item),
+        } for item in items]
+    xml = render_to_string('sitemap.xml', {'urlset': urlset})
+    buff = BytesIO()
+    with gzip.GzipFile(fileobj=buff, mode='wb') as gz_file:
+        gz_file.write(xml.encode('utf8'))
+    return buff.getvalue()
+
+
+def save_file(name, content):
+    """Save a sitemap file to storage and refresh the cached copy"""
+    path = storage_name(name)
+    if default_storage.exists(path):
+        default_storage.delete(path)
+    default_storage.save(path, ContentFile(content))
+    cache.set(cache_key(name), content, settings.DEFAULT_CACHE_TIMEOUT)
+
+
+def delete_file(name):
+    """Remove a sitemap file which no longer has any items"""
+    path = storage_name(name)
+    if default_storage.exists(path):
+        default_storage.delete(path)
+    cache.delete(cache_key(name))
+
+
+def load_manifest():
+    """Load the record of the pages written by the last run"""
+    if not default_storage.exists(MANIFEST_NAME):
+        return None
+    with default_storage.open(MANIFEST_NAME) as manifest:
+        return json.loads(manifest.read())
+
+
+def changed_pages(sitemap, since):
+    """The pages of a section holding objects changed since the given change"""
+    model = sitemap().items().model
+    object_ids = (Change.objects
+            .filter(
+                pk__gt=since,
+                content_type=ContentType.objects.get_for_model(model),
+                )
+            .order_by()
+            .values_list('object_id', flat=True)
+            .distinct())
+    return set(object_id // PAGE_SIZE for object_id in object_ids)
+
+
+def all_pages(sitemap):
+    """Every page a section may have items on"""
+    max_pk = sitemap().items().aggregate(max_pk=Max('pk'))['max_pk']
+    if max_pk is None:
+        return set()
+    return set(range(max_pk // PAGE_SIZE + 1))
+
+
+def generate_sitemaps(full=False):
+    """Write the sitemap pages which need refreshing, and the index"""
+    manifest = None if full else load_manifest()
+    last_change = (Change.objects
+            .aggregate(last=Max('pk'))['last'] or 0)
+    sections = {}
+    for section, sitemap in sitemaps.iteritems():
+        pages = set()
+        if manifest is not None:
+            pages = set(manifest['sections'].get(section, []))
+        if manifest is not None and section in INCREMENTAL_SECTIONS:
+            refresh = changed_pages(sitemap, manifest['change_id'])
+        else:
+            refresh = all_pages(sitemap) | pages
+        for page in refresh:
+            items = list(sitemap().items()
+                    .filter(pk__gte=page * PAGE_SIZE, pk__lt=(page + 1) * PAGE_SIZE)
+                    .order_by('pk'))
+            if items:
+                save_file(page_name(section, page), render_page(sitemap(), items))
+                pages.add(page)
+            else:
+                delete_file(page_name(section, page))
+                pages.discard(page)
+        sections[section] = sorted(pages)
+
+    locations = [
+            absolute_url(reverse('sitemap-page', kwargs={'name': page_name(section, page)}))
+            for section in sorted(sections) for page in sections[section]]
+    save_file(
+            INDEX_NAME,
+            render_to_string('sitemap_index.xml', {'sitemaps': locations}).encode('utf8'))
+    manifest = {'change_id': last_change, 'sections': sections}
+    if default_storage.exists(MANIFEST_NAME):
+        default_storage.delete(MANIFEST_NAME)
+    default_storage.save(MANIFEST_NAME, ContentFile(json.dumps(manifest)))
+
+
+def get_file(name):
+    """Get the contents of a sitemap file, from the cache if possible"""
+    content = cache.get(cache_key(name))
+    if content is None:
+        path = storage_name(name)
+        if not default_storage.exists(path):
+            return None
+        with default_storage.open(path) as sitemap_file:
+            content = sitemap_file.read()
+        cache.set(cache_key(name), content, settings.DEFAULT_CACHE_TIMEOUT)
+    return content
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# the subclass tables, and how each one refers to a request or an agency
+TASK_TYPES = {
+    'generictask': {},
+    'orphantask': {'communication': True},
+    'snailmailtask': {'communication': True},
+    'rejectedemailtask': {'foia': True},
+    'staleagencytask': {'agency': True},
+    'flaggedtask': {'foia': True, 'agency': True},
+    'projectreviewtask': {},
+    'newagencytask': {'agency': True},
+    'responsetask': {'communication': True},
+    'failedfaxtask': {'communication': True},
+    'statuschangetask': {'foia': True},
+    'crowdfundtask': {},
+    'multirequesttask': {},
+    'newexemptiontask': {'foia': True},
+}
+
+
+def backfill_sql():
+    """Fill in the denormalized columns with a few set based updates"""
+    statements = []
+    for task_type, refs in sorted(TASK_TYPES.items()):
+        table = 'task_%s' % task_type
+        statements.append(
+                "UPDATE task_task SET task_type = '{type}' "
+                "FROM {table} WHERE {table}.task_ptr_id = task_task.id;"
+                .format(type=task_type, table=table))
+        if refs.get('foia'):
+            statements.append(
+                    'UPDATE task_task SET task_foia_id = {table}.foia_id '
+                    'FROM {table} WHERE {table}.task_ptr_id = task_task.id;'
+                    .format(table=table))
+        if refs.get('communication'):
+            statements.append(
+                    'UPDATE task_task SET task_foia_id = comm.foia_id '
+                    'FROM {table} JOIN foia_foiacommunication AS comm '
+                    'ON comm.id = {table}.communication_id '
+                    'WHERE {table}.task_ptr_id = task_task.id;'
+                    .format(table=table))
+        if refs.get('agency'):
+            statements.append(
+                    'UPDATE task_task SET task_agency_id = {table}.agency_id '
+                    'FROM {table} WHERE {table}.task_ptr_id = task_task.id;'
+                    .format(table=table))
+    statements.append(
+            'UPDATE task_task SET task_agency_id = foia.agency_id '
+            'FROM foia_foiarequest AS foia '
+            'WHERE foia.id = task_task.task_foia_id '
+            'AND task_task.task_agency_id IS NULL;')
+    return '\n'.join(statements)
+
+
+class Migration(migrations.Migration):
+    """Denormalize the type, request and agency of each task onto the base
+    task table, so the task queue can be counted and filtered without
+    joining every subclass table"""
+
+    dependencies = [
+        ('agency', '0010_agency_search_document'),
+        ('foia', '0039_multirequestsubmission'),
+        ('task', '0018_auto_20161211_0913'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='task_type',
+            field=models.CharField(blank=True, editable=False, max_length=30),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='task_foia',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='foia.FOIARequest'),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='task_agency',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='agency.Agency'),
+        ),
+        migrations.RunSQL(backfill_sql(), migrations.RunSQL.noop),
+        migrations.AlterIndexTogether(
+            name='task',
+            index_together=set([('resolved', 'task_type'), ('task_foia', 'task_type'), ('task_agency', 'task_type')]),
+        ),
+    ]
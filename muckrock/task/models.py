@@ -2,19 +2,19 @@
 Models for the Task application
 """
 
+from django.apps import apps
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
-from django.db import models
-from django.db.models import Max, Prefetch, Q
+from django.db import models, transaction
+from django.db.models import Count, Max, Prefetch, Q
 
 from datetime import datetime
-import email
 import logging
 
-from muckrock.accounts.models import Notification
 from muckrock.foia.models import (
+    Change,
     FOIACommunication,
-    FOIAFile,
     FOIANote,
     FOIARequest,
     STATUS,
@@ -23,10 +23,12 @@ from muckrock.jurisdiction.models import Jurisdiction
 from muckrock.message.email import TemplateEmail
 from muckrock.message.tasks import support
 from muckrock.models import ExtractDay, Now
-from muckrock.utils import generate_status_action
+from muckrock.utils import cache_get_or_set, generate_status_action
 
 # pylint: disable=missing-docstring
 
+BLACKLIST_CACHE_KEY = 'task:blacklist_domains'
+
 SNAIL_MAIL_CATEGORIES = [
     ('a', 'Appeal'),
     ('n', 'New'),
@@ -52,43 +54,120 @@ class TaskQuerySet(models.QuerySet):
         If user is advanced, get response tasks.
         For all users, get new agency task.
         """
-        # pylint:disable=no-self-use
-        tasks = []
-        # infer foia from communication
-        communication_task_types = []
-        if user.is_staff:
-            communication_task_types.append(ResponseTask)
-            communication_task_types.append(SnailMailTask)
-            communication_task_types.append(FailedFaxTask)
-        for task_type in communication_task_types:
-            tasks += list(task_type.objects
-                    .filter(communication__foia=foia)
-                    .select_related('communication__foia', 'resolved_by')
-                    .prefetch_related(
-                        Prefetch('communication__files',
-                            queryset=FOIAFile.objects.select_related('foia__jurisdiction')),
-                        Prefetch('communication__foia__communications',
-                            queryset=FOIACommunication.objects
-                                .order_by('-date')
-                                .prefetch_related('files'),
-                            to_attr='reverse_communications'),
-                        'communication__foia__communications__files',
-                        )
-                    )
-        # these tasks have a direct foia attribute
-        foia_task_types = [RejectedEmailTask, FlaggedTask, StatusChangeTask]
+        conditions = Q()
         if user.is_staff:
-            for task_type in foia_task_types:
-                tasks += list(task_type.objects
-                        .filter(foia=foia)
-                        .select_related('foia__jurisdiction', 'resolved_by'))
+            conditions |= Q(task_foia=foia, task_type__in=[
+                'responsetask',
+                'snailmailtask',
+                'failedfaxtask',
+                'rejectedemailtask',
+                'flaggedtask',
+                'statuschangetask',
+                ])
         # try matching foia agency with task agency
-        if foia.agency:
-            tasks += list(NewAgencyTask.objects
-                    .filter(agency=foia.agency)
-                    .preload_list()
-                    .select_related('resolved_by'))
-        return tasks
+        if foia.agency_id:
+            conditions |= Q(task_agency=foia.agency_id, task_type='newagencytask')
+        if not conditions:
+            return []
+        communication_queryset = lambda model: (model.objects
+                .select_related('communication__foia', 'resolved_by')
+                .prefetch_related(
+                    Prefetch('communication__foia__communications',
+                        queryset=FOIACommunication.objects
+                            .order_by('-date')
+                            .prefetch_related('files'),
+                        to_attr='reverse_communications'),
+                    'communication__foia__communications__files',
+                    ))
+        foia_queryset = lambda model: (model.objects
+                .select_related('foia__jurisdiction', 'resolved_by'))
+        return self.filter(conditions).order_by('date_created', 'pk').load_subclasses({
+            ResponseTask: communication_queryset(ResponseTask),
+            SnailMailTask: communication_queryset(SnailMailTask),
+            FailedFaxTask: communication_queryset(FailedFaxTask),
+            RejectedEmailTask: foia_queryset(RejectedEmailTask),
+            FlaggedTask: foia_queryset(FlaggedTask),
+            StatusChangeTask: foia_queryset(StatusChangeTask),
+            NewAgencyTask: NewAgencyTask.objects
+                .preload_list()
+                .select_related('resolved_by'),
+            })
+
+    def count_unresolved(self):
+        """Count the unresolved tasks of each type, in a single query"""
+        counts = dict(self
+                .filter(resolved=False)
+                .order_by()
+                .values_list('task_type')
+                .annotate(Count('pk')))
+        counts['all'] = sum(counts.itervalues())
+        return counts
+
+    def update_communication(self, communication):
+        """Update the denormalized request and agency of the tasks for a
+        communication which has been moved to another request"""
+        task_pks = set()
+        for model in (OrphanTask, SnailMailTask, ResponseTask, FailedFaxTask):
+            task_pks.update(model.objects
+                    .filter(communication=communication)
+                    .values_list('pk', flat=True))
+        foia = communication.foia
+        self.filter(pk__in=task_pks).update(
+                task_foia=foia,
+                task_agency=foia.agency_id if foia else None,
+                )
+
+    def resolve(self, user=None):
+        """
+        Resolve all of these tasks with a few statements, instead of saving
+        each of them
+        """
+        # avoid circular imports
+        from muckrock.agency.models import Agency
+        tasks = self.filter(resolved=False)
+        # resolving a stale agency task unmarks its agency as stale
+        agency_ids = list(tasks
+                .filter(task_type='staleagencytask')
+                .values_list('task_agency_id', flat=True))
+        with transaction.atomic():
+            count = tasks.update(
+                    resolved=True,
+                    resolved_by=user,
+                    date_done=datetime.now(),
+                    )
+            if agency_ids:
+                Agency.objects.filter(pk__in=agency_ids).update(
+                        stale=False,
+                        manual_stale=False,
+                        )
+                (StaleAgencyTask.objects
+                        .filter(resolved=False, agency__in=agency_ids)
+                        .update(resolved=True))
+        logging.info('User %s resolved %d tasks', user, count)
+        return count
+
+    def load_subclasses(self, querysets=None):
+        """
+        Load the tasks as instances of their subclasses, with one query for
+        each type of task present, keeping their order
+
+        `querysets` may map task subclasses to the queryset to load them
+        from, to select or prefetch what will be displayed for them
+        """
+        querysets = querysets or {}
+        tasks = list(self.values_list('pk', 'task_type'))
+        pks_by_type = {}
+        for pk, task_type in tasks:
+            pks_by_type.setdefault(task_type, []).append(pk)
+        loaded = {}
+        for task_type, pks in pks_by_type.iteritems():
+            try:
+                model = apps.get_model('task', task_type)
+            except LookupError:
+                model = Task
+            queryset = querysets.get(model, model.objects.all())
+            loaded.update((task.pk, task) for task in queryset.filter(pk__in=pks))
+        return [loaded[pk] for pk, _ in tasks if pk in loaded]
 
 
 class OrphanTaskQuerySet(models.QuerySet):
@@ -97,6 +176,15 @@ class OrphanTaskQuerySet(models.QuerySet):
         """Get all orphan tasks from a specific sender"""
         return self.filter(communication__priv_from_who__icontains=sender)
 
+    def get_from_domain(self, domain):
+        """Get all orphan tasks from a sender at a specific domain, or at
+        any of its subdomains"""
+        reversed_domain = domain.lower()[::-1]
+        return self.filter(
+                Q(communication__sender_domain_reversed=reversed_domain) |
+                Q(communication__sender_domain_reversed__startswith=
+                    reversed_domain + '.'))
+
 
 class NewAgencyTaskQuerySet(models.QuerySet):
     """Object manager for new agency tasks"""
@@ -121,11 +209,56 @@ class Task(models.Model):
     resolved = models.BooleanField(default=False, db_index=True)
     assigned = models.ForeignKey(User, blank=True, null=True, related_name="assigned_tasks")
     resolved_by = models.ForeignKey(User, blank=True, null=True, related_name="resolved_tasks")
+    # denormalized from the subclasses, so tasks of every type can be
+    # counted and found without joining each of the subclass tables
+    task_type = models.CharField(max_length=30, blank=True, editable=False)
+    task_foia = models.ForeignKey(
+            'foia.FOIARequest',
+            related_name='+',
+            blank=True,
+            null=True,
+            editable=False,
+            on_delete=models.SET_NULL,
+            )
+    task_agency = models.ForeignKey(
+            'agency.Agency',
+            related_name='+',
+            blank=True,
+            null=True,
+            editable=False,
+            on_delete=models.SET_NULL,
+            )
 
     objects = TaskQuerySet.as_manager()
 
     class Meta:
         ordering = ['date_created']
+        index_together = [
+                ('resolved', 'task_type'),
+                ('task_foia', 'task_type'),
+                ('task_agency', 'task_type'),
+                ]
+
+    def save(self, *args, **kwargs):
+        """Keep the denormalized type, request and agency up to date"""
+        if self._meta.model_name != 'task':
+            self.task_type = self._meta.model_name
+            self.task_foia_id = self.get_task_foia_id()
+            self.task_agency_id = getattr(self, 'agency_id', None)
+            if self.task_agency_id is None and self.task_foia_id is not None:
+                self.task_agency_id = (FOIARequest.objects
+                        .filter(pk=self.task_foia_id)
+                        .values_list('agency_id', flat=True)
+                        .first())
+        super(Task, self).save(*args, **kwargs)
+
+    def get_task_foia_id(self):
+        """The request this task is for, directly or through its communication"""
+        if getattr(self, 'foia_id', None) is not None:
+            return self.foia_id
+        if getattr(self, 'communication_id', None) is not None:
+            return self.communication.foia_id
+        return None
 
     def __unicode__(self):
         # pylint:disable=no-self-use
@@ -187,11 +320,7 @@ class OrphanTask(Task):
 
     def get_sender_domain(self):
         """Gets the domain of the sender's email address."""
-        _, email_address = email.utils.parseaddr(self.communication.priv_from_who)
-        if '@' not in email_address:
-            return None
-        else:
-            return email_address.split('@')[1]
+        return self.communication.sender_domain or None
 
     def blacklist(self):
         """Adds the communication's sender's domain to the email blacklist."""
@@ -317,12 +446,14 @@ class StaleAgencyTask(Task):
 
     def latest_response(self):
         """Returns the latest response from the agency"""
-        foias = self.agency.foiarequest_set.all()
-        comms = [c for f in foias for c in f.communications.all() if c.response]
-        if len(comms) > 0:
-            return max(comms, key=lambda x: x.date)
-        else:
-            return None
+        # avoid circular imports
+        from muckrock.agency.models import Agency
+        return (FOIACommunication.objects
+                .filter(pk__in=Agency.objects
+                    .filter(pk=self.agency_id)
+                    .values('last_response'))
+                .select_related('foia__jurisdiction')
+                .first())
 
     def update_email(self, new_email, foia_list=None):
         """Updates the email on the agency and the provided requests."""
@@ -477,29 +608,35 @@ class ResponseTask(Task):
         # check that status is valid
         if status not in [status_set[0] for status_set in STATUS]:
             raise ValueError('Invalid status.')
+        # avoid circular imports
+        from muckrock.foia.tasks import update_status_changes
+        from muckrock.templatetags.signals import bump_generations_many
         if comms is None:
             comms = [self.communication]
-        for comm in comms:
-            # save comm first
-            comm.status = status
-            comm.save()
-            # save foia next, unless just updating comm status
-            if set_foia:
-                foia = comm.foia
-                foia.status = status
-                if status in ['rejected', 'no_docs', 'done', 'abandoned']:
-                    foia.date_done = comm.date
-                foia.update()
-                foia.save(comment='response task status')
-                logging.info('Request #%d status changed to "%s"', foia.id, status)
-                action = generate_status_action(foia)
-                foia.notify(action)
-                # Mark generic '<Agency> sent a communication to <FOIARequest> as read.'
-                # https://github.com/MuckRock/muckrock/issues/1003
-                generic_notifications = (Notification.objects.for_object(foia)
-                                        .get_unread().filter(action__verb='sent a communication'))
-                for generic_notification in generic_notifications:
-                    generic_notification.mark_read()
+        foia_pks = []
+        with transaction.atomic():
+            # update the comms first
+            (FOIACommunication.objects
+                    .filter(pk__in=[comm.pk for comm in comms])
+                    .update(status=status))
+            Change.objects.record_many(
+                    FOIACommunication, [comm.pk for comm in comms])
+            bump_generations_many(FOIACommunication, comms)
+            for comm in comms:
+                comm.status = status
+                # save foia next, unless just updating comm status
+                if set_foia:
+                    foia = comm.foia
+                    foia.status = status
+                    foia.updated = True
+                    if status in ['rejected', 'no_docs', 'done', 'abandoned']:
+                        foia.date_done = comm.date
+                    foia.save(comment='response task status')
+                    logging.info('Request #%d status changed to "%s"', foia.id, status)
+                    foia_pks.append(foia.pk)
+        # the dates and notifications are updated in the background
+        if foia_pks:
+            update_status_changes.delay(foia_pks)
 
     def set_price(self, price, comms=None):
         """Sets the price of the communication's request"""
@@ -606,16 +743,39 @@ class NewExemptionTask(Task):
 
 
 # Not a task, but used by tasks
+class BlacklistDomainQuerySet(models.QuerySet):
+    """Object manager for blacklisted domains"""
+    def get_domains(self):
+        """All of the blacklisted domains, cached for every worker"""
+        # pylint: disable=no-self-use
+        return cache_get_or_set(
+                BLACKLIST_CACHE_KEY,
+                lambda: frozenset(domain.lower() for domain in
+                    BlacklistDomain.objects.values_list('domain', flat=True)),
+                settings.DEFAULT_CACHE_TIMEOUT)
+
+    def is_blacklisted(self, domain):
+        """Is this domain, or a domain it is a subdomain of, blacklisted?"""
+        if domain is None:
+            return False
+        parts = domain.lower().split('.')
+        domains = self.get_domains()
+        return any('.'.join(parts[i:]) in domains for i in xrange(len(parts)))
+
+
 class BlacklistDomain(models.Model):
     """A domain to be blacklisted from sending us emails"""
     domain = models.CharField(max_length=255)
 
+    objects = BlacklistDomainQuerySet.as_manager()
+
     def __unicode__(self):
         return self.domain
 
     def resolve_matches(self):
         """Resolves any orphan tasks that match this blacklisted domain."""
-        tasks_to_resolve = OrphanTask.objects.get_from_sender(self.domain)
-        for task in tasks_to_resolve:
-            task.resolve()
+        tasks_to_resolve = (OrphanTask.objects
+                .get_from_domain(self.domain)
+                .filter(resolved=False))
+        Task.objects.filter(pk__in=tasks_to_resolve.values('pk')).resolve()
         return
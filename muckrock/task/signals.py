@@ -1,11 +1,18 @@
 """Signals for the task application"""
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 
 import logging
 
 from muckrock.message.tasks import slack
-from muckrock.task.models import FlaggedTask, ProjectReviewTask, OrphanTask, BlacklistDomain
+from muckrock.task.models import (
+        BLACKLIST_CACHE_KEY,
+        BlacklistDomain,
+        FlaggedTask,
+        OrphanTask,
+        ProjectReviewTask,
+        )
 
 logger = logging.getLogger(__name__)
 
@@ -21,10 +28,14 @@ def domain_blacklist(sender, instance, created, **kwargs):
     if domain is None:
         return
     logger.info('Checking domain %s against blacklist', domain)
-    if BlacklistDomain.objects.filter(domain=domain).exists():
+    if BlacklistDomain.objects.is_blacklisted(domain):
         instance.resolve()
     return
 
+def clear_blacklist_cache(sender, **kwargs):
+    """Clear the cached blacklisted domains when they change"""
+    cache.delete(BLACKLIST_CACHE_KEY)
+
 def format_user(user):
     """Format a user for inclusion in a Slack notification"""
     base_url = 'https://www.muckrock.com'
@@ -131,6 +142,14 @@ post_save.connect(
     domain_blacklist,
     sender=OrphanTask,
     dispatch_uid='muckrock.task.signals.domain_blacklist')
+post_save.connect(
+    clear_blacklist_cache,
+    sender=BlacklistDomain,
+    dispatch_uid='muckrock.task.signals.clear_blacklist_cache.save')
+post_delete.connect(
+    clear_blacklist_cache,
+    sender=BlacklistDomain,
+    dispatch_uid='muckrock.task.signals.clear_blacklist_cache.delete')
 post_save.connect(
     notify_flagged,
     sender=FlaggedTask,
@@ -4,8 +4,11 @@ Nodes and tags for rendering tasks into templates
 
 from django import template
 from django.core.urlresolvers import reverse
+from django.db.models import Max
 
 from muckrock import agency, foia, task
+from muckrock.crowdfund.models import Crowdfund
+from muckrock.models import ExtractDay, Now
 # imports Task model separately to patch bug in django-compressor parser
 from muckrock.task.models import Task
 
@@ -24,6 +27,11 @@ class TaskNode(template.Node):
         self._task = template.Variable(task_)
         self.task = None
 
+    @classmethod
+    def preload(cls, tasks):
+        """Load the extra context for a list of these tasks in bulk"""
+        pass
+
     def render(self, context):
         """Render the task"""
         self.task = self._task.resolve(context)
@@ -48,6 +56,16 @@ class CrowdfundTaskNode(TaskNode):
     endpoint_name = 'crowdfund-task-list'
     class_name = 'crowdfund'
 
+    @classmethod
+    def preload(cls, tasks):
+        """Load the request or project of each crowdfund"""
+        crowdfunds = (Crowdfund.objects
+                .select_related('foia')
+                .prefetch_related('projects')
+                .in_bulk([task_.crowdfund_id for task_ in tasks]))
+        for task_ in tasks:
+            task_.crowdfund = crowdfunds[task_.crowdfund_id]
+
     def get_extra_context(self):
         """Adds the crowdfund object to context."""
         extra_context = super(CrowdfundTaskNode, self).get_extra_context()
@@ -120,11 +138,16 @@ class OrphanTaskNode(TaskNode):
     endpoint_name = 'orphan-task-list'
     class_name = 'orphan'
 
+    @classmethod
+    def preload(cls, tasks):
+        """Load the attachments of each communication"""
+        preload_attachments(tasks)
+
     def get_extra_context(self):
         """Adds sender domain to the context"""
         extra_context = super(OrphanTaskNode, self).get_extra_context()
         extra_context['domain'] = self.task.get_sender_domain()
-        extra_context['attachments'] = self.task.communication.files.all()
+        extra_context['attachments'] = get_attachments(self.task)
         return extra_context
 
 
@@ -143,6 +166,11 @@ class ResponseTaskNode(TaskNode):
     endpoint_name = 'response-task-list'
     class_name = 'response'
 
+    @classmethod
+    def preload(cls, tasks):
+        """Load the attachments of each communication"""
+        preload_attachments(tasks)
+
     def get_extra_context(self):
         """Adds ResponseTask-specific context"""
         extra_context = super(ResponseTaskNode, self).get_extra_context()
@@ -157,7 +185,7 @@ class ResponseTaskNode(TaskNode):
             form_initial['date_estimate'] = _foia.date_estimate
             extra_context['previous_communications'] = _foia.reverse_communications
         extra_context['response_form'] = task.forms.ResponseTaskForm(initial=form_initial)
-        extra_context['attachments'] = self.task.communication.files.all()
+        extra_context['attachments'] = get_attachments(self.task)
         return extra_context
 
 
@@ -168,13 +196,28 @@ class SnailMailTaskNode(TaskNode):
     endpoint_name = 'snail-mail-task-list'
     class_name = 'snail-mail'
 
+    @classmethod
+    def preload(cls, tasks):
+        """Load the agency, and its appeal agency, of each request"""
+        agency_ids = dict(foia.models.FOIACommunication.objects
+                .filter(pk__in=[task_.communication_id for task_ in tasks])
+                .values_list('pk', 'foia__agency_id'))
+        agencies = (agency.models.Agency.objects
+                .select_related('appeal_agency')
+                .in_bulk(agency_ids.values()))
+        for task_ in tasks:
+            task_.agency_ = agencies.get(agency_ids[task_.communication_id])
+
     def get_extra_context(self):
         """Adds status to the context"""
         extra_context = super(SnailMailTaskNode, self).get_extra_context()
         extra_context['status'] = foia.models.STATUS
         # if this is an appeal and their is a specific appeal agency, display
         # that agency, else display the standard agency
-        foia_agency = self.task.communication.foia.agency
+        if hasattr(self.task, 'agency_'):
+            foia_agency = self.task.agency_
+        else:
+            foia_agency = self.task.communication.foia.agency
         if self.task.category == 'a' and foia_agency.appeal_agency:
             extra_context['agency'] = foia_agency.appeal_agency
         else:
@@ -189,10 +232,48 @@ class StaleAgencyTaskNode(TaskNode):
     endpoint_name = 'stale-agency-task-list'
     class_name = 'stale-agency'
 
+    @classmethod
+    def preload(cls, tasks):
+        """Load the latest response and the stale requests of each agency"""
+        descriptor = task.models.StaleAgencyTask.agency
+        uncached = [task_ for task_ in tasks if not descriptor.is_cached(task_)]
+        if uncached:
+            agencies = agency.models.Agency.objects.in_bulk(
+                    [task_.agency_id for task_ in uncached])
+            for task_ in uncached:
+                task_.agency = agencies[task_.agency_id]
+        # the latest response is stored on each agency
+        latest_responses = (foia.models.FOIACommunication.objects
+                .select_related('foia__jurisdiction')
+                .in_bulk([task_.agency.last_response_id for task_ in tasks
+                    if task_.agency.last_response_id is not None]))
+        stale_requests = {}
+        missing_agency_ids = set(
+                task_.agency_id for task_ in tasks
+                if not hasattr(task_.agency, 'stale_requests_'))
+        if missing_agency_ids:
+            foias = (foia.models.FOIARequest.objects
+                    .filter(agency__in=missing_agency_ids)
+                    .get_open()
+                    .filter(disable_autofollowups=False)
+                    .annotate(latest_communication=
+                        ExtractDay(Now() - Max('communications__date')))
+                    .order_by('-latest_communication')
+                    .select_related('jurisdiction'))
+            for foia_ in foias:
+                stale_requests.setdefault(foia_.agency_id, []).append(foia_)
+        for task_ in tasks:
+            task_.latest_response_ = latest_responses.get(task_.agency.last_response_id)
+            if task_.agency_id in missing_agency_ids:
+                task_.agency.stale_requests_ = stale_requests.get(task_.agency_id, [])
+
     def get_extra_context(self):
         """Adds a form for updating the email"""
         extra_context = super(StaleAgencyTaskNode, self).get_extra_context()
-        latest_response = self.task.latest_response()
+        if hasattr(self.task, 'latest_response_'):
+            latest_response = self.task.latest_response_
+        else:
+            latest_response = self.task.latest_response()
         if latest_response:
             initial = {'email': latest_response.priv_from_who}
         else:
@@ -226,6 +307,53 @@ class NewExemptionTaskNode(TaskNode):
 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
 
+TASK_NODES = {node.model: node for node in [
+    CrowdfundTaskNode,
+    FailedFaxTaskNode,
+    FlaggedTaskNode,
+    ProjectReviewTaskNode,
+    MultiRequestTaskNode,
+    NewAgencyTaskNode,
+    OrphanTaskNode,
+    RejectedEmailTaskNode,
+    ResponseTaskNode,
+    SnailMailTaskNode,
+    StaleAgencyTaskNode,
+    StatusChangeTaskNode,
+    NewExemptionTaskNode,
+    ]}
+
+def preload_tasks(tasks):
+    """
+    Load the extra context for all of the tasks on a page before they are
+    rendered, with a fixed number of queries for each type of task instead
+    of a few for each task
+    """
+    tasks_by_node = {}
+    for task_ in tasks:
+        node = TASK_NODES.get(type(task_), TaskNode)
+        tasks_by_node.setdefault(node, []).append(task_)
+    for node, node_tasks in tasks_by_node.iteritems():
+        node.preload(node_tasks)
+    return tasks
+
+def preload_attachments(tasks):
+    """Load the files attached to the communication of each task"""
+    files = (foia.models.FOIAFile.objects
+            .filter(comm__in=[task_.communication_id for task_ in tasks])
+            .select_related('foia__jurisdiction'))
+    files_by_comm = {}
+    for file_ in files:
+        files_by_comm.setdefault(file_.comm_id, []).append(file_)
+    for task_ in tasks:
+        task_.attachments_ = files_by_comm.get(task_.communication_id, [])
+
+def get_attachments(task_):
+    """The files attached to the task's communication, preloaded if possible"""
+    if hasattr(task_, 'attachments_'):
+        return task_.attachments_
+    return task_.communication.files.all()
+
 def get_id(token):
     """Helper function to check token has correct arguments and return the task_id."""
     # pylint:disable=unused-variable
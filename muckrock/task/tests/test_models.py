@@ -6,15 +6,16 @@ from django.core.urlresolvers import reverse
 from django.http import Http404
 from django.test import TestCase
 
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
 import mock
 import nose
 
 from muckrock import factories, task
-from muckrock.foia.models import FOIARequest, FOIANote
+from muckrock.foia.models import Change, FOIACommunication, FOIARequest, FOIANote
 from muckrock.task.factories import FlaggedTaskFactory, ProjectReviewTaskFactory
 from muckrock.task.signals import domain_blacklist
+from muckrock.utils import new_action
 
 ok_ = nose.tools.ok_
 eq_ = nose.tools.eq_
@@ -87,6 +88,30 @@ class OrphanTaskTests(TestCase):
         """Should return the domain of the orphan's sender."""
         eq_(self.task.get_sender_domain(), 'muckrock.com')
 
+    def test_get_from_domain(self):
+        """Orphans are matched by the domain parsed from their sender"""
+        eq_(self.comm.sender_domain, 'muckrock.com')
+        eq_(list(task.models.OrphanTask.objects.get_from_domain('MuckRock.com')),
+            [self.task])
+        eq_(list(task.models.OrphanTask.objects.get_from_domain('rock.com')), [])
+
+    def test_get_from_subdomain(self):
+        """Orphans from subdomains of a domain are matched too"""
+        self.comm.priv_from_who = 'Bob <bob@mail.muckrock.com>'
+        self.comm.save()
+        eq_(list(task.models.OrphanTask.objects.get_from_domain('muckrock.com')),
+            [self.task])
+        eq_(list(task.models.OrphanTask.objects.get_from_domain('mail.muckrock.com')),
+            [self.task])
+        self.comm.priv_from_who = 'Bob <bob@xmuckrock.com>'
+        self.comm.save()
+        eq_(list(task.models.OrphanTask.objects.get_from_domain('muckrock.com')), [])
+        self.comm.priv_from_who = 'Bob <bob@mail.muckrock.com>'
+        self.comm.save()
+        task.models.BlacklistDomain.objects.create(domain='muckrock.com')
+        ok_(task.models.BlacklistDomain.objects.is_blacklisted('mail.muckrock.com'))
+        ok_(not task.models.BlacklistDomain.objects.is_blacklisted('muckrock.org'))
+
     def test_reject(self):
         """Shouldn't do anything, ATM. Revisit later."""
         self.task.reject()
@@ -316,6 +341,26 @@ class StaleAgencyTaskTests(TestCase):
         eq_(latest_response, self.foia.last_response())
         ok_(latest_response.response, 'Should return a response!')
 
+    def test_bulk_resolve(self):
+        """Resolving stale agency tasks in bulk unmarks their agencies"""
+        user = factories.UserFactory()
+        eq_(task.models.Task.objects.filter(pk=self.task.pk).resolve(user), 1)
+        self.task.refresh_from_db()
+        self.task.agency.refresh_from_db()
+        ok_(self.task.resolved)
+        eq_(self.task.resolved_by, user)
+        ok_(not self.task.agency.stale)
+
+    def test_latest_response_other_request(self):
+        """The latest response may be to any of the agency's requests"""
+        other_foia = factories.FOIARequestFactory(agency=self.task.agency)
+        comm = factories.FOIACommunicationFactory(foia=other_foia, response=True)
+        with self.assertNumQueries(1):
+            eq_(self.task.latest_response(), comm)
+        factories.FOIACommunicationFactory(
+                foia=other_foia, response=True, date=comm.date - timedelta(1))
+        eq_(self.task.latest_response(), comm)
+
     @mock.patch('muckrock.foia.models.FOIARequest.followup')
     def test_update_email(self, mock_followup):
         """
@@ -424,6 +469,25 @@ class ResponseTaskTests(TestCase):
         eq_(self.task.communication.status, 'done',
             'The Communication status should be changed, however.')
 
+    def test_set_status_bulk_side_effects(self):
+        """Setting the status in bulk should log the change, invalidate
+        cached fragments and clear the owner's cached sidebar"""
+        comm = self.task.communication
+        foia = comm.foia
+        factories.NotificationFactory(
+            user=foia.user,
+            action=new_action(foia.agency, 'sent a communication',
+                action_object=comm, target=foia))
+        with mock.patch('muckrock.templatetags.signals.bump_cache_generation') as bump, \
+                mock.patch('muckrock.sidebar.context_processors'
+                    '.invalidate_user_payload') as invalidate:
+            self.task.set_status('done')
+        ok_(mock.call(FOIACommunication, comm.pk) in bump.call_args_list)
+        ok_(Change.objects
+                .filter(content_type__model='foiacommunication', object_id=comm.pk)
+                .exists())
+        invalidate.assert_called_once_with(foia.user_id)
+
     def test_set_tracking_id(self):
         new_tracking = u'dogs-r-cool'
         self.task.set_tracking_id(new_tracking)
@@ -541,3 +605,33 @@ class TestTaskManager(TestCase):
         returned_tasks = task.models.Task.objects.filter_by_foia(self.foia, staff_user)
         eq_(returned_tasks, self.tasks,
             'The manager should return all the tasks that incorporate this FOIA.')
+
+    def test_denormalized_fields(self):
+        """Tasks record their type, request and agency on the base table"""
+        response_task = task.models.Task.objects.get(pk=self.tasks[0].pk)
+        eq_(response_task.task_type, 'responsetask')
+        eq_(response_task.task_foia, self.foia)
+        eq_(response_task.task_agency, self.foia.agency)
+        new_agency_task = task.models.Task.objects.get(pk=self.tasks[-1].pk)
+        eq_(new_agency_task.task_type, 'newagencytask')
+        eq_(new_agency_task.task_foia, None)
+        eq_(new_agency_task.task_agency, self.foia.agency)
+
+    def test_count_unresolved(self):
+        """Unresolved tasks are counted by type"""
+        self.tasks[0].resolve()
+        counts = task.models.Task.objects.count_unresolved()
+        eq_(counts['all'], 6)
+        ok_('responsetask' not in counts)
+        eq_(counts['snailmailtask'], 1)
+
+    def test_load_subclasses(self):
+        """Tasks are loaded as their subclasses, in order"""
+        eq_(task.models.Task.objects.order_by('date_created', 'pk').load_subclasses(),
+            self.tasks)
+
+    def test_move_communication(self):
+        """Moving a communication updates the request of its tasks"""
+        other_foia = factories.FOIARequestFactory()
+        self.comm.move([other_foia.pk])
+        eq_(task.models.Task.objects.get(pk=self.tasks[0].pk).task_foia, other_foia)
@@ -18,6 +18,7 @@ from muckrock.task.factories import (
     StaleAgencyTaskFactory,
     ResponseTaskFactory,
 )
+from muckrock.task.templatetags.task_tags import preload_tasks
 from muckrock.task.views import ResponseTaskList
 from muckrock.test_utils import mock_middleware, http_get_response, http_post_response
 from muckrock.views import MRFilterListView
@@ -67,6 +68,30 @@ class TaskListViewTests(TestCase):
         obj_list = response.context_data['object_list']
         ok_(obj_list, 'Object list should not be empty.')
 
+@mock.patch('muckrock.message.notifications.SlackNotification.send', mock_send)
+class TaskPreloadTests(TestCase):
+    """The extra context for a page of tasks is loaded in bulk"""
+    def setUp(self):
+        self.response_task = ResponseTaskFactory()
+        self.file = factories.FOIAFileFactory(
+                comm=self.response_task.communication,
+                foia=self.response_task.communication.foia)
+        self.stale_task = StaleAgencyTaskFactory()
+        foia = factories.FOIARequestFactory(agency=self.stale_task.agency)
+        self.comm = factories.FOIACommunicationFactory(foia=foia, response=True)
+
+    def test_preload(self):
+        tasks = (task.models.Task.objects
+                .filter(pk__in=[self.response_task.pk, self.stale_task.pk])
+                .order_by('pk')
+                .load_subclasses())
+        preload_tasks(tasks)
+        with self.assertNumQueries(0):
+            eq_(tasks[0].attachments_, [self.file])
+            eq_(tasks[1].latest_response_, self.comm)
+            ok_(isinstance(tasks[1].agency.stale_requests_, list))
+
+
 @mock.patch('muckrock.message.notifications.SlackNotification.send', mock_send)
 class TaskListViewPOSTTests(TestCase):
     """Tests POST requests to the Task list view"""
@@ -115,6 +140,17 @@ class TaskListViewBatchedPOSTTests(TestCase):
             eq_(_task.resolved, True,
                 'Task %d should be resolved when doing a batched resolve' % _task.pk)
 
+    def test_batch_resolve_queries(self):
+        """Batched resolves take the same number of queries for any number of tasks"""
+        data = {'resolve': 'truthy', 'tasks': [_task.id for _task in self.tasks]}
+        with mock.patch('muckrock.task.models.Task.resolve') as mock_resolve:
+            http_post_response(self.url, self.view, data, self.user)
+        ok_(not mock_resolve.called)
+        for _task in self.tasks:
+            _task.refresh_from_db()
+            eq_(_task.resolved_by, self.user)
+            ok_(_task.date_done is not None)
+
 @mock.patch('muckrock.message.notifications.SlackNotification.send', mock_send)
 class OrphanTaskViewTests(TestCase):
     """Tests OrphanTask-specific POST handlers"""
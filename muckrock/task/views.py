@@ -5,7 +5,7 @@ Views for the Task application
 from django.contrib import messages
 from django.contrib.auth.decorators import user_passes_test
 from django.core.urlresolvers import resolve
-from django.db.models import Count, Prefetch, Q, Max
+from django.db.models import Prefetch, Q, Max
 from django.http import HttpResponse, Http404
 from django.shortcuts import redirect, get_object_or_404
 from django.utils.decorators import method_decorator
@@ -16,7 +16,7 @@ from datetime import datetime
 
 from muckrock.agency.forms import AgencyForm
 from muckrock.agency.models import Agency, STALE_DURATION
-from muckrock.foia.models import STATUS, FOIARequest, FOIACommunication, FOIAFile
+from muckrock.foia.models import STATUS, FOIARequest, FOIACommunication
 from muckrock.models import ExtractDay, Now
 from muckrock.task.filters import (
     TaskFilterSet,
@@ -38,28 +38,34 @@ from muckrock.task.models import (
     CrowdfundTask, MultiRequestTask, StatusChangeTask, FailedFaxTask,
     ProjectReviewTask, NewExemptionTask
     )
+from muckrock.task.templatetags.task_tags import preload_tasks
 from muckrock.views import MRFilterListView
 
 # pylint:disable=missing-docstring
 
+# the counter names for each type of task
+COUNTERS = {
+    'orphantask': 'orphan',
+    'snailmailtask': 'snail_mail',
+    'rejectedemailtask': 'rejected',
+    'staleagencytask': 'stale_agency',
+    'flaggedtask': 'flagged',
+    'projectreviewtask': 'projectreview',
+    'newagencytask': 'new_agency',
+    'responsetask': 'response',
+    'statuschangetask': 'status_change',
+    'crowdfundtask': 'crowdfund',
+    'multirequesttask': 'multirequest',
+    'failedfaxtask': 'failed_fax',
+    'newexemptiontask': 'new_exemption',
+    }
+
 def count_tasks():
     """Counts all unresolved tasks and adds them to a dictionary"""
-    count = Task.objects.filter(resolved=False).aggregate(
-        all=Count('id'),
-        orphan=Count('orphantask'),
-        snail_mail=Count('snailmailtask'),
-        rejected=Count('rejectedemailtask'),
-        stale_agency=Count('staleagencytask'),
-        flagged=Count('flaggedtask'),
-        projectreview=Count('projectreviewtask'),
-        new_agency=Count('newagencytask'),
-        response=Count('responsetask'),
-        status_change=Count('statuschangetask'),
-        crowdfund=Count('crowdfundtask'),
-        multirequest=Count('multirequesttask'),
-        failed_fax=Count('failedfaxtask'),
-        new_exemption=Count('newexemptiontask'),
-        )
+    counts = Task.objects.count_unresolved()
+    count = {counter: counts.get(task_type, 0)
+             for task_type, counter in COUNTERS.iteritems()}
+    count['all'] = counts['all']
     return count
 
 
@@ -96,6 +102,10 @@ class TaskList(MRFilterListView):
     def get_context_data(self, **kwargs):
         """Adds counters for each of the sections and for processing requests."""
         context = super(TaskList, self).get_context_data(**kwargs)
+        if self.get_model() is Task:
+            # load each type of task on the page with its own fields
+            context['object_list'] = context['object_list'].load_subclasses()
+        context['object_list'] = preload_tasks(list(context['object_list']))
         context['counters'] = count_tasks()
         context['bulk_actions'] = self.bulk_actions
         context['processing_count'] = FOIARequest.objects.filter(status='submitted').count()
@@ -130,6 +140,11 @@ class TaskList(MRFilterListView):
             task.resolve(request.user)
         return task
 
+    def bulk_resolve(self, request, tasks):
+        """Resolve all of the selected tasks at once"""
+        # pylint: disable=no-self-use
+        Task.objects.filter(pk__in=tasks.values('pk')).resolve(request.user)
+
     def post(self, request):
         """Handle general cases for updating Task objects"""
         try:
@@ -140,8 +155,12 @@ class TaskList(MRFilterListView):
             else:
                 messages.warning(self.request, exception)
                 return redirect(self.get_redirect_url())
-        for task in tasks:
-            self.task_post_helper(request, task)
+        if request.POST.get('resolve') and not request.POST.get('task'):
+            # batched resolves do not need any per task handling
+            self.bulk_resolve(request, tasks)
+        else:
+            for task in tasks:
+                self.task_post_helper(request, task)
         if request.is_ajax():
             return HttpResponse(200)
         else:
@@ -152,8 +171,7 @@ class OrphanTaskList(TaskList):
     model = OrphanTask
     title = 'Orphans'
     queryset = (OrphanTask.objects
-            .select_related('communication__likely_foia__jurisdiction')
-            .prefetch_related('communication__files'))
+            .select_related('communication__likely_foia__jurisdiction'))
     bulk_actions = ['reject']
 
     def task_post_helper(self, request, task):
@@ -229,6 +247,13 @@ class SnailMailTaskList(TaskList):
         task.resolve(request.user)
         return super(SnailMailTaskList, self).task_post_helper(request, task)
 
+    def bulk_resolve(self, request, tasks):
+        """Confirm the communications of all of the selected tasks"""
+        (FOIACommunication.objects
+                .filter(snailmailtask__in=tasks)
+                .update(confirmed=datetime.now()))
+        super(SnailMailTaskList, self).bulk_resolve(request, tasks)
+
 
 class RejectedEmailTaskList(TaskList):
     model = RejectedEmailTask
@@ -274,7 +299,6 @@ class StaleAgencyTaskList(TaskList):
     queryset = (StaleAgencyTask.objects
             .select_related('agency')
             .prefetch_related(
-                'agency__foiarequest_set__communications__foia__jurisdiction',
                 Prefetch('agency__foiarequest_set',
                     queryset=FOIARequest.objects
                     .get_open()
@@ -383,8 +407,6 @@ class ResponseTaskList(TaskList):
             .select_related('communication__foia__agency')
             .select_related('communication__foia__jurisdiction')
             .prefetch_related(
-                Prefetch('communication__files',
-                    queryset=FOIAFile.objects.select_related('foia__jurisdiction')),
                 Prefetch('communication__foia__communications',
                     queryset=FOIACommunication.objects
                         .order_by('-date')
@@ -512,7 +534,7 @@ class RequestTaskList(TemplateView):
         # data calculated in the TaskList method, so using it just slows us down
         context = super(RequestTaskList, self).get_context_data(**kwargs)
         context['title'] = self.title
-        context['object_list'] = self.get_queryset()
+        context['object_list'] = preload_tasks(self.get_queryset())
         context['foia'] = self.foia_request
         context['foia_url'] = self.foia_request.get_absolute_url()
         return context
@@ -0,0 +1,19 @@
+"""Site wide celery tasks"""
+
+from celery.schedules import crontab
+from celery.task import periodic_task
+
+from muckrock.sitemap import generate_sitemaps
+
+@periodic_task(run_every=crontab(minute=15), name='muckrock.tasks.refresh_sitemaps')
+def refresh_sitemaps():
+    """Rewrite the sitemap pages with changes since the last run"""
+    generate_sitemaps()
+
+
+@periodic_task(run_every=crontab(hour=4, minute=45),
+               name='muckrock.tasks.rebuild_sitemaps',
+               time_limit=3600)
+def rebuild_sitemaps():
+    """Rewrite all of the sitemaps, to catch anything missed along the way"""
+    generate_sitemaps(full=True)
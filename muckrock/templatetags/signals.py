@@ -0,0 +1,55 @@
+"""Signals to invalidate cached template fragments when the objects they
+depend on change"""
+
+from django.db.models.signals import post_delete, post_save
+
+from muckrock.agency.models import Agency
+from muckrock.foia.models import FOIACommunication, FOIAFile, FOIANote, FOIARequest
+from muckrock.jurisdiction.models import Jurisdiction
+from muckrock.utils import bump_cache_generation
+
+# pylint: disable=unused-argument
+# pylint: disable=protected-access
+
+# the models cached fragments may depend on, along with the foreign keys to
+# the objects that each of them is displayed as a part of
+FRAGMENT_DEPENDENCIES = {
+    FOIARequest: (),
+    FOIACommunication: ('foia',),
+    FOIAFile: ('foia',),
+    FOIANote: ('foia',),
+    Agency: (),
+    Jurisdiction: (),
+    }
+
+
+def bump_generations(sender, instance, **kwargs):
+    """Bump the generation of the changed object, its model, and the
+    objects it is a part of"""
+    bump_cache_generation(sender)
+    bump_cache_generation(sender, instance.pk)
+    for field_name in FRAGMENT_DEPENDENCIES[sender]:
+        field = sender._meta.get_field(field_name)
+        related_pk = getattr(instance, field.attname)
+        if related_pk is not None:
+            bump_cache_generation(field.related_model, related_pk)
+
+
+def bump_generations_many(model, instances):
+    """Bump the generations for objects which were changed in bulk, without
+    sending any signals"""
+    for instance in instances:
+        bump_generations(model, instance)
+
+
+for model in FRAGMENT_DEPENDENCIES:
+    post_save.connect(
+            bump_generations,
+            sender=model,
+            dispatch_uid='muckrock.templatetags.signals.bump_generations.save.%s'
+            % model._meta.label)
+    post_delete.connect(
+            bump_generations,
+            sender=model,
+            dispatch_uid='muckrock.templatetags.signals.bump_generations.delete.%s'
+            % model._meta.label)
@@ -3,9 +3,11 @@ General temaplate tags
 """
 
 from django import template
+from django.apps import apps
 from django.conf import settings
 from django.core.cache import InvalidCacheBackendError, caches
 from django.core.cache.utils import make_template_fragment_key
+from django.db.models import Model
 from django.template import (
         Library,
         Node,
@@ -14,16 +16,19 @@ from django.template import (
         )
 from django.template.defaultfilters import stringfilter
 from django.utils.html import escape
-from django.utils.safestring import mark_safe
 
-import bleach
 from email.parser import Parser
-import markdown
 import re
 from urllib import urlencode
 
 from muckrock.forms import NewsletterSignupForm, TagManagerForm
 from muckrock.project.forms import ProjectManagerForm
+from muckrock.utils import (
+        cache_generation_key,
+        get_cache_generations,
+        render_markdown,
+        render_smartypants,
+        )
 
 register = Library()
 
@@ -52,6 +57,14 @@ def page_link(request, page_num):
             href += '&%s=%s' % (key, escape(value))
     return href
 
+@register.simple_tag
+def facet_link(request, key, value):
+    """Generates a link narrowing the current results to a facet"""
+    query = request.GET.copy()
+    query.pop('page', None)
+    query[key] = value
+    return escape('?' + query.urlencode())
+
 @register.filter
 @stringfilter
 def company_title(companies):
@@ -210,66 +223,40 @@ def get_item(dictionary, key):
 @register.filter
 def smartypants(text):
     """Renders typographically-correct quotes with the smartpants library"""
-    import smartypants as _smartypants
-    smart_text = _smartypants.smartypants(text)
-    return mark_safe(bleach.clean(smart_text))
+    return render_smartypants(text)
 
 @register.filter(name='markdown')
 @stringfilter
 def markdown_filter(text, _safe=None):
     """Take the provided markdown-formatted text and convert it to HTML."""
-    # First render Markdown
-    extensions = [
-            'markdown.extensions.smarty',
-            'markdown.extensions.tables',
-            'pymdownx.magiclink',
-            ]
-    markdown_text = markdown.markdown(text, extensions=extensions)
-    # Next bleach the markdown
-    allowed_tags = bleach.ALLOWED_TAGS + [
-        u'h1',
-        u'h2',
-        u'h3',
-        u'h4',
-        u'h5',
-        u'h6',
-        u'p',
-        u'img',
-        u'iframe'
-    ]
-    allowed_attributes = bleach.ALLOWED_ATTRIBUTES.copy()
-    allowed_attributes.update({
-        'iframe': ['src', 'width', 'height', 'frameborder', 'marginheight', 'marginwidth'],
-        'img': ['src', 'alt', 'title', 'width', 'height'],
-    })
-    # allows bleaching to be avoided
-    if _safe == 'safe':
-        bleached_text = markdown_text
-    elif _safe == 'strip':
-        bleached_text = bleach.clean(
-            markdown_text,
-            tags=allowed_tags,
-            attributes=allowed_attributes,
-            strip=True,
-        )
-    else:
-        bleached_text = bleach.clean(
-            markdown_text,
-            tags=allowed_tags,
-            attributes=allowed_attributes
-        )
-    return mark_safe(bleached_text)
+    return render_markdown(text, _safe)
 
 
 class CacheNode(Node):
     """Cache Node for condtional cache tag"""
-    def __init__(self, nodelist, expire_time_var, fragment_name, vary_on, cache_name):
+    def __init__(self, nodelist, expire_time_var, fragment_name, vary_on,
+            cache_name, depends_on=None):
         # pylint: disable=too-many-arguments
         self.nodelist = nodelist
         self.expire_time_var = expire_time_var
         self.fragment_name = fragment_name
         self.vary_on = vary_on
         self.cache_name = cache_name
+        self.depends_on = depends_on or []
+
+    def get_generations(self, context):
+        """The current generation of each of the models and objects this
+        fragment depends on"""
+        keys = []
+        for var in self.depends_on:
+            dependency = var.resolve(context)
+            if isinstance(dependency, Model):
+                keys.append(cache_generation_key(type(dependency), dependency.pk))
+            elif isinstance(dependency, basestring):
+                keys.append(cache_generation_key(apps.get_model(dependency)))
+            elif dependency is not None:
+                keys.append(cache_generation_key(dependency))
+        return get_cache_generations(keys)
 
     def render(self, context):
         try:
@@ -304,6 +291,7 @@ class CacheNode(Node):
         # memcached backend does no allow for 0 for no caching so do it here
         if expire_time != 0:
             vary_on = [var.resolve(context) for var in self.vary_on]
+            vary_on.extend(self.get_generations(context))
             cache_key = make_template_fragment_key(self.fragment_name, vary_on)
             value = fragment_cache.get(cache_key)
             if value is None:
@@ -332,12 +320,19 @@ def do_cache(parser, token):
     Optionally the cache to use may be specified thus::
         {% cache ....  using="cachename" %}
     Each unique set of arguments will result in a unique cache entry.
+    The fragment may also depend on objects, models or 'app.Model' names,
+    so that it is no longer used once any of them are changed::
+        {% cache ....  depends=foia depends=foia.agency %}
     """
     nodelist = parser.parse(('endcache',))
     parser.delete_first_token()
     tokens = token.split_contents()
     if len(tokens) < 3:
         raise TemplateSyntaxError("'%r' tag requires at least 2 arguments." % tokens[0])
+    depends_on = []
+    while len(tokens) > 3 and tokens[-1].startswith('depends='):
+        depends_on.insert(0, parser.compile_filter(tokens[-1][len('depends='):]))
+        tokens = tokens[:-1]
     if len(tokens) > 3 and tokens[-1].startswith('using='):
         cache_name = parser.compile_filter(tokens[-1][len('using='):])
         tokens = tokens[:-1]
@@ -348,4 +343,5 @@ def do_cache(parser, token):
         tokens[2],  # fragment_name can't be a variable.
         [parser.compile_filter(t) for t in tokens[3:]],
         cache_name,
+        depends_on,
 )
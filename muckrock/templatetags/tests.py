@@ -2,12 +2,17 @@
 Tests using nose for the templatetags
 """
 
-from django.test import TestCase
+from django.template import Context, Template
+from django.test import TestCase, override_settings
 
 import nose.tools
 from mock import Mock
 
+from muckrock.agency.models import Agency
+from muckrock.factories import AgencyFactory
 from muckrock.templatetags.templatetags import tags
+# connect the signals which bump the cache generations
+import muckrock.templatetags.signals # pylint: disable=unused-import
 
 # allow methods that could be functions and too many public methods in tests
 # pylint: disable=no-self-use
@@ -30,3 +35,29 @@ class TestTemplatetagsFunctional(TestCase):
 
         nose.tools.eq_(tags.company_title('one\ntwo\nthree'), 'one, et al')
         nose.tools.eq_(tags.company_title('company'), 'company')
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TestDependentCache(TestCase):
+    """Cached fragments are invalidated when the objects they depend on change"""
+
+    def render(self, agency):
+        """Render a fragment depending on the agency"""
+        template = Template(
+                '{% load tags %}'
+                '{% cond_cache 600 agency_name agency.pk depends=agency %}'
+                '{{ agency.name }}'
+                '{% endcache %}')
+        return template.render(Context({'agency': agency}))
+
+    def test_depends(self):
+        """Saving the agency invalidates the fragment"""
+        agency = AgencyFactory(name='Old Name')
+        nose.tools.eq_(self.render(agency), 'Old Name')
+        # updates bypass the signals, so the fragment is still cached
+        Agency.objects.filter(pk=agency.pk).update(name='New Name')
+        agency.refresh_from_db()
+        nose.tools.eq_(self.render(agency), 'Old Name')
+        agency.save()
+        nose.tools.eq_(self.render(agency), 'New Name')
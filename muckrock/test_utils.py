@@ -3,10 +3,16 @@ Utilities for testing MuckRock applications
 """
 
 from django.contrib.auth.models import AnonymousUser
+from django.db import DEFAULT_DB_ALIAS, connections
 from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
 
+from collections import Counter
+from contextlib import contextmanager
 from mock import MagicMock
 
+from muckrock.instrumentation import fingerprint
+
 def mock_middleware(request):
     """Mocks the request with messages and session middleware"""
     setattr(request, 'session', MagicMock())
@@ -31,3 +37,28 @@ def http_post_response(url, view, data, user=AnonymousUser(), **kwargs):
     request.user = user
     response = view(request, **kwargs)
     return response
+
+@contextmanager
+def assert_max_queries(budget, using=DEFAULT_DB_ALIAS):
+    """
+    Assert that no more than `budget` queries run within the block
+
+    On failure, the queries that were run more than once are listed, as
+    they are usually the cause of the overrun.
+    """
+    with CaptureQueriesContext(connections[using]) as context:
+        yield context
+    queries = [query['sql'] for query in context.captured_queries]
+    if len(queries) > budget:
+        counts = Counter(fingerprint(sql) for sql in queries)
+        duplicates = [
+                '%d x %s' % (count, sql)
+                for sql, count in counts.most_common()
+                if count > 1
+                ]
+        raise AssertionError(
+                '%d queries run, the budget is %d.  Duplicate queries:\n%s' % (
+                    len(queries),
+                    budget,
+                    '\n'.join(duplicates) or 'none',
+                    ))
@@ -3,24 +3,60 @@ Tests for site level functionality and helper functions for application tests
 """
 
 from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.core.files.storage import FileSystemStorage
 from django.core.urlresolvers import reverse
-from django.test import TestCase, RequestFactory
+from django.test import TestCase, RequestFactory, override_settings
 
+from actstream.actions import follow
 from actstream.models import Action
 from mock import Mock, patch
+from StringIO import StringIO
+import gzip
 import logging
 import nose.tools
+import shutil
+import tempfile
 from nose.tools import ok_
 from nose.tools import eq_
 
 from muckrock.accounts.models import Notification
-from muckrock.factories import UserFactory, AnswerFactory
+from muckrock.factories import (
+        UserFactory,
+        AnswerFactory,
+        AgencyFactory,
+        ArticleFactory,
+        FOIARequestFactory,
+        FOIACommunicationFactory,
+        FOIAFileFactory,
+        )
 from muckrock.fields import EmailsListField
 from muckrock.forms import NewsletterSignupForm, StripeForm
-from muckrock.utils import new_action, notify
-from muckrock.test_utils import http_get_response, http_post_response
-from muckrock.views import NewsletterSignupView, DonationFormView
+from muckrock.instrumentation import QueryRecorder, fingerprint, top_offenders
+from muckrock.sitemap import generate_sitemaps, get_file, page_name
+from muckrock.utils import (
+        new_action,
+        notify,
+        cache_get_or_set,
+        cache_rendered,
+        cache_stats,
+        CacheEntry,
+        LRUCache,
+        rendered_cache,
+        is_follower,
+        follower_count,
+        follower_users,
+        )
+from muckrock.task.factories import ResponseTaskFactory
+from muckrock.test_utils import http_get_response, http_post_response, assert_max_queries
+from muckrock.views import (
+        NewsletterSignupView,
+        DonationFormView,
+        Homepage,
+        reset_homepage_cache,
+        )
 
 # pylint: disable=no-self-use
 # pylint: disable=too-many-public-methods
@@ -100,12 +136,6 @@ class TestFunctional(TestCase):
         AnswerFactory()
 
         get_allowed(self.client, reverse('index'))
-        get_allowed(self.client, '/sitemap.xml')
-        get_allowed(self.client, '/sitemap-News.xml')
-        get_allowed(self.client, '/sitemap-Jurisdiction.xml')
-        get_allowed(self.client, '/sitemap-Agency.xml')
-        get_allowed(self.client, '/sitemap-Question.xml')
-        get_allowed(self.client, '/sitemap-FOIA.xml')
         get_allowed(self.client, '/news-sitemaps/index.xml')
         get_allowed(self.client, '/news-sitemaps/articles.xml')
         get_allowed(self.client, '/search/')
@@ -225,6 +255,89 @@ class TestNotify(TestCase):
                 'Each user in the list should be notified.')
 
 
+class TestFollowers(TestCase):
+    """Followers should be checked and counted without loading them all"""
+    def setUp(self):
+        self.foia = FOIARequestFactory()
+        self.followers = UserFactory.create_batch(3)
+        for user in self.followers:
+            follow(user, self.foia, actor_only=False)
+
+    def test_is_follower(self):
+        """Membership is a single query"""
+        with self.assertNumQueries(1):
+            ok_(is_follower(self.followers[0], self.foia))
+        ok_(not is_follower(UserFactory(), self.foia))
+        ok_(not is_follower(AnonymousUser(), self.foia))
+
+    def test_count(self):
+        """Followers are counted in the database"""
+        eq_(follower_count(self.foia), 3)
+        eq_(follower_count(FOIARequestFactory()), 0)
+
+    def test_users(self):
+        """The followers are found for notifying"""
+        eq_(set(follower_users(self.foia)), set(self.followers))
+
+
+class TestSitemaps(TestCase):
+    """Sitemaps are precomputed into storage and served from it"""
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.storage = FileSystemStorage(location=self.location)
+        self.patcher = patch('muckrock.sitemap.default_storage', self.storage)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.location)
+
+    def read_page(self, name):
+        """Read a gzipped sitemap page"""
+        with gzip.GzipFile(fileobj=StringIO(get_file(name))) as gz_file:
+            return gz_file.read()
+
+    def test_generate(self):
+        """Public requests are listed, and changes are picked up incrementally"""
+        foia = FOIARequestFactory(status='done')
+        hidden = FOIARequestFactory(status='done', embargo=True)
+        generate_sitemaps(full=True)
+        name = page_name('FOIA', foia.pk // 5000)
+        with self.assertNumQueries(0):
+            ok_(name in get_file('sitemap.xml'))
+            page = self.read_page(name)
+        ok_(foia.get_absolute_url() in page)
+        ok_(hidden.get_absolute_url() not in page)
+        hidden.embargo = False
+        hidden.save()
+        generate_sitemaps()
+        ok_(hidden.get_absolute_url() in self.read_page(name))
+
+    def test_views(self):
+        """The index and pages are served from storage"""
+        foia = FOIARequestFactory(status='done')
+        generate_sitemaps(full=True)
+        response = self.client.get(reverse('sitemap-index'))
+        eq_(response.status_code, 200)
+        name = page_name('FOIA', foia.pk // 5000)
+        response = self.client.get(reverse('sitemap-page', kwargs={'name': name}))
+        eq_(response.status_code, 200)
+        response = self.client.get(
+                reverse('sitemap-page', kwargs={'name': page_name('FOIA', 999)}))
+        eq_(response.status_code, 404)
+        response = self.client.get('/sitemap-FOIA.xml')
+        eq_(response.status_code, 301)
+        ok_(response['Location'].endswith(reverse('sitemap-index')))
+
+    def test_missing_index(self):
+        """A missing index is queued to be built, not built while waiting"""
+        with patch('muckrock.views.refresh_sitemaps') as mock_refresh:
+            with self.assertNumQueries(0):
+                response = self.client.get(reverse('sitemap-index'))
+        eq_(response.status_code, 503)
+        eq_(mock_refresh.delay.call_count, 1)
+
+
 @patch('stripe.Charge', Mock())
 class TestDonations(TestCase):
     """Tests donation functionality"""
@@ -249,3 +362,249 @@ class TestDonations(TestCase):
         mock_send.assert_called_once()
         eq_(response.status_code, 302,
             'A successful donation will return a redirection.')
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TestHomepageCache(TestCase):
+    """The homepage data is stored in the shared cache"""
+    def setUp(self):
+        cache.clear()
+        self.homepage = Homepage()
+
+    def test_cached(self):
+        """Values should only be computed once while they are fresh"""
+        update = Mock(return_value=[1, 2, 3])
+        eq_(self.homepage.get_value('test', update), [1, 2, 3])
+        eq_(self.homepage.get_value('test', update), [1, 2, 3])
+        eq_(update.call_count, 1)
+
+    def test_lazy(self):
+        """Lazy values should only be loaded once, when they are used"""
+        update = Mock(return_value='value')
+        value = self.homepage.lazy_value('test', update)
+        eq_(update.call_count, 0)
+        eq_(value(), 'value')
+        eq_(value(), 'value')
+        eq_(update.call_count, 1)
+
+    def test_reset(self):
+        """Resetting the homepage cache should clear the data"""
+        user = UserFactory(is_staff=True)
+        cache.set(Homepage.cache_key('stats'), ({}, 0), 60)
+        http_get_response(reverse('reset-cache'), reset_homepage_cache, user)
+        ok_(cache.get(Homepage.cache_key('stats')) is None)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TestCacheGetOrSet(TestCase):
+    """Cache get or set should cache values and protect against stampedes"""
+    def setUp(self):
+        cache.clear()
+        cache_stats.clear()
+
+    def test_cached(self):
+        """Fresh values should be served from the cache"""
+        update = Mock(return_value='value')
+        eq_(cache_get_or_set('test', update, 60), 'value')
+        eq_(cache_get_or_set('test', update, 60), 'value')
+        eq_(update.call_count, 1)
+        eq_(cache_stats['test']['miss'], 1)
+        eq_(cache_stats['test']['hit'], 1)
+
+    def test_stats_prefix(self):
+        """Statistics should be counted by key prefix, not by key"""
+        cache_get_or_set('test:1:value', lambda: 1, 60)
+        cache_get_or_set('test:2:value', lambda: 2, 60)
+        eq_(cache_stats['test']['miss'], 2)
+        eq_(len(cache_stats), 1)
+
+    def test_none(self):
+        """None should be cached like any other value"""
+        update = Mock(return_value=None)
+        ok_(cache_get_or_set('test', update, 60) is None)
+        ok_(cache_get_or_set('test', update, 60) is None)
+        eq_(update.call_count, 1)
+
+    def test_stale(self):
+        """Stale values are served while another worker holds the lock"""
+        update = Mock(return_value='new')
+        cache.set('test', CacheEntry('old', 0, 0), 60)
+        cache.add('test:lock', True, 60)
+        eq_(cache_get_or_set('test', update, 60), 'old')
+        eq_(update.call_count, 0)
+        cache.delete('test:lock')
+        eq_(cache_get_or_set('test', update, 60), 'new')
+        eq_(update.call_count, 1)
+        ok_(cache.get('test:lock') is None)
+
+    def test_update_error(self):
+        """The lock is released if the update fails"""
+        cache.set('test', CacheEntry('old', 0, 0), 60)
+        update = Mock(side_effect=ValueError)
+        with self.assertRaises(ValueError):
+            cache_get_or_set('test', update, 60)
+        ok_(cache.get('test:lock') is None)
+
+    def test_legacy_value(self):
+        """Values not set by cache get or set are treated as misses"""
+        cache.set('test', 'old', 60)
+        eq_(cache_get_or_set('test', lambda: 'new', 60), 'new')
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TestCacheRendered(TestCase):
+    """Rendered text is memoized on its content"""
+    def setUp(self):
+        cache.clear()
+        rendered_cache.entries.clear()
+
+    def test_cached(self):
+        """Text is only rendered once, in process or from the shared cache"""
+        render = Mock(return_value='<p>text</p>')
+        eq_(cache_rendered('test', u'text', render), '<p>text</p>')
+        eq_(cache_rendered('test', u'text', render), '<p>text</p>')
+        rendered_cache.entries.clear()
+        eq_(cache_rendered('test', u'text', render), '<p>text</p>')
+        eq_(render.call_count, 1)
+        cache_rendered('test', u'other text', render)
+        eq_(render.call_count, 2)
+
+    def test_lru(self):
+        """The least recently used entries are dropped"""
+        lru = LRUCache(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        eq_(lru.get('a'), 1)
+        lru.set('c', 3)
+        eq_(lru.get('b'), None)
+        eq_(lru.get('a'), 1)
+        eq_(lru.get('c'), 3)
+
+
+class TestQueryStats(TestCase):
+    """Query stats record the queries run by a view"""
+
+    def test_fingerprint(self):
+        """Queries differing only by their parameters should match"""
+        eq_(fingerprint("SELECT * FROM t WHERE id = 1 AND name = 'a'"),
+            fingerprint("SELECT * FROM t WHERE id = 22 AND name = 'b''c'"))
+        eq_(fingerprint('SELECT * FROM t WHERE id IN (1, 2, 3)'),
+            fingerprint('SELECT * FROM t WHERE id IN (4)'))
+
+    def test_recorder(self):
+        """The recorder should count queries and find duplicates"""
+        with QueryRecorder() as recorder:
+            UserFactory()
+            for _ in range(3):
+                list(Notification.objects.filter(user_id=1))
+        ok_(recorder.count >= 3)
+        eq_(recorder.duplicates()[0][1], 3)
+
+    def test_top_offenders(self):
+        """Samples should be aggregated by view"""
+        samples = [
+                {'view': 'a', 'queries': 10, 'sql_time': 0.1, 'time': 0.2,
+                    'duplicates': [('SELECT ?', 5)]},
+                {'view': 'a', 'queries': 20, 'sql_time': 0.1, 'time': 0.2,
+                    'duplicates': []},
+                {'view': 'b', 'queries': 5, 'sql_time': 0.1, 'time': 0.2,
+                    'duplicates': []},
+                ]
+        offenders = top_offenders(samples)
+        eq_([o['view'] for o in offenders], ['a', 'b'])
+        eq_(offenders[0]['queries'], 15)
+        eq_(offenders[0]['max_queries'], 20)
+        eq_(offenders[0]['duplicates'], [('SELECT ?', 5)])
+
+
+class TestQueryBudgets(TestCase):
+    """
+    Key pages should run a bounded number of queries, no matter how much data
+    is attached to the objects on them.  The fixtures are large enough, and
+    the list pages are requested with enough rows per page, that a query per
+    request, communication or task will exceed the budgets.  The agency and
+    jurisdiction pages only show ten requests, so their budgets are tighter.
+    """
+    num_requests = 60
+    num_comms = 75
+    num_files = 10
+    num_followers = 15
+
+    def setUp(self):
+        self.user = UserFactory(is_staff=True)
+        self.agency = AgencyFactory()
+        self.jurisdiction = self.agency.jurisdiction
+        self.foias = FOIARequestFactory.create_batch(
+                self.num_requests,
+                user=self.user,
+                agency=self.agency,
+                jurisdiction=self.jurisdiction,
+                status='done',
+                )
+        self.foia = self.foias[0]
+        comms = FOIACommunicationFactory.create_batch(
+                self.num_comms,
+                foia=self.foia,
+                response=True,
+                )
+        for comm in comms[:self.num_files]:
+            FOIAFileFactory(foia=self.foia, comm=comm, access='public')
+        for comm in comms:
+            ResponseTaskFactory(communication=comm)
+        for follower in UserFactory.create_batch(self.num_followers):
+            follow(follower, self.foia, actor_only=False)
+        ArticleFactory.create_batch(5, publish=True)
+        self.client.force_login(self.user)
+
+    def assert_get_within(self, url, budget):
+        """Get the url, asserting it is within the query budget"""
+        with assert_max_queries(budget):
+            response = self.client.get(url)
+        eq_(response.status_code, 200)
+
+    def test_request_detail(self):
+        """The request detail page"""
+        self.assert_get_within(self.foia.get_absolute_url(), 60)
+
+    def test_request_list(self):
+        """The request list page"""
+        self.assert_get_within(reverse('foia-list') + '?per_page=100', 40)
+
+    def test_agency_detail(self):
+        """The agency detail page"""
+        self.assert_get_within(self.agency.get_absolute_url(), 30)
+
+    def test_jurisdiction_detail(self):
+        """The jurisdiction detail page"""
+        self.assert_get_within(self.jurisdiction.get_absolute_url(), 30)
+
+    def test_task_list(self):
+        """The response task list page"""
+        self.assert_get_within(
+                reverse('response-task-list') + '?per_page=100', 60)
+
+    def test_profile(self):
+        """The user profile page"""
+        self.assert_get_within(
+                reverse('acct-profile', kwargs={'username': self.user.username}),
+                40)
+
+    def test_homepage(self):
+        """The homepage"""
+        self.assert_get_within(reverse('index'), 40)
+
+    def test_api_lists(self):
+        """The API list endpoints"""
+        budgets = {
+                'foia': 20,
+                'communication': 20,
+                'agency': 20,
+                'jurisdiction': 20,
+                'task': 20,
+                'responsetask': 20,
+                }
+        for name, budget in budgets.iteritems():
+            self.assert_get_within(reverse('api-%s-list' % name), budget)
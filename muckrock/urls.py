@@ -18,27 +18,14 @@ import muckrock.jurisdiction.viewsets
 import muckrock.jurisdiction.urls
 import muckrock.news.views
 import muckrock.qanda.views
+import muckrock.sidebar.signals # pylint: disable=unused-import
+import muckrock.templatetags.signals # pylint: disable=unused-import
 import muckrock.task.viewsets
 import muckrock.views as views
-from muckrock.agency.sitemap import AgencySitemap
-from muckrock.foia.sitemap import FoiaSitemap
-from muckrock.jurisdiction.sitemap import JurisdictionSitemap
-from muckrock.news.sitemap import ArticleSitemap
-from muckrock.project.sitemap import ProjectSitemap
-from muckrock.qanda.sitemap import QuestionSitemap
 from muckrock.views import handler500 # pylint: disable=unused-import
 
 admin.site.index_template = 'admin/custom_index.html'
 
-sitemaps = {
-    'FOIA': FoiaSitemap,
-    'News': ArticleSitemap,
-    'Agency': AgencySitemap,
-    'Jurisdiction': JurisdictionSitemap,
-    'Question': QuestionSitemap,
-    'Project': ProjectSitemap,
-}
-
 router = DefaultRouter()
 router.register(r'jurisdiction',
         muckrock.jurisdiction.viewsets.JurisdictionViewSet,
@@ -61,6 +48,12 @@ router.register(r'statistics',
 router.register(r'communication',
         muckrock.foia.viewsets.FOIACommunicationViewSet,
         'api-communication')
+router.register(r'changes',
+        muckrock.foia.viewsets.ChangeViewSet,
+        'api-change')
+router.register(r'multirequest',
+        muckrock.foia.viewsets.FOIAMultiRequestViewSet,
+        'api-multirequest')
 router.register(r'user',
         muckrock.accounts.views.UserViewSet,
         'api-user')
@@ -96,6 +89,7 @@ urlpatterns = patterns(
     '',
     url(r'^$', views.homepage, name='index'),
     url(r'^reset_cache/$', views.reset_homepage_cache, name='reset-cache'),
+    url(r'^query_stats/$', views.query_stats, name='query-stats'),
     url(r'^accounts/', include('muckrock.accounts.urls')),
     url(r'^foi/', include('muckrock.foia.urls')),
     url(r'^news/', include('muckrock.news.urls')),
@@ -124,12 +118,9 @@ urlpatterns = patterns(
     url(r'^robots\.txt$', include('robots.urls')),
     url(r'^favicon.ico$', RedirectView.as_view(
         url=settings.STATIC_URL + 'icons/favicon.ico')),
-    url(r'^sitemap\.xml$', 'django.contrib.sitemaps.views.index', {'sitemaps': sitemaps}),
-    url(
-        r'^sitemap-(?P<section>.+)\.xml$',
-        'django.contrib.sitemaps.views.sitemap',
-        {'sitemaps': sitemaps}
-    ),
+    url(r'^sitemap\.xml$', views.sitemap_index, name='sitemap-index'),
+    url(r'^(?P<name>sitemap-\w+-\d+\.xml\.gz)$', views.sitemap_page, name='sitemap-page'),
+    url(r'^sitemap-(?P<section>\w+)\.xml$', views.sitemap_section, name='sitemap-section'),
     url(r'^news-sitemaps/', include('news_sitemaps.urls')),
     url(r'^__debug__/', include(debug_toolbar.urls)),
     url(r'^donate/$', views.DonationFormView.as_view(), name='donate'),
@@ -3,17 +3,28 @@ Miscellanous utilities
 """
 
 import actstream
+import bleach
+from collections import Counter, OrderedDict, defaultdict, namedtuple
 import datetime
+from functools import wraps
+import hashlib
+import markdown
+import math
 import random
 import string
 import stripe
+import threading
+import time
 
 from django.conf import settings
 from django.contrib.auth.models import User, Group
 from django.core.cache import cache
 from django.template import Context
 from django.template.loader_tags import BlockNode, ExtendsNode
+from django.utils.encoding import force_text
 from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import condition
 
 from muckrock.storage import QueuedS3DietStorage
 
@@ -84,6 +95,41 @@ def notify(users, action):
     return notifications
 
 
+def follow_lookup(obj):
+    """Filter arguments for the follows of an object, matching the
+    columns of the indexes on the follow table"""
+    from django.contrib.contenttypes.models import ContentType
+    return {
+            'content_type': ContentType.objects.get_for_model(obj),
+            'object_id': obj.pk,
+            }
+
+
+def is_follower(user, obj):
+    """Is the user following the object?  This is an indexed existence
+    check, which does not load the object's followers"""
+    from actstream.models import Follow
+    if not user.is_authenticated():
+        return False
+    return Follow.objects.filter(user=user, **follow_lookup(obj)).exists()
+
+
+def follower_count(obj):
+    """The number of users following the object"""
+    from actstream.models import Follow
+    return Follow.objects.filter(**follow_lookup(obj)).count()
+
+
+def follower_users(obj):
+    """The users following the object, loading only their ids"""
+    from actstream.models import Follow
+    return (User.objects
+            .filter(pk__in=Follow.objects
+                .filter(**follow_lookup(obj))
+                .values('user_id'))
+            .only('pk'))
+
+
 def generate_key(size=6, chars=string.ascii_uppercase + string.digits):
     """Generates a random alphanumeric key"""
     return ''.join(random.SystemRandom().choice(chars) for _ in range(size))
@@ -106,15 +152,245 @@ def get_stripe_token(card_number='4242424242424242'):
     return token.id
 
 
-def cache_get_or_set(key, update, timeout):
-    """Get the value from the cache if present, otherwise update it"""
-    value = cache.get(key)
-    if value is None:
+CacheEntry = namedtuple('CacheEntry', ['value', 'refresh_at', 'delta'])
+
+# per process hit and miss counters for cache_get_or_set, by key prefix -
+# keys are often per object or per user, so counting them individually
+# would grow without bound
+cache_stats = defaultdict(Counter)
+
+def cache_stats_key(key):
+    """The prefix of a cache key that its statistics are counted under"""
+    return key.split(':', 1)[0]
+
+def cache_get_or_set(key, update, timeout, stale=None, beta=1.0, lock_timeout=60):
+    """
+    Get the value from the cache if present, otherwise update it
+
+    Values are stored along with the time they should be refreshed at, and
+    are kept in the cache for `stale` more seconds past that time (defaults
+    to `timeout`).  A value may be refreshed early, with a probability that
+    rises as its refresh time nears and with how long it takes to compute,
+    so that hot keys are not all recomputed at the same moment.  Only the
+    worker holding the recompute lock updates a stale value - everyone else
+    keeps serving the stale value in the meantime.  `None` is cached like
+    any other value.
+    """
+    # pylint: disable=too-many-arguments
+    if stale is None:
+        stale = timeout
+    stats = cache_stats[cache_stats_key(key)]
+    entry = cache.get(key)
+    now = time.time()
+    if isinstance(entry, CacheEntry):
+        early = entry.delta * beta * -math.log(1.0 - random.random())
+        if entry.refresh_at is None or now + early < entry.refresh_at:
+            stats['hit'] += 1
+            return entry.value
+        if not cache.add(key + ':lock', True, lock_timeout):
+            # another worker is already recomputing this value
+            stats['stale'] += 1
+            return entry.value
+        locked = True
+    else:
+        locked = False
+    stats['miss'] += 1
+    try:
         value = update()
-        cache.set(key, value, timeout)
+        delta = time.time() - now
+        if timeout is None:
+            cache.set(key, CacheEntry(value, None, delta), None)
+        else:
+            cache.set(key, CacheEntry(value, now + timeout, delta), timeout + stale)
+    finally:
+        # release the lock even if the update fails, so the next caller
+        # may try again
+        if locked:
+            cache.delete(key + ':lock')
     return value
 
 
+def cache_generation_key(model, pk=None):
+    """The cache key for the generation counter of a model, or of one of its
+    objects if a primary key is given"""
+    # pylint: disable=protected-access
+    opts = model._meta.concrete_model._meta
+    if pk is None:
+        return 'generation:%s.%s' % (opts.app_label, opts.model_name)
+    else:
+        return 'generation:%s.%s:%s' % (opts.app_label, opts.model_name, pk)
+
+
+def get_cache_generations(keys):
+    """
+    Get the current value of each of the generation counters
+
+    Missing counters are started at the current time in milliseconds, so a
+    counter which has been evicted never goes back to a generation that
+    may still have fragments cached under it
+    """
+    generations = cache.get_many(keys)
+    missing = {key: int(time.time() * 1000)
+            for key in keys if key not in generations}
+    if missing:
+        cache.set_many(missing, None)
+        generations.update(missing)
+    return [generations[key] for key in keys]
+
+
+def bump_cache_generation(model, pk=None):
+    """Move a model's or object's generation counter on, so everything
+    cached under the previous generation is no longer used"""
+    key = cache_generation_key(model, pk)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # the counter is not in the cache
+        cache.set(key, int(time.time() * 1000), None)
+
+
+class LRUCache(object):
+    """A small in process cache, which drops the least recently used
+    entries, and which may be shared between threads"""
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Get a value, marking it as recently used"""
+        with self.lock:
+            try:
+                value = self.entries.pop(key)
+            except KeyError:
+                return default
+            self.entries[key] = value
+            return value
+
+    def set(self, key, value):
+        """Set a value, dropping the oldest one if the cache is full"""
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = value
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+# rendered text, by a hash of its content, in front of the shared cache
+rendered_cache = LRUCache(1000)
+# renderings never go stale, but are let expire so unused ones do not pile up
+RENDERED_CACHE_TIMEOUT = 30 * 24 * 60 * 60
+
+def cache_rendered(name, text, render):
+    """
+    Render the text, memoized on a hash of its content
+
+    The in process cache is checked first, then the shared cache.  As the
+    key is the content itself, a rendering never goes stale - change
+    `name` if the way the text is rendered changes.
+    """
+    text = force_text(text)
+    key = 'rendered:%s:%s' % (name, hashlib.sha1(text.encode('utf8')).hexdigest())
+    value = rendered_cache.get(key)
+    if value is None:
+        value = cache.get(key)
+        if value is None:
+            value = render(text)
+            cache.set(key, value, RENDERED_CACHE_TIMEOUT)
+        rendered_cache.set(key, value)
+    return mark_safe(value)
+
+
+def _render_markdown(text, safe=None):
+    """Take the provided markdown-formatted text and convert it to HTML."""
+    # First render Markdown
+    extensions = [
+            'markdown.extensions.smarty',
+            'markdown.extensions.tables',
+            'pymdownx.magiclink',
+            ]
+    markdown_text = markdown.markdown(text, extensions=extensions)
+    # Next bleach the markdown
+    allowed_tags = bleach.ALLOWED_TAGS + [
+        u'h1',
+        u'h2',
+        u'h3',
+        u'h4',
+        u'h5',
+        u'h6',
+        u'p',
+        u'img',
+        u'iframe'
+    ]
+    allowed_attributes = bleach.ALLOWED_ATTRIBUTES.copy()
+    allowed_attributes.update({
+        'iframe': ['src', 'width', 'height', 'frameborder', 'marginheight', 'marginwidth'],
+        'img': ['src', 'alt', 'title', 'width', 'height'],
+    })
+    # allows bleaching to be avoided
+    if safe == 'safe':
+        return markdown_text
+    elif safe == 'strip':
+        return bleach.clean(
+            markdown_text,
+            tags=allowed_tags,
+            attributes=allowed_attributes,
+            strip=True,
+        )
+    else:
+        return bleach.clean(
+            markdown_text,
+            tags=allowed_tags,
+            attributes=allowed_attributes
+        )
+
+
+def render_markdown(text, safe=None):
+    """Render markdown to bleached HTML, memoized on its content"""
+    return cache_rendered(
+            'markdown:1:%s' % safe,
+            text,
+            lambda text: _render_markdown(text, safe))
+
+
+def _render_smartypants(text):
+    """Renders typographically-correct quotes with the smartpants library"""
+    import smartypants
+    return bleach.clean(smartypants.smartypants(text))
+
+
+def render_smartypants(text):
+    """Render typographically-correct quotes, memoized on the content"""
+    return cache_rendered('smartypants:1', text, _render_smartypants)
+
+
+def conditional(etag, last_modified=None):
+    """
+    Make a view answer conditional requests, for an ETag and last modified
+    time which have already been calculated
+
+    GZipMiddleware adds a ;gzip suffix to the ETag of compressed responses,
+    which clients send back in If-None-Match, so it is removed before
+    comparing
+    """
+    def decorator(view):
+        """Wrap the view in Django's condition decorator"""
+        conditional_view = condition(
+                etag_func=lambda *args, **kwargs: etag,
+                last_modified_func=lambda *args, **kwargs: last_modified,
+                )(view)
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            """Strip the gzip suffix from the ETags the client has sent"""
+            if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+            if if_none_match:
+                request.META['HTTP_IF_NONE_MATCH'] = (
+                        if_none_match.replace(';gzip"', '"'))
+            return conditional_view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
 def get_image_storage():
     """Return the storage class to use for images we want optimized"""
     if settings.USE_QUEUED_STORAGE:
@@ -8,6 +8,7 @@ from django.core.cache import cache
 from django.core.cache.utils import make_template_fragment_key
 from django.core.urlresolvers import reverse
 from django.db.models import Sum, FieldDoesNotExist
+from django.http import HttpResponse, Http404
 from django.shortcuts import render, get_object_or_404, redirect
 from django.utils.decorators import method_decorator
 from django.utils.html import escape
@@ -16,10 +17,14 @@ from django.views.generic import View, ListView, FormView, TemplateView
 from muckrock.agency.models import Agency
 from muckrock.foia.models import FOIARequest, FOIAFile
 from muckrock.forms import NewsletterSignupForm, SearchForm, StripeForm
+from muckrock.instrumentation import CacheRingBufferSink, top_offenders
 from muckrock.jurisdiction.models import Jurisdiction
 from muckrock.message.tasks import send_charge_receipt
 from muckrock.news.models import Article
 from muckrock.project.models import Project
+from muckrock.sitemap import get_file, INDEX_NAME
+from muckrock.tasks import refresh_sitemaps
+from muckrock.utils import cache_get_or_set
 
 import logging
 import requests
@@ -159,9 +164,14 @@ class ModelSearchMixin(object):
         queryset = super(ModelSearchMixin, self).get_queryset()
         query = self.get_query()
         if query:
-            queryset = watson.filter(queryset.model, query)
+            queryset = self.search_queryset(queryset, query)
         return queryset
 
+    def search_queryset(self, queryset, query):
+        """Search the queryset for the query"""
+        # pylint: disable=no-self-use
+        return watson.filter(queryset.model, query)
+
     def get_context_data(self, **kwargs):
         """Adds the query to the context."""
         context = super(ModelSearchMixin, self).get_context_data(**kwargs)
@@ -325,6 +335,8 @@ class Homepage(object):
     """Control caching for the homepage"""
     # pylint: disable=no-self-use
 
+    cache_prefix = 'hp:data'
+
     def get_cached_values(self):
         """Return all the methods used to generate the cached values"""
         return [
@@ -334,16 +346,44 @@ class Homepage(object):
                 ('stats', self.stats),
                 ]
 
+    @classmethod
+    def cache_key(cls, name):
+        """The cache key for the named homepage value"""
+        return '%s:%s' % (cls.cache_prefix, name)
+
+    def get_value(self, name, update):
+        """Get the named value from the shared cache, updating it if needed"""
+        return cache_get_or_set(
+                self.cache_key(name),
+                update,
+                settings.DEFAULT_CACHE_TIMEOUT)
+
+    def lazy_value(self, name, update):
+        """
+        Return an argument-less function to load the named value
+
+        The value is not loaded until the template asks for it, so nothing
+        is loaded if the template fragment using it is already cached,
+        and it is only loaded once per request.
+        """
+        results = []
+        def inner():
+            """Argument-less function to load the value"""
+            if not results:
+                results.append(self.get_value(name, update))
+            return results[0]
+        return inner
+
     def articles(self):
         """Get the articles for the front page"""
-        return (Article.objects
+        return list(Article.objects
                 .get_published()
                 .prefetch_authors()
                 [:5])
 
     def featured_projects(self):
         """Get the featured projects for the front page"""
-        return (Project.objects
+        return list(Project.objects
                 .get_public()
                 .optimize()
                 .filter(featured=True)
@@ -351,7 +391,7 @@ class Homepage(object):
 
     def completed_requests(self):
         """Get recently completed requests"""
-        return lambda: (FOIARequest.objects
+        return (FOIARequest.objects
                 .get_public()
                 .get_done()
                 .order_by('-date_done', 'pk')
@@ -362,21 +402,22 @@ class Homepage(object):
         """Get some stats to show on the front page"""
         return {
                 'request_count':
-                    lambda: FOIARequest.objects.exclude(status='started').count(),
+                    FOIARequest.objects.exclude(status='started').count(),
                 'completed_count':
-                    lambda: FOIARequest.objects.get_done().count(),
+                    FOIARequest.objects.get_done().count(),
                 'page_count':
-                    lambda: FOIAFile.objects.aggregate(pages=Sum('pages'))['pages'],
+                    FOIAFile.objects.aggregate(pages=Sum('pages'))['pages'],
                 'agency_count':
-                    lambda: Agency.objects.get_approved().count(),
+                    Agency.objects.get_approved().count(),
                 }
 
 
 def homepage(request):
     """Get all the details needed for the homepage"""
     context = {}
-    for name, value in Homepage().get_cached_values():
-        context[name] = value()
+    homepage_cache = Homepage()
+    for name, value in homepage_cache.get_cached_values():
+        context[name] = homepage_cache.lazy_value(name, value)
     return render(request, 'homepage.html', context)
 
 
@@ -393,9 +434,31 @@ def reset_homepage_cache(request):
     for key in template_keys:
         cache.delete(make_template_fragment_key(key))
 
+    cache.delete_many([Homepage.cache_key(name) for name, _
+        in Homepage().get_cached_values()])
+
     return redirect('index')
 
 
+@user_passes_test(lambda u: u.is_staff)
+def query_stats(request):
+    """Show the views running the most queries, from the sampled requests"""
+    sink = CacheRingBufferSink()
+    if request.method == 'POST' and request.POST.get('action') == 'clear':
+        sink.clear()
+        return redirect('query-stats')
+    sort = request.GET.get('sort', 'queries')
+    if sort not in ('queries', 'max_queries', 'sql_time', 'time', 'requests'):
+        sort = 'queries'
+    samples = sink.samples()
+    return render(request, 'staff/query_stats.html', {
+        'offenders': top_offenders(samples, sort)[:50],
+        'sample_count': len(samples),
+        'sample_rate': settings.QUERY_STATS_SAMPLE_RATE,
+        'sort': sort,
+        })
+
+
 class StripeFormMixin(object):
     """Prefills the StripeForm values."""
     def get_initial(self):
@@ -529,3 +592,34 @@ def class_view_decorator(function_decorator):
         return view
 
     return simple_decorator
+
+
+def sitemap_index(request):
+    """Serve the precomputed sitemap index"""
+    # pylint: disable=unused-argument
+    content = get_file(INDEX_NAME)
+    if content is None:
+        # the sitemaps have not been generated yet - ask for them to be,
+        # once, rather than building them while the crawler waits
+        if cache.add('sitemap:refresh_queued', True, 10 * 60):
+            refresh_sitemaps.delay()
+        response = HttpResponse(status=503)
+        response['Retry-After'] = 10 * 60
+        return response
+    return HttpResponse(content, content_type='application/xml')
+
+
+def sitemap_section(request, section):
+    """The sections used to be served as single sitemaps, send crawlers
+    which still know them to the index"""
+    # pylint: disable=unused-argument
+    return redirect('sitemap-index', permanent=True)
+
+
+def sitemap_page(request, name):
+    """Serve a precomputed, gzipped sitemap page"""
+    # pylint: disable=unused-argument
+    content = get_file(name)
+    if content is None:
+        raise Http404
+    return HttpResponse(content, content_type='application/x-gzip')